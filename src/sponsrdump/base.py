@@ -4,23 +4,67 @@ import shlex
 import shutil
 from collections import defaultdict
 from collections.abc import Callable
-from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from contextlib import contextmanager, nullcontext, suppress
+from contextvars import ContextVar, copy_context
 from enum import Enum
+from io import BytesIO
 from pathlib import Path
 from pprint import pformat
+from tempfile import mkdtemp
+from threading import Lock
+from time import perf_counter
 from typing import ClassVar, NamedTuple
 from urllib.parse import parse_qs, urljoin, urlparse
 from uuid import uuid4
 
-import requests
 from bs4 import BeautifulSoup
 from lxml import etree
-from requests import HTTPError
+from requests import HTTPError, RequestException
 from requests.cookies import cookiejar_from_dict
 
-from .converters import MarkdownConverter, TextConverter
+from .budget import RunBudget
+from .buffers import BUFFER_LIMIT, BufferBudget, peak_rss
+from .converters import TextConverter
+from .engine import AsyncEngine, Download
+from .events import (
+    ByteCounter,
+    Event,
+    EventStream,
+    FileCompleted,
+    FileFailed,
+    FileQueued,
+    PostDiscovered,
+    StreamClosed,
+)
 from .exceptions import SponsrDumperError
+from .manifests import Manifest, ManifestCache, ManifestPrefetcher
+from .metrics import Metrics
+from .plan import AUDIO_BITRATE, Plan, PostPlan, range_size
+from .renditions import (
+    AUDIO_ONLY_SUFFIX,
+    AUTO,
+    CAP_PREFIX,
+    FRAMES_SEPARATOR,
+    AutoResolution,
+    frame_filename,
+    parse_frames,
+    pick_capped,
+)
+from .retry import RetryScheduler
+from .schedule import ORDER_LISTING, SIZED_ORDERS, Job, order_jobs
+from .throttle import STATUS_THROTTLED, Throttle, parse_retry_after
+from .transports import (
+    AiohttpTransport,
+    Cassette,
+    RecordingTransport,
+    ReplayTransport,
+    Reply,
+    RequestsTransport,
+    Transport,
+)
 from .utils import LOGGER, MAX_FILENAME_LENGTH, call, concat_files, convert_text_to_video, progress, truncate_filename
+from .writers import Writers, content_length
 
 RE_FILENAME_INVALID = re.compile(r'[:?"/<>\\|*]')
 RE_PROJECT_ID = re.compile(r'"project_id":\s*(\d+)\s*,')
@@ -51,8 +95,47 @@ _CLEANUP = True
 class VideoPreference(NamedTuple):
 
     frame: str = 'best'
+    """best | WxH (e.g. 1280x720) | max:<height> (e.g. max:720) | auto (see 'budget' and 'deadline').
+    Several ones separated by comma (e.g. 640x360,1280x720) to dump a video in each of them.
+
+    """
+
     sound: str = 'best'
 
+    budget: int = 0
+    """Bytes for all the videos of a run, for 'auto' frame. 0 - unlimited."""
+
+    deadline: float = 0
+    """Seconds for all the videos of a run, for 'auto' frame. 0 - unlimited."""
+
+    audio_only: bool = False
+    """Only the audio of videos is downloaded and remuxed into an audio file (.m4a)."""
+
+    @property
+    def frames(self) -> list[str]:
+        """Frame preferences to dump a video in."""
+        return [frame.strip() for frame in self.frame.split(FRAMES_SEPARATOR) if frame.strip()] or ['best']
+
+    @property
+    def cap(self) -> int:
+        """Maximum frame height for a single 'max:<height>' frame, 0 otherwise."""
+        if self.frame.startswith(CAP_PREFIX) and FRAMES_SEPARATOR not in self.frame:
+            return int(self.frame.removeprefix(CAP_PREFIX))
+        return 0
+
+    @property
+    def fixed(self) -> bool:
+        """Whether frames are picked regardless of other renditions available."""
+        return all(frame != AUTO and not frame.startswith(CAP_PREFIX) for frame in self.frames)
+
+    def check(self):
+        """Raises SponsrDumperError if frame preferences are invalid."""
+        try:
+            parse_frames(self.frame)
+
+        except ValueError as e:
+            raise SponsrDumperError(str(e)) from None
+
 
 class SponsrDumper:
 
@@ -60,6 +143,12 @@ class SponsrDumper:
 
     _fname_conf: str = 'sponsrdump.json'
     _fname_auth: str = 'sponsrdump_auth.txt'
+    _fname_manifests: str = 'sponsrdump_manifests.json'
+
+    _referer_mpd: str = (
+        'https://kinescope.io/203245765?enableIframeApi'
+        '&playerId=player&size%5Bwidth%5D=100%25&size%5Bheight%5D=100%25&preload=none'
+    )
 
     _headers: ClassVar[dict] = {
         'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0',
@@ -74,18 +163,117 @@ class SponsrDumper:
         'sec-ch-ua-platform': '"Linux"',
     }
 
-    def __init__(self, url: str):
+    _host_limits: ClassVar[dict[str, int]] = {
+        'sponsr.ru': 4,
+        'kinescope.io': 8,
+        'kinescopecdn.net': 16,
+    }
+    """Maximum concurrent requests per host (suffix)."""
+
+    _headers_segment: ClassVar[dict] = {
+        'Accept': '*/*',
+        'Accept-Encoding': 'identity',
+        'Connection': 'keep-alive',
+        'Referer': 'https://kinescope.io/',
+    }
+    """Headers for ranged requests of media segments."""
+
+    def __init__(
+            self,
+            url: str,
+            *,
+            workers: int = 1,
+            transport: str = RequestsTransport.alias,
+            on_event: Callable[[Event], None] | None = None,
+            record: str | Path = '',
+            replay: str | Path = '',
+            replay_latency: bool = False,
+            scratch_dir: str | Path = '',
+            buffer_limit: int = BUFFER_LIMIT,
+            chunk_size: int = 64 * 1024,
+            writers: int = 0,
+            preallocate: bool = False,
+    ):
+        """
+
+        :param url: project url
+        :param workers: number of concurrent downloads of media segments
+        :param transport: alias of HTTP transport to use (see Transport.register)
+        :param on_event: called for every event of search and dump (see .stream() for an iterator).
+            Called from worker threads as well.
+        :param record: directory to record every HTTP response into
+        :param replay: directory to replay HTTP responses from (see 'record') instead of making requests
+        :param replay_latency: wait for the time it took to receive a response originally on replay
+        :param scratch_dir: directory for media chunks to be joined (e.g. on a fast local disk).
+            Every video gets a directory of its own in it. Default: 'tmp' next to the video.
+        :param buffer_limit: bytes received and queued for writer threads by all the downloads.
+            Downloads wait for writes once it is reached. Only takes effect with 'writers'. 0 - unlimited
+        :param chunk_size: bytes to read from a response at once
+        :param writers: number of threads writing downloaded chunks to disk, so that reading
+            from sockets does not wait for a slow disk (e.g. NFS). 0 - readers write themselves
+        :param preallocate: reserve disk space for files of known sizes before writing
+
+        """
         self.url = url
+        self.workers = max(workers, 1)
+        self.scratch_dir = Path(scratch_dir) if scratch_dir else None
         self.project_id: str = ''
         self._collected: list[dict] = []
         self._dumped: dict[str, str] = {}
+        self._manifests = ManifestCache()
+        self._mpd_manifests = ManifestCache()
+        """Manifests of bare .mpd videos parsed for estimates, by url, reused on dump."""
+        self._segment_sizes: dict[str, int] = {}
+        """Probed sizes of unranged media segments (one per rendition), by url."""
+
+        self._transport = self._transport_make(
+            transport,
+            record=record,
+            replay=replay,
+            replay_latency=replay_latency,
+        )
+        self._throttle = Throttle(self._host_limits)
+        self._buffers = BufferBudget(buffer_limit)
+        self.chunk_size = chunk_size
+        self._writers = Writers(writers, buffers=self._buffers, preallocate=preallocate)
+        self._retry = RetryScheduler()
+        self._engine: AsyncEngine | None = None
+        self._auto: AutoResolution | None = None
+        self._prefetcher: ManifestPrefetcher | None = None
+        self._budget: RunBudget | None = None
+        self._on_event = on_event
+        self.metrics = Metrics()
+        self._counter: ContextVar[ByteCounter | None] = ContextVar('counter', default=None)
+        """Bytes received for the file being dumped (in the current thread)."""
+
+        self._auth_read()
+
+    def _transport_make(
+            self,
+            alias: str,
+            *,
+            record: str | Path,
+            replay: str | Path,
+            replay_latency: bool,
+    ) -> Transport:
+        pool_size = max(self.workers, *self._host_limits.values())
+
+        if replay:
+            LOGGER.info(f'Replaying responses recorded in {replay}')
+            return ReplayTransport(
+                cassette=Cassette(replay),
+                latency=replay_latency,
+                headers=self._headers,
+                pool_size=pool_size,
+            )
 
-        session = requests.Session()
-        session.headers = self._headers
+        transport = Transport.spawn(alias, headers=self._headers, pool_size=pool_size)
 
-        self._session = session
+        if record:
+            LOGGER.info(f'Recording responses into {record}')
+            transport = RecordingTransport(transport, cassette=Cassette(record))
 
-        self._auth_read()
+        return transport
 
     @classmethod
     def _concat_chunks(cls, *, src: Path, suffix: str) -> Path:
@@ -107,77 +295,175 @@ class SponsrDumper:
             return f'https://kinescope.io/{path}'
         return ''
 
-    @classmethod
-    def _mpd_parse(cls, fpath: Path):
-
-        with fpath.open() as f:
-            xml = f.read()
-
-        xml = re.sub('xmlns(:[^=]*)?="[^"]+"', '', xml)
+    @staticmethod
+    def _mpd_prune(bucket: dict, preferred: set[str]):
+        # keep the preferred representations and the largest one as a fallback
+        largest = next(reversed(sort_idents(bucket)))
+        for ident in list(bucket):
+            if ident not in preferred and ident != largest:
+                del bucket[ident]
 
-        root = etree.fromstring(xml, etree.XMLParser(
+    @classmethod
+    def _mpd_parse(cls, source: bytes, *, prefer_video: VideoPreference | None = None):
+        # Streams the manifest, so that only the segments of the representations
+        # being kept are held in memory. With no preference all of them are kept.
+
+        video = {}
+        audio = {}
+        found = {'video': [], 'audio': []}
+
+        realm = ''
+        ident = ''
+        base_url = ''
+        segments = []
+        seen = set()
+
+        for event, element in etree.iterparse(
+            BytesIO(source),
+            events=('start', 'end'),
             no_network=True,
             huge_tree=True,
             remove_blank_text=True,
             resolve_entities=False,
-        ))
+        ):
+            tag = etree.QName(element).localname
 
-        video = defaultdict(list)
-        trash = defaultdict(list)
-        audio = defaultdict(list)
+            if event == 'start':
 
-        for aset in root.findall('.//AdaptationSet'):
-            mime = aset.attrib['mimeType']
+                if tag == 'AdaptationSet':
+                    realm = element.get('mimeType', '').partition('/')[0]
 
-            if mime.startswith('video'):
-                bucket = video
+                elif tag == 'Representation':
+                    attrib = element.attrib
+                    LOGGER.debug(f'Representation found: {dict(attrib)}')
 
-            elif mime.startswith('audio'):
-                bucket = audio
+                    if audio_rate := attrib.get('audioSamplingRate'):
+                        ident = audio_rate
 
-            else:
-                bucket = trash
+                    else:
+                        ident = f"{attrib.get('width')}x{attrib.get('height')}"
 
-            for repres in aset.findall('Representation'):
-                repres_attrib = repres.attrib
+                    base_url = ''
+                    segments = []
+                    seen = set()
 
-                LOGGER.debug(f'Representation found: {repres_attrib}')
+                continue
 
-                if audio_rate := repres_attrib.get('audioSamplingRate'):
-                    ident = audio_rate
+            if tag == 'BaseURL':
+                base_url = element.text or ''
 
-                else:
-                    ident = f"{repres_attrib['width']}x{repres_attrib['height']}"
+            elif tag in {'Initialization', 'SegmentURL'}:
+                attrib = element.attrib
+                url = attrib.get('sourceURL') or attrib.get('media')
+                range = attrib.get('range') or attrib.get('mediaRange') or ''
+
+                if url:
+                    # prepend base
+                    url = f'{base_url}{url}'
 
-                base_url = repres.find('BaseURL').text
+                elif range:
+                    # range without url. typically for audio
+                    url = base_url
 
-                for segment_element in repres.find('SegmentList'):
-                    attrib = segment_element.attrib
-                    url = attrib.get('sourceURL') or attrib.get('media')
-                    range = attrib.get('range') or attrib.get('mediaRange')
+                if url and (url, range) not in seen:
+                    seen.add((url, range))
+                    segments.append((url, range))
 
-                    if url:
-                        # prepend base
-                        url = f'{base_url}{url}'
+            elif tag == 'Representation':
 
-                    elif range:
-                        # range without url. typically for audio
-                        url = base_url
+                if realm in found:
+                    found[realm].append(ident)
+                    bucket = video if realm == 'video' else audio
 
-                    if url and url not in bucket[ident]:
-                        bucket[ident].append((url, range))
+                    if realm == 'video' and prefer_video and prefer_video.audio_only:
+                        # video segments are not to be downloaded
+                        segments = []
+
+                    bucket.setdefault(ident, []).extend(segments)
+
+                    if prefer_video and (realm == 'audio' or prefer_video.fixed):
+                        cls._mpd_prune(bucket, set(prefer_video.frames) if realm == 'video' else {prefer_video.sound})
+
+                segments = []
+
+            else:
+                continue
+
+            # drop processed elements to keep memory flat
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+        if prefer_video:
+            # the largest fallback is not needed once the preferred ones are found
+            for bucket, preferred in ((video, set(prefer_video.frames)), (audio, {prefer_video.sound})):
+                # renditions are picked among all of those available unless frames are fixed
+                if preferred <= bucket.keys() and (bucket is audio or prefer_video.fixed):
+                    for ident in bucket.keys() - preferred:
+                        del bucket[ident]
 
         video = sort_idents(video)
         audio = sort_idents(audio)
 
-        LOGGER.info(f"  Found media formats: video - {', '.join(video)}; audio - {', '.join(audio)}.")
+        LOGGER.info(
+            f"  Found media formats: video - {', '.join(sort_idents(dict.fromkeys(found['video'])))}; "
+            f"audio - {', '.join(sort_idents(dict.fromkeys(found['audio'])))}."
+        )
 
         return video, audio
 
-    def _kinescope_get(self, url: str, *, referer: str) -> requests.Response:
-        response = self._session.get(url, headers={'Referer': referer})
-        response.raise_for_status()
-        return response
+    @contextmanager
+    def _request(
+            self,
+            url: str,
+            *,
+            headers: dict | None = None,
+            stream: bool = False,
+            range: str = '',
+            head: bool = False,
+    ):
+        # All the requests go through per-host concurrency limits.
+        # When a host asks to slow down, the limit is lowered for Retry-After.
+        transport = self._transport
+        host = urlparse(url).netloc
+
+        with self._throttle.slot(host) as outcome:
+
+            if range:
+                opened = transport.range(url, range, headers=headers)
+
+            elif head:
+                opened = nullcontext(transport.head(url, headers=headers))
+
+            elif stream:
+                opened = transport.stream(url, headers=headers)
+
+            else:
+                opened = nullcontext(transport.get(url, headers=headers))
+
+            with opened as response:
+                status = response.status_code
+                latency = response.elapsed.total_seconds()
+                outcome.update(status=status, latency=latency)
+                self.metrics.observe(host, latency)
+
+                if status in STATUS_THROTTLED:
+                    outcome['retry_after'] = parse_retry_after(response.headers.get('Retry-After'))
+
+                yield response
+
+    def _fetch(self, url: str, *, headers: dict | None = None) -> Reply:
+        # Transient failures are retried by the scheduler.
+
+        def fetch() -> Reply:
+            with self._request(url, headers=headers) as response:
+                response.raise_for_status()
+            return response
+
+        return self._retry.run(fetch, what=url)
+
+    def _kinescope_get(self, url: str, *, referer: str) -> Reply:
+        return self._fetch(url, headers={'Referer': referer})
 
     @staticmethod
     def _hls_range(length: str, offset: str | None, cursor: dict) -> str:
@@ -237,8 +523,49 @@ class SponsrDumper:
 
         return video, audio
 
-    def _resolve_kinescope(self, embed_url: str, *, dest: Path, prefer_video: VideoPreference):
-        # Fetch the kinescope embed page, read the signed manifest from playerOptions, then download.
+    @staticmethod
+    def _kinescope_embed_id(embed_url: str) -> str:
+        return urlparse(embed_url).path.strip('/')
+
+    @staticmethod
+    def _is_kinescope_embed(url: str) -> bool:
+        # a bare kinescope embed url (https://kinescope.io/<embed_id>) to resolve the signed manifest from
+        parsed = urlparse(url)
+        path = parsed.path
+        return parsed.netloc == 'kinescope.io' and path.strip('/').count('/') == 0 and not path.endswith('.mpd')
+
+    def _kinescope_manifest(self, embed_url: str) -> Manifest:
+        # Resolved manifests are cached by embed id until their signed urls expire.
+        embed_id = self._kinescope_embed_id(embed_url)
+
+        if manifest := self._manifests.get(embed_id):
+            LOGGER.debug(f'Using cached manifest for {embed_id}')
+            return manifest
+
+        if prefetcher := self._prefetcher:
+            # might be being resolved in background
+            prefetcher.wait(embed_url)
+
+            if manifest := self._manifests.get(embed_id):
+                LOGGER.debug(f'Using prefetched manifest for {embed_id}')
+                return manifest
+
+        return self._kinescope_cache(embed_url)
+
+    def _kinescope_cache(self, embed_url: str) -> Manifest:
+        # resolves a manifest unless it is cached already
+        embed_id = self._kinescope_embed_id(embed_url)
+
+        if manifest := self._manifests.get(embed_id):
+            return manifest
+
+        with self.metrics.span('manifest'):
+            manifest = self._kinescope_resolve(embed_url)
+
+        return self._manifests.put(embed_id, manifest)
+
+    def _kinescope_resolve(self, embed_url: str) -> Manifest:
+        # Fetch the kinescope embed page, read the signed manifest from playerOptions.
         html = self._kinescope_get(embed_url, referer=f'{self._url_base}/').text
 
         matched = RE_PLAYER_OPTIONS.search(html)
@@ -250,15 +577,30 @@ class SponsrDumper:
         if hls_src := (sources.get('hls') or {}).get('src'):
             master = self._kinescope_get(hls_src, referer='https://kinescope.io/').text
             video, audio = self._m3u8_parse(master, hls_src)
-            self._media_process(video, audio, dest=dest, prefer_video=prefer_video)
+            manifest = Manifest(kind='hls', src=hls_src, video=video, audio=audio)
 
         elif mpd_src := (sources.get('dash') or {}).get('src'):
             # fall back to the signed DASH manifest
-            self._download_file(mpd_src, dest=dest, prefer_video=prefer_video)
+            mpd = self._kinescope_get(mpd_src, referer=self._referer_mpd).content
+            video, audio = self._mpd_parse(mpd)
+            manifest = Manifest(kind='dash', src=mpd_src, video=video, audio=audio)
 
         else:
             raise SponsrDumperError(f'No playable HLS/DASH source found at {embed_url}')
 
+        return manifest
+
+    def _resolve_kinescope(self, embed_url: str, *, dest: Path, prefer_video: VideoPreference):
+        manifest = self._kinescope_manifest(embed_url)
+
+        def refresh() -> Manifest:
+            # signed urls have expired midway: resolve the embed page anew
+            LOGGER.info('  Manifest signature is expired. Re-resolving ...')
+            self._manifests.drop(self._kinescope_embed_id(embed_url))
+            return self._kinescope_manifest(embed_url)
+
+        self._media_process(manifest, dest=dest, prefer_video=prefer_video, refresh=refresh)
+
     def _download_file(
             self,
             url: str,
@@ -266,118 +608,456 @@ class SponsrDumper:
             dest: Path,
             stream: bool = True,
             prefer_video: VideoPreference,
-            range: str = ''
+            range: str = '',
+            segment: bool = False,
     ):
 
-        if not url.startswith('http'):
-            url = f'{self._url_base}{url}'
-
+        url = self._url_absolute(url)
         parsed = urlparse(url)
 
-        # a bare kinescope embed url (https://kinescope.io/<embed_id>) — resolve the signed manifest
-        if not range and parsed.netloc == 'kinescope.io' and parsed.path.strip('/').count('/') == 0 \
-                and not parsed.path.endswith('.mpd'):
+        if not range and self._is_kinescope_embed(url):
             self._resolve_kinescope(url, dest=dest, prefer_video=prefer_video)
             return
 
+        if not range and (manifest := self._mpd_manifests.get(url)):
+            # parsed already for an estimate
+            self._media_process(manifest, dest=dest, prefer_video=prefer_video)
+            return
+
         headers = {}
 
         if range:
-            headers.update({
-                'Accept': '*/*',
-                'Accept-Encoding': 'identity',
-                'Connection': 'keep-alive',
-                'Range': f'bytes={range}',
-                'Referer': 'https://kinescope.io/',
-            })
+            headers.update(self._headers_segment)
 
         is_mpd = parsed.path.endswith('.mpd')
-        dest_tmp = None
 
         if is_mpd:
-            headers['Referer'] = (
-                'https://kinescope.io/203245765?enableIframeApi'
-                '&playerId=player&size%5Bwidth%5D=100%25&size%5Bheight%5D=100%25&preload=none'
-            )
-            dest_tmp = dest.with_suffix('.tmp')
+            headers['Referer'] = self._referer_mpd
+
+        target = Path(dest)
+        resume_from = 0
+
+        def fetch() -> bytes:
+            # A ranged (segment) request is idempotent: on retry the chunk is rewritten as a whole.
+            # A plain download is resumed from what is already written when the server supports ranges.
+            nonlocal resume_from
+            range_fetch = range
+
+            if resume_from:
+                range_fetch = f'{resume_from}-'
+
+            with self._request(url, stream=stream, headers=headers, range=range_fetch) as response:
+
+                if response.status_code == 403:
+                    LOGGER.error('Access denied.')
+
+                response.raise_for_status()
+
+                if is_mpd:
+                    span.bytes += len(response.content)
+                    return response.content
 
-        with self._session.get(url, stream=stream, headers=headers) as response:
+                resumed = resume_from and response.status_code == 206
 
-            if response.status_code == 403:
-                LOGGER.error('Access denied.')
+                writer = self._writers.open(target, append=bool(resumed), size=content_length(response.headers))
 
-            response.raise_for_status()
+                resumable = not range and response.headers.get('Accept-Ranges') == 'bytes'
 
-            with Path(dest_tmp or dest).open('wb') as f:
-                f.writelines(response.iter_content(chunk_size=1024))
+                try:
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        # the chunk is written by a writer thread (if any) while the next one is read
+                        writer.write(chunk)
+                        span.bytes += len(chunk)
+                        self._received(len(chunk))
+
+                except BaseException:
+                    # the error is not to be masked by that of writing, if any
+                    written = writer.close(check=False)
+
+                    if resumable:
+                        resume_from = written
+
+                    raise
+
+                writer.close()
+
+            return b''
+
+        with self.metrics.span('manifest' if is_mpd else 'segments' if range or segment else 'files') as span:
+            mpd = self._retry.run(fetch, what=url)
 
         if is_mpd:
-            try:
-                # download mpd chunks
-                self._mpd_process(mpd=dest_tmp, dest=dest, prefer_video=prefer_video)
+            # download mpd chunks
+            self._mpd_process(mpd=mpd, src=url, dest=dest, prefer_video=prefer_video)
 
-            finally:
-                _CLEANUP and dest_tmp.unlink(missing_ok=True)
+    def _mpd_process(self, *, mpd: bytes, src: str, dest: Path, prefer_video: VideoPreference):
+        video, audio = self._mpd_parse(mpd, prefer_video=prefer_video)
+        manifest = Manifest(kind='dash', src=src, video=video, audio=audio)
+        self._media_process(manifest, dest=dest, prefer_video=prefer_video)
 
-    def _mpd_process(self, *, mpd: Path, dest: Path, prefer_video: VideoPreference):
-        video, audio = self._mpd_parse(mpd)
-        self._media_process(video, audio, dest=dest, prefer_video=prefer_video, work_dir=mpd.parent)
+    @staticmethod
+    def _media_sound(manifest: Manifest, *, prefer_video: VideoPreference) -> str:
+        # preferred audio ident, the largest one if absent
+        audio = manifest.audio
+        return prefer_video.sound if prefer_video.sound in audio else next(reversed(audio), '')
+
+    def _media_pick(self, manifest: Manifest, *, prefer_video: VideoPreference) -> tuple[str, str]:
+        # preferred video and audio idents, the largest ones if absent
+        video, audio = manifest.video, manifest.audio
+        frame = prefer_video.frame
+        sound = self._media_sound(manifest, prefer_video=prefer_video)
+
+        if frame in video:
+            pass
+
+        elif cap := prefer_video.cap:
+            frame = pick_capped(list(video), cap)
+
+        elif frame == AUTO and (auto := self._auto):
+            renditions = [audio.get(sound, []), *video.values()]
+
+            with ThreadPoolExecutor(max_workers=len(renditions)) as pool:
+                # renditions with no byte ranges are probed at once
+                sound_size, *sizes = pool.map(lambda segments: self._media_size(segments)[0], renditions)
+
+            frame = auto.pick({ident: size + sound_size for ident, size in zip(video, sizes, strict=True)})
+
+        else:
+            frame = next(reversed(video), '')
+
+        return frame, sound
+
+    def _media_frames(self, manifest: Manifest, *, prefer_video: VideoPreference) -> tuple[dict[str, str], str]:
+        # video idents picked by frame preferences and the audio ident
+        frames = prefer_video.frames
+
+        if prefer_video.audio_only:
+            # no video rendition: the audio is remuxed alone
+            return {prefer_video.frame: ''}, self._media_sound(manifest, prefer_video=prefer_video)
+
+        if len(frames) == 1:
+            frame, sound = self._media_pick(manifest, prefer_video=prefer_video)
+            return {prefer_video.frame: frame}, sound
+
+        picked = {}
+        sound = ''
+
+        for frame in frames:
+            picked[frame], sound = self._media_pick(manifest, prefer_video=prefer_video._replace(frame=frame))
+
+        return picked, sound
+
+    def _media_size(self, segments: list[tuple[str, str]], *, probe: bool = True) -> tuple[int, int]:
+        # bytes and guessed bytes of media segments: from byte ranges,
+        # or Content-Length of the first unranged one taken for all of them (unless not to probe)
+        received = 0
+        unranged = []
+
+        for url, url_range in segments:
+            if url_range and (size := range_size(url_range)) is not None:
+                received += size
+
+            else:
+                unranged.append(url)
+
+        guessed = 0
+
+        if unranged and probe:
+            # segments of a rendition are alike
+            url = unranged[0]
+
+            if (size := self._segment_sizes.get(url)) is None:
+                size = self._segment_sizes[url] = self._plan_size(url, headers=self._headers_segment) or 0
+
+            guessed = size * len(unranged)
+
+        return received + guessed, guessed
 
     def _media_process(
             self,
-            video: dict,
-            audio: dict,
+            manifest: Manifest,
             *,
             dest: Path,
             prefer_video: VideoPreference,
             work_dir: Path | None = None,
+            refresh: Callable[[], Manifest] | None = None,
     ):
-        dest_tmp = ((work_dir or dest.parent) / 'tmp').absolute()
-        dest_tmp.mkdir(parents=True, exist_ok=True)
+        scratch = work_dir or self.scratch_dir
+        scratch_root = (scratch or dest.parent / 'tmp').absolute()
+        scratch_root.mkdir(parents=True, exist_ok=True)
 
-        def download_all(urls: list[tuple[str, str]], *, suffix: str, label: str):
+        # files of concurrent jobs (and runs) get directories of their own
+        dest_tmp = Path(mkdtemp(prefix='sponsrdump-', dir=scratch_root))
 
-            total = len(urls)
-            for idx, (url, range) in enumerate(urls, 1):
-                file_dest = dest_tmp / f'{idx:>05}_{suffix}{dest.suffix}'
-                self._download_file(url, dest=file_dest, prefer_video=prefer_video, range=range)
-                progress(label, idx, total)
+        lock = Lock()
+        current = {'manifest': manifest, 'generation': 0}
 
-        try:
-            videos = video.get(prefer_video.frame) or (video[list(video.keys())[-1]] if video else [])
-            audios = audio.get(prefer_video.sound) or (audio[list(audio.keys())[-1]] if audio else [])
+        def segment(realm: str, ident: str, idx: int) -> tuple[tuple[str, str], int]:
+            with lock:
+                return getattr(current['manifest'], realm)[ident][idx - 1], current['generation']
+
+        def resign(realm: str, ident: str, total: int, generation: int):
+            # map the re-signed segment list onto the old one by index;
+            # concurrent workers hitting the same expiry re-sign only once
+            with lock:
+                if generation != current['generation']:
+                    return
+
+                renewed = refresh()
+                if len(getattr(renewed, realm).get(ident, [])) != total:
+                    raise SponsrDumperError(f'Unable to map re-signed {realm} segments of {ident} onto previous ones')
+
+                current.update(manifest=renewed, generation=generation + 1)
+
+        def fetch(realm: str, ident: str, idx: int, total: int, suffix: str):
+            file_dest = dest_tmp / f'{idx:>05}_{suffix}{dest.suffix}'
+            (url, url_range), generation = segment(realm, ident, idx)
+
+            if refresh and current['manifest'].expired:
+                resign(realm, ident, total, generation)
+                (url, url_range), generation = segment(realm, ident, idx)
+
+            try:
+                self._download_file(url, dest=file_dest, prefer_video=prefer_video, range=url_range, segment=True)
+
+            except HTTPError as e:
+                if not refresh or e.response is None or e.response.status_code not in {403, 410}:
+                    raise
+
+                # signature might have been revoked before the expected expiry
+                resign(realm, ident, total, generation)
+                (url, url_range), _ = segment(realm, ident, idx)
+                self._download_file(url, dest=file_dest, prefer_video=prefer_video, range=url_range, segment=True)
+
+        def download_engine(realm: str, ident: str, total: int, *, suffix: str, label: str):
+            # all the segments are in flight in the engine loop; those failed
+            # with a revoked signature are downloaded once more after re-signing
+
+            def downloads(idxs: list[int]) -> list[Download]:
+                with lock:
+                    segments = getattr(current['manifest'], realm)[ident]
+
+                return [
+                    Download(
+                        url=segments[idx - 1][0],
+                        dest=dest_tmp / f'{idx:>05}_{suffix}{dest.suffix}',
+                        range=segments[idx - 1][1],
+                        headers=self._headers_segment if segments[idx - 1][1] else None,
+                    )
+                    for idx in idxs
+                ]
+
+            done = 0
+
+            def on_done(_: Download):
+                nonlocal done
+                done += 1
+                progress(label, done, total)
+
+            # called from the loop thread, where the counter of the file is not set
+            counter = self._counter.get()
+
+            def on_received(_: Download, size: int):
+                if counter:
+                    counter.add(size)
+
+            def download_pending(idxs: list[int]) -> list[Exception | None]:
+                return self._engine.download(
+                    downloads(idxs), on_done=on_done, on_received=on_received, phase='segments'
+                )
+
+            if refresh and current['manifest'].expired:
+                resign(realm, ident, total, current['generation'])
 
-            LOGGER.debug(f'Found: video {len(videos)}; audio {len(audios)}.')
+            pending = list(range(1, total + 1))
+            generation = current['generation']
+            errors = download_pending(pending)
+            failed = [(idx, error) for idx, error in zip(pending, errors, strict=True) if error]
 
-            download_all(videos, suffix='vid', label='video')
+            if refresh and failed and all(
+                isinstance(error, HTTPError) and error.response.status_code in {403, 410} for _, error in failed
+            ):
+                resign(realm, ident, total, generation)
+                pending = [idx for idx, _ in failed]
+                errors = download_pending(pending)
+                failed = [(idx, error) for idx, error in zip(pending, errors, strict=True) if error]
 
-            inputs = []
-            if videos:
-                LOGGER.info('  Joining video chunks ...')
-                inputs.append(self._concat_chunks(src=dest_tmp, suffix='vid'))
+            if failed:
+                raise failed[0][1]
 
-            download_all(audios, suffix='aud', label='audio')
+        def download_all(realm: str, ident: str, *, suffix: str, label: str):
 
+            total = len(getattr(manifest, realm).get(ident, []))
+
+            if self._engine:
+                download_engine(realm, ident, total, suffix=suffix, label=label)
+                return
+
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                futures = [
+                    # workers count bytes into the counter of the file
+                    pool.submit(copy_context().run, fetch, realm, ident, idx, total, suffix)
+                    for idx in range(1, total + 1)
+                ]
+
+                try:
+                    for done, future in enumerate(as_completed(futures), 1):
+                        future.result()
+                        progress(label, done, total)
+
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+
+        try:
+            picked, sound = self._media_frames(manifest, prefer_video=prefer_video)
+            audios = manifest.audio.get(sound, [])
+
+            # destinations by video idents: a single one for a single frame preference,
+            # else one per preference named after it (several ones may pick the same ident)
+            frames = defaultdict(list)
+            for frame, ident in picked.items():
+                frames[ident].append(dest if len(picked) == 1 else dest.with_name(frame_filename(dest.name, frame)))
+
+            LOGGER.debug(f'Found: video {[len(manifest.video.get(frame, [])) for frame in frames]}; '
+                         f'audio {len(audios)}.')
+
+            # renditions with no byte ranges are probed (a request each, unless probed already)
+            audio_size, _ = self._media_size(audios)
+            video_sizes = {frame: self._media_size(manifest.video.get(frame, []))[0] for frame in frames}
+
+            if unknown := [
+                ident for ident, segments, size in (
+                    *((frame, manifest.video.get(frame), size) for frame, size in video_sizes.items()),
+                    (sound, audios, audio_size),
+                )
+                if segments and not size
+            ]:
+                LOGGER.info(f"  Size of {', '.join(unknown)} is unknown. Disk space is checked for the rest only.")
+
+            self._space_check(
+                dest_tmp,
+                dest.parent,
+                # chunks of a rendition and their joined copy
+                scratch_bytes=2 * (audio_size + max(video_sizes.values(), default=0)),
+                dest_bytes=sum((video_sizes[frame] + audio_size) * len(dests) for frame, dests in frames.items()),
+            )
+
+            if self.workers > 1 and not self._engine:
+                # have connections to CDN ready for the workers
+                self._transport.warm(
+                    [
+                        segments[0][0]
+                        for segments in (*(manifest.video.get(frame, []) for frame in frames), audios)
+                        if segments
+                    ],
+                    connections=self.workers,
+                    # as segments are requested
+                    headers=self._headers_segment,
+                    slot=self._throttle.try_slot,
+                )
+
+            # the audio is shared by all the videos
+            download_all('audio', sound, suffix='aud', label='audio')
+
+            audio_joined = None
             if audios:
                 LOGGER.info('  Joining audio chunks ...')
-                inputs.append(self._concat_chunks(src=dest_tmp, suffix='aud'))
+                with self.metrics.span('concat'):
+                    audio_joined = self._concat_chunks(src=dest_tmp, suffix='aud')
+
+            for frame, dests in frames.items():
+                download_all('video', frame, suffix='vid', label=f'video {frame}' if len(frames) > 1 else 'video')
+
+                inputs = []
+                if manifest.video.get(frame):
+                    LOGGER.info('  Joining video chunks ...')
+                    with self.metrics.span('concat'):
+                        inputs.append(self._concat_chunks(src=dest_tmp, suffix='vid'))
+
+                audio_joined and inputs.append(audio_joined)
+
+                if not inputs:
+                    continue
 
-            if inputs:
                 # join video + audio (only the streams that are actually present)
                 LOGGER.info('  Compiling final video ...')
                 args_in = ' '.join(f'-i "{src}"' for src in inputs)
-                call(
-                    f'ffmpeg {args_in} -c copy {shlex.quote(str(dest))}',
-                    cwd=dest_tmp,
-                )
+
+                for dest_frame in dests:
+                    with self.metrics.span('mux'):
+                        call(
+                            f'ffmpeg {args_in} -c copy {shlex.quote(str(dest_frame))}',
+                            cwd=dest_tmp,
+                        )
+
+                if inputs[0] is not audio_joined:
+                    # space is freed for the next rendition
+                    inputs[0].unlink(missing_ok=True)
 
         finally:
-            _CLEANUP and shutil.rmtree(dest_tmp)
+            if _CLEANUP:
+                shutil.rmtree(dest_tmp)
+
+                if not scratch:
+                    with suppress(OSError):
+                        # the common directory is left while other jobs use it
+                        scratch_root.rmdir()
+
+    @staticmethod
+    def _space_check(scratch: Path, dest: Path, *, scratch_bytes: int, dest_bytes: int):
+        # media chunks are not downloaded unless there is enough space for them (as far as sizes are known)
+        required = {scratch: scratch_bytes, dest: dest_bytes}
+
+        if scratch.stat().st_dev == dest.stat().st_dev:
+            required = {scratch: scratch_bytes + dest_bytes}
 
-    def _get_response(self, url: str, *, xhr: bool = False) -> requests.Response:
+        for path, size in required.items():
+            free = shutil.disk_usage(path).free
 
+            if size > free:
+                raise SponsrDumperError(
+                    f'Not enough disk space at {path}: {size / 1024 / 1024:.1f} MB required, '
+                    f'{free / 1024 / 1024:.1f} MB free'
+                )
+
+    def _emit(self, event: Event):
+        if on_event := self._on_event:
+            on_event(event)
+
+    def _received(self, size: int):
+        # bytes of the file being dumped are received
+        if counter := self._counter.get():
+            counter.add(size)
+
+    @contextmanager
+    def _tracked(self, file_id: str):
+        # bytes received for the file are counted; a failure is reported
+        counter = ByteCounter(file_id, emit=self._emit)
+        token = self._counter.set(counter)
+
+        try:
+            yield counter
+
+        except StreamClosed:
+            raise
+
+        except Exception as e:
+            self._emit(FileFailed(file_id, e))
+            raise
+
+        finally:
+            self._counter.reset(token)
+
+    def _url_absolute(self, url: str) -> str:
         if not url.startswith('http'):
             url = f'{self._url_base}{url}'
+        return url
+
+    def _get_response(self, url: str, *, xhr: bool = False) -> Reply:
+
+        url = self._url_absolute(url)
 
         headers = {}
 
@@ -389,10 +1069,7 @@ class SponsrDumper:
                 'Sec-Fetch-Site': 'same-origin',
             })
 
-        response = self._session.get(url, headers=headers)
-        response.raise_for_status()
-
-        return response
+        return self._fetch(url, headers=headers)
 
     def _normalize_files(self, post: dict):
 
@@ -483,14 +1160,26 @@ class SponsrDumper:
         func_filter = func_filter or (lambda post_info: post_info)
 
         while rows_seen < rows_total:
-            data = self._get_response(f'/project/{project_id}/more-posts/?offset={rows_seen}').json()['response']
+            with self.metrics.span('listing') as span:
+                response = self._get_response(f'/project/{project_id}/more-posts/?offset={rows_seen}')
+                span.bytes = len(response.content)
+
+            data = response.json()['response']
             posts_current = data['rows']
 
             rows_seen += len(posts_current)
             posts_current = [post for post in posts_current if func_filter(post)]
 
             for post in posts_current:
-                self._normalize_files(post)
+                with self.metrics.span('normalization'):
+                    self._normalize_files(post)
+
+                self._emit(PostDiscovered(
+                    post_id=f"{post['post_id']}",
+                    title=post['post_title'],
+                    url=post.get('post_url', ''),
+                    files=sum(len(files) for files in post['__files'].values()),
+                ))
 
             posts_all.extend(posts_current)
             rows_total = data['rows_count']
@@ -522,7 +1211,7 @@ class SponsrDumper:
 
             with path.open() as f:
                 data = f.read().strip().rstrip(';')
-                self._session.cookies = cookiejar_from_dict(
+                self._transport.cookies = cookiejar_from_dict(
                     dict(
                         line.strip().split('=', 1)
                         for line in data.split(';')
@@ -537,7 +1226,7 @@ class SponsrDumper:
             return f.write(
                 ';'.join([
                     f'{key}={val}'
-                    for key, val in self._session.cookies.get_dict().items()
+                    for key, val in self._transport.cookies.get_dict().items()
                 ])
             )
 
@@ -555,6 +1244,9 @@ class SponsrDumper:
             data = json.load(f)
 
         self._dumped = data.get('dumped', {})
+        # kept in the configuration by earlier versions
+        self._manifests.load(data.get('manifests', {}))
+        self._manifests_load()
 
     def _conf_save(self):
 
@@ -570,6 +1262,34 @@ class SponsrDumper:
                 indent=2,
             )
 
+        self._manifests_save()
+
+    def _manifests_load(self):
+        # Resolved manifests are kept apart from the configuration:
+        # they are bulky (segments of every rendition) and only useful till their signatures expire.
+        fname = Path(self._fname_manifests)
+
+        if not fname.exists():
+            return
+
+        with fname.open() as f:
+            data = json.load(f)
+
+        self._manifests.load(data.get('kinescope', {}))
+        self._mpd_manifests.load(data.get('mpd', {}))
+
+    def _manifests_save(self):
+
+        fname = Path(self._fname_manifests)
+        kinescope, mpd = self._manifests.export(), self._mpd_manifests.export()
+
+        if not (kinescope or mpd):
+            fname.unlink(missing_ok=True)
+            return
+
+        with fname.open('w') as f:
+            json.dump({'kinescope': kinescope, 'mpd': mpd}, f, ensure_ascii=False)
+
     @contextmanager
     def _configuration(self):
         self._conf_load()
@@ -579,6 +1299,155 @@ class SponsrDumper:
         finally:
             self._conf_save()
 
+    @contextmanager
+    def _summarized(self):
+        try:
+            yield
+
+        finally:
+            LOGGER.info(f'Run summary:\n{pformat(self.summary(), indent=2)}')
+            LOGGER.debug(f'Connection pools:\n{pformat(self._transport.stats(), indent=2)}')
+
+    @contextmanager
+    def _writing(self):
+        # writer threads are stopped once downloads of a run are over
+        try:
+            yield
+
+        finally:
+            self._writers.close()
+
+    @contextmanager
+    def _asynchronous(self, *, enabled: bool):
+        # Downloads are driven by the engine over aiohttp transport
+        # (spawned alongside the current one if needed) while active.
+        if not enabled:
+            yield
+            return
+
+        transport = self._transport
+
+        if isinstance(transport, RecordingTransport | ReplayTransport):
+            # the engine would bypass recording (replaying)
+            LOGGER.warning('Asynchronous downloads are not available on record and replay. Using threads.')
+            yield
+            return
+
+        spawned = not isinstance(transport, AiohttpTransport)
+
+        if spawned:
+            transport = AiohttpTransport(headers=self._headers, pool_size=self._transport.pool_size)
+            transport.cookies = self._transport.cookies
+
+        self._engine = AsyncEngine(
+            transport,
+            throttle=self._throttle,
+            retry=self._retry,
+            metrics=self.metrics,
+            writers=self._writers,
+        )
+        self._engine.chunk_size = self.chunk_size
+
+        try:
+            yield
+
+        finally:
+            self._engine = None
+            spawned and transport.close()
+
+    @contextmanager
+    def _auto_resolution(self, prefer_video: VideoPreference, *, enabled: bool):
+        # renditions are picked to fit the budget and the deadline over the videos pending
+        if not enabled or prefer_video.frame != AUTO:
+            yield
+            return
+
+        videos = sum(
+            1
+            for post_info in self._collected
+            for file_info in post_info['__files']['video']
+            if any(key not in self._dumped for key in self._state_keys(file_info, prefer_video=prefer_video))
+        )
+
+        self._auto = AutoResolution(
+            metrics=self.metrics,
+            videos=videos,
+            workers=self.workers,
+            budget=prefer_video.budget,
+            deadline=prefer_video.deadline,
+        )
+
+        try:
+            yield
+
+        finally:
+            self._auto = None
+
+    @contextmanager
+    def _prefetching(self, jobs: list[Job], *, ahead: int):
+        # manifests of the videos next to be dumped are resolved in background
+        urls = [
+            url
+            for job in jobs
+            if job.file['file_type'] is FileType.VIDEO
+            and self._is_kinescope_embed(url := self._url_absolute(job.file['file_path']))
+        ]
+
+        if not ahead or not urls:
+            yield
+            return
+
+        prefetcher = self._prefetcher = ManifestPrefetcher(self._kinescope_cache, urls, ahead=ahead)
+
+        try:
+            yield
+
+        finally:
+            self._prefetcher = None
+            prefetcher.close()
+
+    def summary(self) -> dict:
+        """Returns statistics of the run: retries, per-host requests, metrics and memory."""
+        return {
+            'retries': self._retry.stats(),
+            'hosts': self._throttle.stats(),
+            'metrics': self.metrics.stats(),
+            'budget_exhausted': self._budget.exhausted if self._budget else '',
+            'memory': {
+                # bytes received and held till written
+                'buffers': self._buffers.stats(),
+                'rss_peak': peak_rss(),
+            },
+        }
+
+    def _dump_text(self, content: str, *, dest: Path, fmt: bool | str, to_video: bool) -> Path:
+
+        with self.metrics.span('text'):
+            converter_alias_md = 'md'
+            converter_alias = converter_alias_md if isinstance(fmt, bool) else fmt
+
+            if to_video:
+
+                conversion_required = converter_alias != converter_alias_md
+
+                text_to_video_src_filename = TextConverter.spawn(
+                    converter_alias_md
+                ).dump(content, dest=dest)
+
+                with self.metrics.span('text_video'):
+                    convert_text_to_video(text_to_video_src_filename)
+
+                if conversion_required:
+                    text_to_video_src_filename.unlink(missing_ok=True)
+
+            if converter_alias != converter_alias_md:
+
+                dest = TextConverter.spawn(
+                    converter_alias
+                ).dump(content, dest=dest)
+
+        return dest
+
     def search(self, *, func_filter: Callable[[dict], bool] | None = None) -> int:
 
         LOGGER.info(f'Searching data for {self.url} ...')
@@ -611,8 +1480,38 @@ class SponsrDumper:
         text: bool | str = True,
         text_to_video: bool = True,
         prefer_video: VideoPreference | None = None,
+        asynchronous: bool = False,
+        max_time: float = 0,
+        max_bytes: int = 0,
+        max_files: int = 0,
+        order: str = ORDER_LISTING,
+        file_workers: int = 1,
+        prefetch: int = 2,
     ):
+        """Downloads files of the collected posts.
+
+        :param asynchronous: drive media segments, audio, images and attachments downloads
+            with a single event loop (requires aiohttp), so that hundreds of them are in flight.
+        :param max_time: seconds for the run. 0 - unlimited
+        :param max_bytes: bytes to receive in the run. 0 - unlimited
+        :param max_files: files to dump in the run. 0 - unlimited
+
+            Files are not started if any of max_* would be exceeded (smaller ones after them may still be).
+            Files dumped are remembered, so the next run dumps those postponed.
+
+        :param order: order to dump files in (see schedule.ORDERS). Files are named
+            in listing order anyway. Sizes for 'smallest' and 'largest' are estimated
+            from video manifests (kept for the dump), audio duration and Content-Length.
+        :param file_workers: number of files (e.g. videos) dumped concurrently.
+            With 'largest' order, a large file is not left to be dumped alone at the end.
+        :param prefetch: number of videos to resolve Kinescope manifests for in background
+            ahead of those being dumped. 0 - resolve on reaching a video
+
+        """
         prefer_video = prefer_video or VideoPreference()
+        prefer_video.check()
+        file_workers = max(file_workers, 1)
+        budget = self._budget = RunBudget(seconds=max_time, bytes=max_bytes, files=max_files)
 
         LOGGER.info(f'Start dump using preference: {prefer_video} ...')
 
@@ -641,87 +1540,518 @@ class SponsrDumper:
         text and realms.append('text')
         attaches and realms.append('attaches')
 
-        with self._configuration():
+        posts_total = len(collected)
+
+        def msg_prefix(post_info: dict) -> str:
+            idx = post_info['__idx']
+            return f'[{idx}/{posts_total} {round(100 * idx / posts_total, 1)}%] '
 
-            post_idx = 0
-            posts_total = len(collected)
+        def msg_postfix(file_info: dict) -> str:
+            return f"File {file_info['file_id']} [{file_info['file_title']}]:"
 
-            for idx, post_info in enumerate(collected, 1):
+        def jobs_enumerate() -> list[Job]:
+            # files are numbered in listing order whatever order they are dumped in
+            jobs = []
 
+            for post_idx, post_info in enumerate(collected, 1):
                 # 'post_id' 'level_id' 'post_date' 'post_title' 'post_text' 'post_url' 'tags'
-                file_idx = 0
-                post_idx += 1
                 post_info['__idx'] = post_idx
-
-                msg_prefix = f'[{idx}/{posts_total} {round(100 * idx / posts_total, 1)}%] '
+                file_idx = 0
 
                 for realm in realms:
 
                     for file_info in post_info['__files'][realm]:
-
                         # 'files': 'file_id' 'file_path' 'file_title' 'file_link' 'file_duration' 'file_order'
+                        file_idx += 1
+                        file_info['__idx'] = file_idx
 
                         file_id = file_info['file_id']
-                        file_title = file_info['file_title']
+                        keys = self._state_keys(file_info, prefer_video=prefer_video)
+                        pending = [frame for key, frame in keys.items() if key not in self._dumped]
 
-                        msg_postfix = f'File {file_id} [{file_title}]:'
+                        if not pending:
+                            LOGGER.warning(f'{msg_prefix(post_info)} Skipped {msg_postfix(file_info)}')
+                            self._emit(FileCompleted(file_id, dest / self._dumped[next(iter(keys))], skipped=True))
+                            continue
 
-                        file_id_conf = f'f_{file_id}'
+                        jobs.append(Job(
+                            post=post_info,
+                            file=file_info,
+                            realm=realm,
+                            frames=tuple(frame for frame in pending if frame),
+                        ))
+
+            if order in SIZED_ORDERS:
+                with self.metrics.span('ordering', items=len(jobs)), \
+                        ThreadPoolExecutor(max_workers=self._transport.pool_size) as estimator:
+                    # sizes are estimated concurrently, those unknown are taken for 0
+                    sizes = estimator.map(lambda job: self._job_size(job.file, prefer_video=prefer_video), jobs)
+                    jobs = [job._replace(size=size) for job, size in zip(jobs, sizes, strict=True)]
+
+            return order_jobs(jobs, order)
+
+        queued: list[tuple[Download, str, str, str, str]] = []
+        queueable = {FileType.AUDIO, FileType.IMAGE, FileType.ATTACH}
+
+        def flush():
+            # download the queued files at once
+            counters = {download.dest: ByteCounter(file_id, emit=self._emit) for download, file_id, *_ in queued}
+            started = perf_counter()
+
+            errors = self._engine.download(
+                [download for download, *_ in queued],
+                on_received=lambda download, size: counters[download.dest].add(size),
+            )
+            took = (perf_counter() - started) / len(queued)
+            failed = []
 
-                        file_idx += 1
-                        file_info['__idx'] = file_idx
+            for (download, file_id, file_id_conf, filename, realm), error in zip(queued, errors, strict=True):
+                if error:
+                    LOGGER.error(f'Unable to download {download.url}: {error}')
+                    self._emit(FileFailed(file_id, error))
+                    failed.append(error)
 
-                        if file_id_conf in self._dumped:
-                            LOGGER.warning(f'{msg_prefix} Skipped {msg_postfix}')
-                            continue
+                else:
+                    received = counters[download.dest].received
+                    self._dumped[file_id_conf] = filename
+                    budget.completed(realm, key=f'{download.dest}', seconds=took, received=received)
+                    self._emit(FileCompleted(file_id, download.dest, received=received))
+
+            queued.clear()
+
+            if failed:
+                raise failed[0]
+
+        def dump_file(job: Job, filename: str) -> tuple[str, float, int]:
+            # returns the name of the file dumped, seconds taken and bytes received
+            file_info = job.file
+            file_type = file_info['file_type']
+            dest_filename = dest / filename
+            prefer_file = prefer_video
+            started = perf_counter()
+
+            if frames := job.frames:
+                # resolutions not dumped yet
+                prefer_file = prefer_video._replace(frame=FRAMES_SEPARATOR.join(frames))
+
+                if len(frames) == 1:
+                    # named after the frame as if there were several ones
+                    dest_filename = dest / frame_filename(filename, frames[0])
+
+            with self._tracked(file_info['file_id']) as counter:
+
+                if filepath := file_info['file_path']:
+
+                    try:
+                        self._download_file(
+                            filepath,
+                            dest=dest_filename,
+                            stream=file_type is not FileType.IMAGE,
+                            prefer_video=prefer_file,
+                        )
 
-                        LOGGER.info(f'{msg_prefix} Downloading {msg_postfix}  ...')
-                        file_type = file_info['file_type']
+                    except HTTPError:
+                        LOGGER.debug('%s', pformat(file_info, indent=2))
+                        raise
 
-                        filename = truncate_filename(
-                            func_filename(post_info, file_info),
-                            max_len=MAX_FILENAME_LENGTH,
-                        )
+                if file_type is FileType.TEXT and text:
+                    dest_filename = self._dump_text(
+                        file_info['__content'], dest=dest_filename, fmt=text, to_video=text_to_video
+                    )
+                    filename = dest_filename.name
+
+            return filename, perf_counter() - started, counter.received
+
+        def complete(job: Job, dumped: tuple[str, float, int], *, key: str):
+            filename, took, received = dumped
+            file_id = job.file['file_id']
+
+            for key_state, frame in self._state_keys(job.file, prefer_video=prefer_video).items():
+                if frame in job.frames:
+                    self._dumped[key_state] = frame_filename(filename, frame)
+
+                elif not frame:
+                    self._dumped[key_state] = filename
+
+            if job.frames:
+                filename = frame_filename(filename, job.frames[0])
+
+            budget.completed(job.realm, key=key, seconds=took, received=received)
+            self._emit(FileCompleted(file_id, dest / filename, received=received))
+
+        running: dict[Future, tuple[Job, str]] = {}
+
+        def collect(*, till: int):
+            # wait for the files being dumped concurrently till fewer of them are left
+            failed = []
+
+            while len(running) > till:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    job, key = running.pop(future)
+
+                    if error := future.exception():
+                        failed.append(error)
+                        # the files being dumped are let finish
+                        till = 0
+
+                    else:
+                        complete(job, future.result(), key=key)
+
+            if failed:
+                raise failed[0]
+
+        with self._configuration(), self._summarized(), self._asynchronous(enabled=asynchronous), self._writing(), \
+                self._auto_resolution(prefer_video, enabled=video and not prefer_video.audio_only), \
+                ThreadPoolExecutor(max_workers=file_workers) as pool:
+
+            jobs = jobs_enumerate()
+
+            budget_skipped = 0
+
+            with self._prefetching(jobs, ahead=prefetch):
+
+                try:
+                    for job in jobs:
+                        post_info, file_info, realm = job.post, job.file, job.realm
+                        file_id = file_info['file_id']
+
+                        filename = func_filename(post_info, file_info)
+
+                        if realm == 'video' and prefer_video.audio_only:
+                            filename = f'{Path(filename).stem}{AUDIO_ONLY_SUFFIX}'
+
+                        filename = truncate_filename(filename, max_len=MAX_FILENAME_LENGTH)
                         dest_filename = dest / filename
+                        # file ids (e.g. of images) may repeat across posts, destinations do not
+                        key = f'{dest_filename}'
 
-                        if filepath := file_info['file_path']:
+                        size = job.size
 
-                            try:
-                                self._download_file(
-                                    filepath,
-                                    dest=dest_filename,
-                                    stream=file_type is not FileType.IMAGE,
-                                    prefer_video=prefer_video
+                        if not size and budget.needs_size(realm):
+                            # the first file of a kind is judged by its own estimate
+                            size = self._job_size(file_info, prefer_video=prefer_video)
+
+                        if not budget.take(realm, key=key, size=size):
+                            if not budget_skipped:
+                                LOGGER.warning(
+                                    f'Run budget is exhausted ({budget.exhausted}). '
+                                    'Files that do not fit are to be dumped on the next run.'
                                 )
 
-                            except HTTPError:
-                                LOGGER.debug('%s', pformat(file_info, indent=2))
-                                raise
+                            budget_skipped += 1
+                            LOGGER.debug(f'{msg_prefix(post_info)} Postponed {msg_postfix(file_info)}')
+                            # a smaller file may still fit
+                            continue
+
+                        LOGGER.info(f'{msg_prefix(post_info)} Downloading {msg_postfix(file_info)}  ...')
+
+                        self._emit(FileQueued(
+                            post_id=f"{post_info['post_id']}",
+                            file_id=file_id,
+                            kind=realm,
+                            dest=dest_filename,
+                        ))
+
+                        filepath = file_info['file_path']
+
+                        if filepath and (prefetcher := self._prefetcher):
+                            # manifests of the next videos are resolved while this file is dumped
+                            prefetcher.started(self._url_absolute(filepath))
+
+                        if filepath and self._engine and file_info['file_type'] in queueable:
+                            download = Download(self._url_absolute(filepath), dest_filename)
+                            queued.append((download, file_id, f'f_{file_id}', filename, realm))
+
+                            if len(queued) >= self._engine.in_flight:
+                                flush()
+
+                            continue
+
+                        if file_workers == 1:
+                            complete(job, dump_file(job, filename), key=key)
+                            continue
+
+                        running[pool.submit(dump_file, job, filename)] = job, key
+                        collect(till=file_workers - 1)
+
+                finally:
+                    try:
+                        # files being dumped are completed (or failed) before the configuration is saved
+                        collect(till=0)
+
+                    finally:
+                        # as well as those queued, even if a file has failed
+                        queued and flush()
 
-                        if file_type is FileType.TEXT and text:
+    def _plan_size(self, url: str, *, headers: dict | None = None) -> int | None:
+        # Size of a resource from a HEAD request, or else from the first byte of it asked for
+        def fetch() -> int | None:
+            try:
+                with self._request(url, headers=headers, head=True) as response:
+                    if response.status_code == 200 and (length := response.headers.get('Content-Length')):
+                        return int(length)
+
+            except RequestException as e:
+                LOGGER.debug(f'Unable to get size of {url} with HEAD: {e}')
+
+            # HEAD is not allowed (e.g. by signed urls) or tells no size
+            with self._request(url, headers=headers, range='0-0') as response:
+                response.raise_for_status()
+
+                if response.status_code == 206:
+                    # bytes 0-0/<size>
+                    total = response.headers.get('Content-Range', '').rpartition('/')[2]
+                    return int(total) if total.isdigit() else None
+
+                # the range is ignored: the body is left unread
+                length = response.headers.get('Content-Length')
+                return int(length) if length else None
+
+        try:
+            return self._retry.run(fetch, what=url)
+
+        except RequestException as e:
+            LOGGER.warning(f'Unable to get size of {url}: {e}')
+            return None
+
+    def _plan_rate(self, url: str, *, range: str) -> float:
+        # bytes per second of a sample download (a media segment), 0 if unknown
+        def fetch() -> float:
+            started = perf_counter()
+
+            with self._request(url, range=range, headers=self._headers_segment) as response:
+                response.raise_for_status()
+                received = len(response.content)
+
+            took = perf_counter() - started
+            return received / took if took else 0
+
+        try:
+            return self._retry.run(fetch, what=url)
 
-                            converter_alias_md = MarkdownConverter.alias
-                            converter_alias = converter_alias_md if isinstance(text, bool) else text
+        except RequestException as e:
+            LOGGER.warning(f'Unable to measure download rate with {url}: {e}')
+            return 0
 
-                            if text_to_video:
+    def _state_keys(self, file_info: dict, *, prefer_video: VideoPreference) -> dict[str, str]:
+        # keys of a file in the dumped files state by frame preferences:
+        # one per frame for a video dumped in several resolutions, a single one (no frame) otherwise
+        file_id_conf = f"f_{file_info['file_id']}"
+        frames = prefer_video.frames
+        is_video = file_info['file_type'] is FileType.VIDEO
 
-                                conversion_required = converter_alias != converter_alias_md
+        if is_video and prefer_video.audio_only:
+            # dumped apart from the video itself
+            return {f'{file_id_conf}@audio': ''}
 
-                                text_to_video_src_filename = TextConverter.spawn(
-                                    converter_alias_md
-                                ).dump(file_info['__content'], dest=dest_filename)
+        if is_video and len(frames) > 1:
+            return {f'{file_id_conf}@{frame}': frame for frame in frames}
 
-                                convert_text_to_video(text_to_video_src_filename)
+        return {file_id_conf: ''}
 
-                                if conversion_required:
-                                    text_to_video_src_filename.unlink(missing_ok=True)
+    def _plan_manifest(self, url: str, *, prefer_video: VideoPreference) -> tuple[Manifest, int]:
+        # manifest of a video and the number of requests resolving it takes
+        # (the dump makes none of them while the manifest resolved here is valid)
+        if self._is_kinescope_embed(url):
+            manifest = self._kinescope_manifest(url)
+            # embed page and master playlist with media ones, or the mpd
+            return manifest, 2 + len(manifest.video) + len(manifest.audio) if manifest.kind == 'hls' else 2
+
+        if manifest := self._mpd_manifests.get(url):
+            return manifest, 1
+
+        mpd = self._fetch(url, headers={'Referer': self._referer_mpd}).content
+        # all the representations are kept, so that the manifest is reused on dump whatever picked
+        video, audio = self._mpd_parse(mpd)
+
+        return self._mpd_manifests.put(url, Manifest(kind='dash', src=url, video=video, audio=audio)), 1
+
+    def _job_size(self, file_info: dict, *, prefer_video: VideoPreference) -> int:
+        # estimated bytes of a file to be dumped, 0 if unknown
+        file_type = file_info['file_type']
+
+        if file_type is FileType.TEXT:
+            return len(file_info['__content'].encode())
+
+        if file_type is FileType.AUDIO and (duration := file_info.get('file_duration')):
+            return int(duration * AUDIO_BITRATE / 8)
+
+        url = self._url_absolute(file_info['file_path'])
+
+        if file_type is not FileType.VIDEO:
+            return self._plan_size(url) or 0
+
+        if prefer_video.frame == AUTO:
+            # renditions are picked on download: the largest ones are taken for an estimate
+            prefer_video = prefer_video._replace(frame='best')
+
+        try:
+            manifest, _ = self._plan_manifest(url, prefer_video=prefer_video)
 
-                            if converter_alias != converter_alias_md:
+        except (RequestException, SponsrDumperError) as e:
+            LOGGER.warning(f'Unable to estimate size of {url}: {e}')
+            return 0
 
-                                dest_filename = TextConverter.spawn(
-                                    converter_alias
-                                ).dump(file_info['__content'], dest=dest_filename)
+        _, received, _ = self._plan_media(manifest, prefer_video=prefer_video)
+        return received
 
-                            filename = dest_filename.name
+    def _plan_media(self, manifest: Manifest, *, prefer_video: VideoPreference) -> tuple[int, int, int]:
+        # requests, bytes and guessed bytes for segments of the representations to be downloaded
+        picked, sound = self._media_frames(manifest, prefer_video=prefer_video)
+        requests, received, guessed = 0, 0, 0
+
+        # the audio is downloaded once for all the videos, as well as a video picked for several preferences
+        renditions = [manifest.video.get(frame, []) for frame in dict.fromkeys(picked.values())]
+        renditions.append(manifest.audio.get(sound, []))
+
+        for segments in renditions:
+            received_segments, guessed_segments = self._media_size(segments)
+            requests += len(segments)
+            received += received_segments
+            guessed += guessed_segments
+
+        return requests, received, guessed
+
+    def plan(
+            self,
+            *,
+            audio: bool = True,
+            video: bool = True,
+            images: bool = True,
+            attaches: bool = True,
+            text: bool | str = True,
+            prefer_video: VideoPreference | None = None,
+    ) -> Plan:
+        """Estimates the dump of the collected posts without downloading payloads:
+        files, HTTP requests, bytes and time.
+
+        Video manifests are resolved and kept in a file next to the configuration one,
+        so that a subsequent .dump() reuses them while their signatures are valid.
+        Sizes are taken from byte ranges of media segments, HEAD requests
+        or audio duration. The rate is measured by downloading a single media segment.
+
+        Arguments are those of .dump().
+
+        """
+        prefer_video = prefer_video or VideoPreference()
+        prefer_video.check()
+
+        realms = [
+            realm for realm, enabled in (
+                ('audio', audio),
+                ('video', video),
+                ('images', images),
+                ('text', text),
+                ('attaches', attaches),
+            )
+            if enabled
+        ]
+
+        posts = []
+        rate = 0
+
+        with self._configuration(), self.metrics.span('plan', items=len(self._collected)):
+
+            for post_info in self._collected:
+                post = PostPlan(post_id=f"{post_info['post_id']}", title=post_info['post_title'])
+
+                for realm in realms:
+                    for file_info in post_info['__files'][realm]:
+
+                        if all(key in self._dumped for key in self._state_keys(file_info, prefer_video=prefer_video)):
+                            continue
+
+                        file_type = file_info['file_type']
+                        filepath = file_info['file_path']
+
+                        if file_type is FileType.TEXT:
+                            post = post.add(files=1, bytes=len(file_info['__content'].encode()))
+                            continue
+
+                        url = self._url_absolute(filepath)
+
+                        if file_type is FileType.VIDEO:
+                            manifest, requests = self._plan_manifest(url, prefer_video=prefer_video)
+                            segments, received, guessed = self._plan_media(manifest, prefer_video=prefer_video)
+                            post = post.add(files=1, requests=requests + segments, bytes=received, guessed=guessed)
+
+                            frame, _ = self._media_pick(manifest, prefer_video=prefer_video)
+                            if not rate and (sample := manifest.video.get(frame)):
+                                url, url_range = sample[len(sample) // 2]
+                                rate = self._plan_rate(url, range=url_range)
+
+                            continue
+
+                        if (size := self._plan_size(url)) is not None:
+                            post = post.add(files=1, requests=1, bytes=size)
+
+                        elif file_type is FileType.AUDIO:
+                            size = int((file_info.get('file_duration') or 0) * AUDIO_BITRATE / 8)
+                            post = post.add(files=1, requests=1, bytes=size, guessed=size)
+
+                        else:
+                            post = post.add(files=1, requests=1)
+
+                if post.files:
+                    posts.append(post)
+
+        latencies = self.metrics.stats()['requests'].values()
+        requests_count = sum(stats['count'] for stats in latencies)
+
+        plan = Plan(
+            posts=posts,
+            rate=rate,
+            latency=sum(stats['seconds'] for stats in latencies) / requests_count if requests_count else 0,
+            workers=self.workers,
+        )
+
+        LOGGER.info(f'Plan:\n{plan.report()}')
+
+        return plan
+
+    def stream(
+            self,
+            dest: str | Path,
+            *,
+            func_filter: Callable[[dict], bool] | None = None,
+            maxsize: int = 100,
+            **kwargs,
+    ) -> EventStream:
+        """Searches and dumps in a background thread, yielding events
+        (PostDiscovered, FileQueued, BytesProgressed, FileCompleted, FileFailed).
+
+            for event in dumper.stream('dump/', video=False):
+                ...
+
+            async for event in dumper.stream('dump/'):
+                ...
+
+        The dump waits while 'maxsize' events are not consumed yet (backpressure),
+        and is stopped once the iteration is.
+
+        :param dest: see .dump()
+        :param func_filter: see .search()
+        :param maxsize: maximum number of events not consumed yet
+        :param kwargs: see .dump()
+
+        """
+        on_event = self._on_event
+
+        def run(emit: Callable[[Event], None]):
+
+            def emit_all(event: Event):
+                on_event and on_event(event)
+                emit(event)
+
+            self._on_event = emit_all
+
+            try:
+                self.search(func_filter=func_filter)
+                self.dump(dest, **kwargs)
+
+            finally:
+                self._on_event = on_event
 
-                        self._dumped[file_id_conf] = filename
+        return EventStream(run, maxsize=maxsize)
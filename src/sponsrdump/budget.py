@@ -0,0 +1,131 @@
+from collections import defaultdict
+from time import perf_counter
+
+
+class RunBudget:
+    """Hard limits of a dump run: duration, bytes received and files dumped.
+
+    New files are not started once a limit would be exceeded. Whether the next file
+    fits is judged by its estimated size if known, or by files of the same kind
+    (e.g. video) dumped in the run so far, or else by all the files dumped so far.
+
+    Expected bytes of files started are reserved till they are completed,
+    so that files being dumped concurrently (or queued) count against the limit.
+
+    A file not fitting does not stop the next ones from being judged:
+    a smaller one may still fit in the bytes left.
+
+    """
+    def __init__(self, *, seconds: float = 0, bytes: int = 0, files: int = 0):
+        """
+        :param seconds: maximum run duration. 0 - unlimited
+        :param bytes: maximum bytes to receive. 0 - unlimited
+        :param files: maximum files to dump. 0 - unlimited
+
+        """
+        self.seconds = seconds
+        self.bytes = bytes
+        self.files = files
+
+        self.started = perf_counter()
+        self.received = 0
+        self.reserved = 0.0
+        """Bytes expected for files started and not completed yet."""
+        self.taken = 0
+
+        self.exhausted = ''
+        """Which limit stopped a file (the last one), if any."""
+
+        self._kinds: dict[str, dict] = defaultdict(lambda: {'count': 0, 'seconds': 0.0, 'bytes': 0})
+        self._reservations: dict[str, tuple[str, float]] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.seconds or self.bytes or self.files)
+
+    def _average(self, kind: str = '') -> tuple[float, float] | None:
+        # seconds and bytes of an average file of the kind (of any kind if not given) dumped so far
+        stats = [self._kinds[kind]] if kind in self._kinds else [] if kind else list(self._kinds.values())
+
+        if not (count := sum(item['count'] for item in stats)):
+            return None
+
+        return sum(item['seconds'] for item in stats) / count, sum(item['bytes'] for item in stats) / count
+
+    def _reserved_average(self, kind: str) -> float | None:
+        reserved = [expected for reserved_kind, expected in self._reservations.values() if reserved_kind == kind]
+        return sum(reserved) / len(reserved) if reserved else None
+
+    def needs_size(self, kind: str) -> bool:
+        """Whether the size of the next file of the kind is to be estimated to judge it by:
+        bytes are limited and there are no files of the kind dumped or started yet.
+
+        """
+        return bool(self.bytes) and not self._average(kind) and self._reserved_average(kind) is None
+
+    def completed(self, kind: str, *, key: str, seconds: float, received: int):
+        """Registers a file dumped, settling bytes reserved for it.
+
+        :param kind: e.g. video, audio
+        :param key: file identifier given to .take()
+        :param seconds: time taken by the file
+        :param received: bytes received for the file
+
+        """
+        self.received += received
+
+        if reservation := self._reservations.pop(key, None):
+            self.reserved -= reservation[1]
+
+        stats = self._kinds[kind]
+        stats['count'] += 1
+        stats['seconds'] += seconds
+        stats['bytes'] += received
+
+    def take(self, kind: str, *, key: str, size: int = 0) -> bool:
+        """Takes a file of the kind to be started from the budget. Returns False if it does not fit.
+
+        :param kind: e.g. video, audio
+        :param key: file identifier (unique in the run, e.g. destination path)
+            to settle the reservation with on .completed()
+        :param size: estimated bytes of the file. 0 - unknown
+
+        """
+        if not self:
+            return True
+
+        average = self._average(kind) or self._average()
+        seconds_next = average[0] if average else 0
+
+        # the next file is expected to be an average one of its kind unless its size is known
+        if size:
+            bytes_next = size
+
+        elif kind_average := self._average(kind):
+            bytes_next = kind_average[1]
+
+        elif (reserved := self._reserved_average(kind)) is not None:
+            bytes_next = reserved
+
+        else:
+            bytes_next = average[1] if average else 0
+
+        exhausted = ''
+
+        if self.files and self.taken + 1 > self.files:
+            exhausted = f'files: {self.files}'
+
+        elif self.bytes and self.received + self.reserved + bytes_next > self.bytes:
+            exhausted = f'bytes: {self.bytes}'
+
+        elif self.seconds and perf_counter() - self.started + seconds_next > self.seconds:
+            exhausted = f'seconds: {self.seconds}'
+
+        if exhausted:
+            self.exhausted = exhausted
+            return False
+
+        self.taken += 1
+        self.reserved += bytes_next
+        self._reservations[key] = (kind, bytes_next)
+
+        return True
@@ -0,0 +1,109 @@
+import asyncio
+import sys
+from threading import Condition
+from time import perf_counter
+
+BUFFER_LIMIT = 64 * 1024 * 1024
+"""Default bytes of downloaded data to be queued for writer threads."""
+
+
+def peak_rss() -> int:
+    """Returns peak resident set size of the process in bytes, 0 if unknown (e.g. on Windows)."""
+    try:
+        import resource  # noqa: PLC0415
+
+    except ImportError:
+        return 0
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class BufferBudget:
+    """Bounds bytes of downloaded data held in memory, shared by all the downloads.
+
+    A reader takes the bytes of a chunk received before handing it over to be written
+    and a writer gives them back once the chunk is written, so that with a slow disk
+    readers wait (and stop reading from sockets) instead of piling data up.
+
+    The limit only takes effect with writer threads (see writers.Writers): readers
+    writing chunks themselves hold a chunk at a time anyway, and are only accounted.
+
+    """
+    poll_interval: float = 0.01
+    """Seconds between attempts to take bytes from the event loop."""
+
+    def __init__(self, limit: int = BUFFER_LIMIT):
+        """
+        :param limit: maximum bytes held. 0 - unlimited
+
+        """
+        self.limit = limit
+        self.held = 0
+        self.peak = 0
+
+        self._waits = 0
+        self._waited = 0.0
+        self._cond = Condition()
+
+    def _fits(self, size: int) -> bool:
+        # a chunk larger than the limit is let through alone
+        return not self.limit or not self.held or self.held + size <= self.limit
+
+    def _take(self, size: int):
+        self.held += size
+        self.peak = max(self.peak, self.held)
+
+    def _waited_for(self, started: float):
+        self._waits += 1
+        self._waited += perf_counter() - started
+
+    def try_acquire(self, size: int) -> bool:
+        """Takes the bytes if they fit without waiting."""
+        with self._cond:
+            if not self._fits(size):
+                return False
+
+            self._take(size)
+            return True
+
+    def acquire(self, size: int):
+        """Takes the bytes, waiting till they fit."""
+        with self._cond:
+            if self._fits(size):
+                self._take(size)
+                return
+
+            started = perf_counter()
+            self._cond.wait_for(lambda: self._fits(size))
+            self._take(size)
+            self._waited_for(started)
+
+    async def aacquire(self, size: int):
+        """Takes the bytes, waiting till they fit without blocking the event loop."""
+        if self.try_acquire(size):
+            return
+
+        started = perf_counter()
+
+        while not self.try_acquire(size):
+            await asyncio.sleep(self.poll_interval)
+
+        with self._cond:
+            self._waited_for(started)
+
+    def release(self, size: int):
+        """Gives the bytes back once written."""
+        with self._cond:
+            self.held -= size
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                'limit': self.limit,
+                'peak': self.peak,
+                'waits': self._waits,
+                'waited': round(self._waited, 3),
+            }
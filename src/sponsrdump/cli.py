@@ -1,9 +1,17 @@
 import argparse
 import logging
+from collections.abc import Callable
+from contextlib import nullcontext
+from typing import TYPE_CHECKING
 
-from .base import SponsrDumper, TextConverter, VideoPreference
-from .converters import HtmlConverter
-from .utils import match_value
+from .converters import CONVERTERS
+from .renditions import parse_frames
+from .schedule import ORDER_LISTING, ORDERS
+from .transports import TRANSPORTS
+from .utils import match_value, parse_duration, parse_size
+
+if TYPE_CHECKING:
+    from .base import SponsrDumper
 
 LOGGER = logging.getLogger(__name__)
 
@@ -23,11 +31,24 @@ def main(*arguments: str | None) -> None:
     parser.add_argument(
         '--to', help='Путь назначения для файлов', default='dump/')
     parser.add_argument(
-        '--prefer-video', help='Предпочтительное разрешение видео', default='best')
+        '--prefer-video', help=(
+            'Предпочтительное разрешение видео: best, WxH (напр. 1280x720), max:720 (не выше 720p) '
+            'или auto (по --video-budget и --video-deadline). '
+            'Несколько через запятую (напр. 640x360,1280x720): аудио скачивается один раз'),
+        type=parse_frames, default='best')
+    parser.add_argument(
+        '--video-budget', help='Объём на все видео запуска для --prefer-video auto (напр. 20G)',
+        type=parse_size, default=0)
+    parser.add_argument(
+        '--video-deadline', help='Время на все видео запуска для --prefer-video auto (напр. 90m, 2h)',
+        type=parse_duration, default=0)
+    parser.add_argument(
+        '--video-audio-only', help='Из видео сохранять только звук (.m4a, без перекодирования и загрузки видео)',
+        action='store_true')
     parser.add_argument(
         '--text-fmt', help=(
-            f'Формат для текстовых данных. Варианты: {", ".join(sorted(TextConverter.register.keys()))}'),
-        default=HtmlConverter.alias)
+            f'Формат для текстовых данных. Варианты: {", ".join(sorted(CONVERTERS))}'),
+        default='html')
     parser.add_argument(
         '--no-audio', help='Не следует скачивать аудио', action='store_true')
     parser.add_argument(
@@ -40,12 +61,98 @@ def main(*arguments: str | None) -> None:
         '--no-images', help='Не следует скачивать изображения', action='store_true')
     parser.add_argument(
         '--text-to-video', help='Следует ли создать видео с текстом статьи', action='store_true')
+    parser.add_argument(
+        '--workers', help='Количество одновременных загрузок сегментов видео/аудио', type=int, default=1)
+    parser.add_argument(
+        '--file-workers', help='Количество одновременно скачиваемых файлов (напр. видео)', type=int, default=1)
+    parser.add_argument(
+        '--order', help=(
+            'Порядок загрузки файлов: listing (как в списке статей), smallest (сначала меньшие), '
+            'largest (сначала большие — все загрузчики заняты до конца), newest (сначала новые статьи)'),
+        choices=ORDERS, default=ORDER_LISTING)
+    parser.add_argument(
+        '--prefetch', help='Количество следующих видео, манифесты которых получаются заранее в фоне',
+        type=int, default=2)
+    parser.add_argument(
+        '--scratch-dir', help=(
+            'Каталог для временных фрагментов видео/аудио (напр. на быстром локальном диске). '
+            'По умолчанию tmp в каталоге назначения'),
+        default='')
+    parser.add_argument(
+        '--buffer-limit', help=(
+            'Объём полученных данных в очереди потоков записи (--writers) для всех загрузок (напр. 64M); '
+            'при его достижении загрузки ждут записи. Только вместе с --writers. 0 - без ограничения '
+            '(по умолчанию 64M)'),
+        type=parse_size, default=None)
+    parser.add_argument(
+        '--chunk-size', help='Размер блока, читаемого из ответа за раз (напр. 64K, 1M)',
+        type=parse_size, default='64K')
+    parser.add_argument(
+        '--writers', help=(
+            'Количество потоков записи на диск: загрузки передают им полученные блоки и продолжают чтение '
+            '(полезно для медленных дисков, напр. NFS). 0 - загрузки пишут сами'),
+        type=int, default=0)
+    parser.add_argument(
+        '--preallocate', help='Резервировать место под файлы известного размера до загрузки (fallocate)',
+        action='store_true')
+    parser.add_argument(
+        '--transport', help='Механизм HTTP-запросов', choices=sorted(TRANSPORTS),
+        default='requests')
+    parser.add_argument(
+        '--async', help='Загружать файлы асинхронно, множеством одновременных запросов (требуется aiohttp)',
+        dest='asynchronous', action='store_true')
+    parser.add_argument(
+        '--max-time', help='Не начинать новые файлы, если загрузка не уложится во время (напр. 90m, 6h)',
+        type=parse_duration, default=0)
+    parser.add_argument(
+        '--max-bytes', help='Не начинать новые файлы, если будет превышен объём загрузки (напр. 50G)',
+        type=parse_size, default=0)
+    parser.add_argument(
+        '--max-files', help='Скачать не более указанного количества файлов', type=int, default=0)
+    parser.add_argument(
+        '--plan', help='Только оценить объём загрузки (файлы, запросы, байты, время), не скачивая',
+        action='store_true')
+    parser.add_argument(
+        '--record', help='Каталог для записи всех HTTP-ответов (для последующего --replay)', default='')
+    parser.add_argument(
+        '--replay', help='Каталог с записанными HTTP-ответами: воспроизвести их вместо запросов', default='')
+    parser.add_argument(
+        '--replay-latency', help='Воспроизводить ответы с исходными задержками', action='store_true')
+    parser.add_argument(
+        '--metrics', help='Файл для выгрузки метрик выполнения: .json или .prom (Prometheus textfile)', default='')
+    parser.add_argument(
+        '--profile', help='Файл для сохранения профиля выполнения (.pstats) с отчётом по этапам', default='')
+    parser.add_argument(
+        '--profile-sampling', help='Профилировать выборками стеков вместо cProfile', action='store_true')
+    parser.add_argument(
+        '--profile-top', help='Количество самых затратных функций в отчёте для этапа', type=int, default=20)
 
     args = parser.parse_args(arguments or None)
 
+    if args.buffer_limit is not None and not args.writers:
+        # downloads writing chunks themselves hold a chunk at a time: there is nothing to limit
+        parser.error('--buffer-limit действует только вместе с --writers')
+
+    # heavy modules (requests, bs4, lxml) are only imported once arguments are fine
+    from .base import SponsrDumper  # noqa: PLC0415
+    from .buffers import BUFFER_LIMIT  # noqa: PLC0415
+    from .profiler import Profiler  # noqa: PLC0415
+
     logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO, format='%(levelname)-8s: %(message)s')
 
-    dumper = SponsrDumper(args.project_url)
+    dumper = SponsrDumper(
+        args.project_url,
+        workers=args.workers,
+        transport=args.transport,
+        record=args.record,
+        replay=args.replay,
+        replay_latency=args.replay_latency,
+        scratch_dir=args.scratch_dir,
+        buffer_limit=BUFFER_LIMIT if args.buffer_limit is None else args.buffer_limit,
+        chunk_size=args.chunk_size,
+        writers=args.writers,
+        preallocate=args.preallocate,
+    )
 
     filter_func = None
 
@@ -62,16 +169,54 @@ def main(*arguments: str | None) -> None:
     elif filter_rule := args.title.strip():
         filter_func = lambda post_info: match_value(post_info['post_title'], rule=filter_rule)  # noqa: E731
 
-    dumper.search(func_filter=filter_func)
+    profiler = Profiler(sampling=args.profile_sampling, top=args.profile_top) if args.profile else None
+
+    try:
+        with profiler.profiling(dumper.metrics) if profiler else nullcontext():
+            run(dumper, args, func_filter=filter_func)
+
+    finally:
+        if args.metrics:
+            dumper.metrics.export(args.metrics)
+
+        if profiler:
+            profiler.save(args.profile)
+
+
+def run(dumper: 'SponsrDumper', args: argparse.Namespace, *, func_filter: Callable[[dict], bool] | None) -> None:
+    from .base import VideoPreference  # noqa: PLC0415
+
+    dumper.search(func_filter=func_filter)
+
+    options = {
+        'prefer_video': VideoPreference(
+            frame=args.prefer_video,
+            budget=args.video_budget,
+            deadline=args.video_deadline,
+            audio_only=args.video_audio_only,
+        ),
+        'audio': not args.no_audio,
+        'video': not args.no_video,
+        'images': not args.no_images,
+        'attaches': not args.no_attach,
+        'text': False if args.no_text else args.text_fmt.lower(),
+    }
+
+    if args.plan:
+        dumper.plan(**options)
+        return
+
     dumper.dump(
         args.to,
-        prefer_video=VideoPreference(frame=args.prefer_video),
-        audio=not args.no_audio,
-        video=not args.no_video,
-        images=not args.no_images,
-        attaches=not args.no_attach,
-        text=False if args.no_text else args.text_fmt.lower(),
         text_to_video=args.text_to_video,
+        asynchronous=args.asynchronous,
+        max_time=args.max_time,
+        max_bytes=args.max_bytes,
+        max_files=args.max_files,
+        order=args.order,
+        file_workers=args.file_workers,
+        prefetch=args.prefetch,
+        **options,
     )
 
 
@@ -1,8 +1,26 @@
-from .base import TextConverter
-from .html import HtmlConverter
-from .markdown import MarkdownConverter
+from typing import TYPE_CHECKING
+
+from ..utils import lazy_attributes
+
+if TYPE_CHECKING:
+    from .base import TextConverter
+    from .html import HtmlConverter
+    from .markdown import MarkdownConverter
+
+CONVERTERS = {
+    'html': '.html',
+    'md': '.markdown',
+}
+"""Modules of converters by aliases. Converters are imported on first use (see TextConverter.spawn())."""
+
+__getattr__ = lazy_attributes(__name__, {
+    'TextConverter': '.base',
+    'HtmlConverter': '.html',
+    'MarkdownConverter': '.markdown',
+})
 
 __all__ = [
+    'CONVERTERS',
     'HtmlConverter',
     'MarkdownConverter',
     'TextConverter',
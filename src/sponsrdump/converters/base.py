@@ -1,7 +1,9 @@
+from importlib import import_module
 from pathlib import Path
 from typing import ClassVar, TypeVar
 
 from ..utils import MAX_FILENAME_LENGTH, truncate_filename
+from . import CONVERTERS
 
 TypeTextConverter = TypeVar('TypeTextConverter', bound='TextConverter')
 
@@ -30,4 +32,7 @@ class TextConverter:
 
     @classmethod
     def spawn(cls, alias: str) -> 'TypeTextConverter':
+        if alias not in cls.register and (module := CONVERTERS.get(alias)):
+            import_module(module, __package__)
+
         return cls.register[alias]()
@@ -0,0 +1,167 @@
+import asyncio
+from collections.abc import Callable, Sequence
+from pathlib import Path
+from time import monotonic
+from typing import NamedTuple
+from urllib.parse import urlparse
+
+from .buffers import BufferBudget
+from .metrics import Metrics, Span
+from .retry import RetryScheduler
+from .throttle import STATUS_THROTTLED, Throttle, parse_retry_after
+from .transports import AiohttpTransport, Reply
+from .writers import Writers, content_length
+
+
+class Download(NamedTuple):
+
+    url: str
+    dest: Path
+    range: str = ''
+    """'start-end' or 'start-' to download a part of a resource."""
+    headers: dict | None = None
+
+
+class AsyncEngine:
+    """Drives downloads with a single event loop (that of aiohttp transport).
+
+    Every download is a coroutine rather than a thread, so that hundreds of them
+    may be in flight at once. Their number is bounded overall and by per-host
+    adaptive limits of the throttle; transient failures are retried.
+
+    """
+    chunk_size: int = 64 * 1024
+
+    def __init__(
+            self,
+            transport: AiohttpTransport,
+            *,
+            throttle: Throttle,
+            retry: RetryScheduler,
+            in_flight: int = 256,
+            metrics: Metrics | None = None,
+            writers: Writers | None = None,
+    ):
+        """
+        :param transport:
+        :param throttle: per-host limits shared with synchronous requests
+        :param retry: retry scheduler shared with synchronous requests
+        :param in_flight: maximum number of requests in flight
+        :param metrics: instrumentation shared with synchronous requests
+        :param writers: write received chunks (bounding bytes not yet written), shared with synchronous requests
+
+        """
+        self.transport = transport
+        self.in_flight = in_flight
+        self.metrics = metrics or Metrics()
+        self.writers = writers or Writers(buffers=BufferBudget(0))
+        self._throttle = throttle
+        self._retry = retry
+        self._slots: asyncio.Semaphore | None = None
+
+    def download(
+            self,
+            downloads: Sequence[Download],
+            *,
+            on_done: Callable[[Download], None] | None = None,
+            on_received: Callable[[Download, int], None] | None = None,
+            phase: str = 'files',
+    ) -> list[Exception | None]:
+        """Performs the downloads concurrently, blocking till all of them are finished.
+
+        Returns errors in the order of the downloads (None for those succeeded).
+        Callbacks are called from the loop thread.
+
+        :param downloads:
+        :param on_done: called for every succeeded download
+        :param on_received: called for every chunk received with its size
+        :param phase: metrics phase to account the downloads in
+
+        """
+        return self.transport.run(
+            self._download_all(downloads, on_done=on_done, on_received=on_received, phase=phase)
+        )
+
+    async def _download_all(
+            self,
+            downloads: Sequence[Download],
+            *,
+            on_done: Callable[[Download], None] | None,
+            on_received: Callable[[Download, int], None] | None,
+            phase: str,
+    ) -> list[Exception | None]:
+
+        if self._slots is None:
+            # bound to the transport loop
+            self._slots = asyncio.Semaphore(self.in_flight)
+
+        async def download(item: Download):
+            with self.metrics.span(phase) as span:
+                await self._download(item, span=span, on_received=on_received)
+            on_done and on_done(item)
+
+        # cancelling gather (e.g. on KeyboardInterrupt) cancels all the downloads
+        return await asyncio.gather(*(download(item) for item in downloads), return_exceptions=True)
+
+    async def _download(
+            self,
+            item: Download,
+            *,
+            span: Span,
+            on_received: Callable[[Download, int], None] | None,
+    ):
+        # A ranged request is idempotent: on retry the part is rewritten as a whole.
+        # A plain download is resumed from what is already written when the server supports ranges.
+        transport = self.transport
+        host = urlparse(item.url).netloc
+        resume_from = 0
+
+        async def fetch():
+            nonlocal resume_from
+
+            headers = dict(item.headers or {})
+
+            if range_fetch := f'{resume_from}-' if resume_from else item.range:
+                headers['Range'] = f'bytes={range_fetch}'
+
+            async with self._throttle.aslot(host) as outcome, self._slots:
+                started = monotonic()
+
+                async with await transport.aopen(item.url, headers=headers) as response:
+                    status = response.status
+                    latency = monotonic() - started
+                    outcome.update(status=status, latency=latency)
+                    self.metrics.observe(host, latency)
+
+                    if status in STATUS_THROTTLED:
+                        outcome['retry_after'] = parse_retry_after(response.headers.get('Retry-After'))
+
+                    Reply(url=item.url, status_code=status, headers=dict(response.headers)).raise_for_status()
+
+                    resumed = resume_from and status == 206
+
+                    # opening (and preallocating) is not to block the loop on a slow disk, nor writing
+                    writer = await asyncio.to_thread(
+                        self.writers.open, item.dest, append=bool(resumed), size=content_length(response.headers)
+                    )
+
+                    resumable = not item.range and response.headers.get('Accept-Ranges') == 'bytes'
+
+                    try:
+                        async for chunk in response.content.iter_chunked(self.chunk_size):
+                            await writer.awrite(chunk)
+                            span.bytes += len(chunk)
+                            on_received and on_received(item, len(chunk))
+
+                    except BaseException:
+                        # the error is not to be masked by that of writing, if any
+                        written = await writer.aclose(check=False)
+
+                        if resumable:
+                            resume_from = written
+
+                        raise
+
+                    await writer.aclose()
+
+        await self._retry.arun(lambda: transport.guarded(fetch()), what=item.url)
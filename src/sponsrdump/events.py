@@ -0,0 +1,186 @@
+import asyncio
+from collections.abc import AsyncIterator, Callable, Iterator
+from contextlib import suppress
+from pathlib import Path
+from queue import Empty, Full, Queue
+from threading import Event as Flag
+from threading import Lock, Thread
+from typing import NamedTuple
+
+from .exceptions import SponsrDumperError
+
+
+class PostDiscovered(NamedTuple):
+
+    post_id: str
+    title: str
+    url: str
+    files: int
+    """Number of files of the post (of all kinds)."""
+
+
+class FileQueued(NamedTuple):
+
+    post_id: str
+    file_id: str
+    kind: str
+    """audio | video | images | text | attaches"""
+
+    dest: Path
+
+
+class BytesProgressed(NamedTuple):
+
+    file_id: str
+    received: int
+    """Bytes received for the file so far."""
+
+
+class FileCompleted(NamedTuple):
+
+    file_id: str
+    dest: Path
+    received: int = 0
+    skipped: bool = False
+    """The file has been dumped by a previous run."""
+
+
+class FileFailed(NamedTuple):
+
+    file_id: str
+    error: Exception
+
+
+Event = PostDiscovered | FileQueued | BytesProgressed | FileCompleted | FileFailed
+"""Dump events."""
+
+
+class StreamClosed(SponsrDumperError):
+    """The consumer has stopped reading events."""
+
+
+class ByteCounter:
+    """Thread-safe counter of bytes received for a file.
+
+    Emits BytesProgressed not more often than every 'step' bytes,
+    so that consumers are not flooded with events for every chunk.
+
+    """
+    step: int = 256 * 1024
+
+    def __init__(self, file_id: str, *, emit: Callable[[Event], None]):
+        self.file_id = file_id
+        self.received = 0
+        self._emit = emit
+        self._emitted = 0
+        self._lock = Lock()
+
+    def add(self, size: int):
+        with self._lock:
+            self.received += size
+
+            if self.received - self._emitted < self.step:
+                return
+
+            self._emitted = received = self.received
+
+        self._emit(BytesProgressed(self.file_id, received))
+
+
+class EventStream:
+    """Runs a function in a worker thread passing events it emits to a consumer.
+
+    Events go through a bounded queue: while it is full, the worker is blocked,
+    so that a slow consumer slows the dump down (backpressure).
+    Once the consumer stops iterating, the worker is stopped with StreamClosed
+    raised from the next emit.
+
+    Iterate with either 'for' or 'async for'. An exception the function
+    has failed with is re-raised to the consumer after the events.
+
+    """
+    poll: float = 0.1
+
+    def __init__(self, func: Callable[[Callable[[Event], None]], None], *, maxsize: int = 100):
+        """
+        :param func: accepts an 'emit' callable
+        :param maxsize: maximum number of events not yet consumed
+
+        """
+        self._func = func
+        self._queue: Queue = Queue(maxsize=maxsize)
+        self._closed = Flag()
+        self._done = object()
+        self._error: BaseException | None = None
+        self._thread = Thread(target=self._run, name='sponsrdump-events', daemon=True)
+
+    def emit(self, event: Event):
+        while not self._closed.is_set():
+            with suppress(Full):
+                self._queue.put(event, timeout=self.poll)
+                return
+
+        raise StreamClosed('Event stream is closed')
+
+    def _run(self):
+        try:
+            self._func(self.emit)
+
+        except StreamClosed:
+            pass
+
+        except BaseException as e:  # noqa: BLE001
+            self._error = e
+
+        finally:
+            # never blocks: the consumer is either reading or gone
+            while True:
+                try:
+                    self._queue.put(self._done, timeout=self.poll)
+                    break
+
+                except Full:
+                    if self._closed.is_set():
+                        break
+
+    def _get(self):
+        while True:
+            try:
+                return self._queue.get(timeout=self.poll)
+
+            except Empty:
+                if not self._thread.is_alive():
+                    return self._done
+
+    def _close(self):
+        self._closed.set()
+        self._thread.join()
+
+    def _result(self, item) -> bool:
+        if item is not self._done:
+            return True
+
+        if self._error:
+            raise self._error
+
+        return False
+
+    def __iter__(self) -> Iterator[Event]:
+        self._thread.start()
+
+        try:
+            while self._result(item := self._get()):
+                yield item
+
+        finally:
+            self._close()
+
+    async def __aiter__(self) -> AsyncIterator[Event]:
+        self._thread.start()
+
+        try:
+            while self._result(item := await asyncio.to_thread(self._get)):
+                yield item
+
+        finally:
+            await asyncio.to_thread(self._close)
@@ -0,0 +1,168 @@
+import time
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+from typing import NamedTuple
+from urllib.parse import parse_qs, urlparse
+
+from .utils import LOGGER
+
+EXPIRY_MARGIN = 60
+"""Seconds before the signed expiry when a manifest is considered stale."""
+
+EXPIRY_DEFAULT = 3600
+"""Seconds to keep a manifest which url carries no expiry."""
+
+
+def signed_expiry(url: str) -> float:
+    """Returns a unix timestamp from 'expires' parameter of a signed url, or 0 if there is none."""
+    values = parse_qs(urlparse(url).query).get('expires')
+
+    try:
+        return float(values[0]) if values else 0
+
+    except ValueError:
+        return 0
+
+
+class Manifest(NamedTuple):
+
+    kind: str
+    """hls | dash"""
+
+    src: str
+    """Signed manifest url."""
+
+    video: dict
+    audio: dict
+
+    expires: float = 0
+    """Unix timestamp the signed urls expire at. 0 - unknown."""
+
+    @property
+    def expired(self) -> bool:
+        return bool(self.expires) and time.time() >= self.expires - EXPIRY_MARGIN
+
+
+class ManifestCache:
+    """Resolved Kinescope manifests keyed by embed id.
+
+    Entries live until their signed urls expire, so that retries, dry-runs
+    and resolution changes do not fetch the embed page and playlists again.
+
+    """
+    def __init__(self):
+        self._items: dict[str, Manifest] = {}
+        self._lock = Lock()
+
+    def __contains__(self, embed_id: str) -> bool:
+        return self.get(embed_id) is not None
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, embed_id: str) -> Manifest | None:
+        with self._lock:
+            manifest = self._items.get(embed_id)
+
+            if manifest and manifest.expired:
+                del self._items[embed_id]
+                manifest = None
+
+        return manifest
+
+    def put(self, embed_id: str, manifest: Manifest) -> Manifest:
+        """Caches the manifest and returns it with the expiry set.
+
+        Manifests already expired on arrival (e.g. due to a clock skew) are not cached
+        and are returned with the unknown expiry.
+
+        """
+        now = time.time()
+        expires = manifest.expires or signed_expiry(manifest.src)
+
+        if not expires:
+            expires = now + EXPIRY_DEFAULT
+
+        elif expires - EXPIRY_MARGIN <= now:
+            return manifest._replace(expires=0)
+
+        manifest = manifest._replace(expires=expires)
+
+        with self._lock:
+            self._items[embed_id] = manifest
+
+        return manifest
+
+    def drop(self, embed_id: str):
+        with self._lock:
+            self._items.pop(embed_id, None)
+
+    def load(self, data: dict):
+        """Loads manifests previously exported with .export()."""
+        for embed_id, item in data.items():
+            manifest = Manifest(
+                kind=item['kind'],
+                src=item['src'],
+                video={ident: [tuple(segment) for segment in segments] for ident, segments in item['video'].items()},
+                audio={ident: [tuple(segment) for segment in segments] for ident, segments in item['audio'].items()},
+                expires=item['expires'],
+            )
+            if not manifest.expired:
+                self._items[embed_id] = manifest
+
+    def export(self) -> dict:
+        """Exports non-expired manifests into a JSON-serializable dict."""
+        with self._lock:
+            return {
+                embed_id: manifest._asdict()
+                for embed_id, manifest in self._items.items()
+                if not manifest.expired
+            }
+
+
+class ManifestPrefetcher:
+    """Resolves manifests of the videos next to be dumped in background threads,
+    so that a video download does not wait for its embed page and playlists.
+
+    """
+    def __init__(self, resolve: Callable[[str], Manifest], urls: list[str], *, ahead: int = 2):
+        """
+        :param resolve: resolves (and caches) the manifest of an embed url
+        :param urls: embed urls of the videos in the order they are dumped in
+        :param ahead: number of videos to resolve manifests for ahead of those being dumped
+
+        """
+        self.ahead = ahead
+        self._resolve = resolve
+        self._urls = urls
+        self._positions = {url: idx for idx, url in enumerate(urls)}
+        self._futures: dict[str, Future] = {}
+        self._pool = ThreadPoolExecutor(max_workers=max(ahead, 1), thread_name_prefix='prefetch')
+
+        self._advance(0)
+
+    def _advance(self, cursor: int):
+        for url in self._urls[cursor:cursor + self.ahead]:
+            if url not in self._futures:
+                self._futures[url] = self._pool.submit(self._resolve, url)
+
+    def started(self, url: str):
+        """Registers the dump of the video started, so that manifests of the next ones are prefetched."""
+        if (position := self._positions.get(url)) is not None:
+            self._advance(position + 1)
+
+    def wait(self, url: str):
+        """Waits for the manifest of the url to be prefetched, if it is being prefetched."""
+        if (future := self._futures.get(url)) is None:
+            return
+
+        try:
+            future.result()
+
+        except Exception as e:  # noqa: BLE001
+            # the manifest is to be resolved once more on dump, failing if the error persists
+            LOGGER.debug(f'Unable to prefetch manifest for {url}: {e}')
+
+    def close(self):
+        self._pool.shutdown(cancel_futures=True)
@@ -0,0 +1,185 @@
+import json
+import math
+import random
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from threading import Lock
+from time import perf_counter
+from typing import Protocol
+
+
+def percentile(values: list[float], share: float) -> float:
+    """Returns a nearest-rank percentile of the values, e.g. share=0.95 for p95."""
+    if not values:
+        return 0
+
+    values = sorted(values)
+    return values[min(len(values), max(1, math.ceil(share * len(values)))) - 1]
+
+
+class Latencies:
+    """Request latencies of a host: exact count, sum and maximum,
+    and a bounded uniform sample (reservoir) to take percentiles from.
+
+    """
+    __slots__ = ('count', 'max', 'sample', 'seconds')
+
+    sample_size: int = 1024
+    """Latencies kept for percentiles. Percentiles are exact till there are more requests."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.max = 0.0
+        self.sample: list[float] = []
+
+    def add(self, latency: float):
+        self.count += 1
+        self.seconds += latency
+        self.max = max(self.max, latency)
+
+        if len(self.sample) < self.sample_size:
+            self.sample.append(latency)
+
+        elif (idx := random.randrange(self.count)) < self.sample_size:
+            self.sample[idx] = latency
+
+    def stats(self) -> dict:
+        return {
+            'count': self.count,
+            'seconds': round(self.seconds, 4),
+            'p50': round(percentile(self.sample, 0.5), 4),
+            'p95': round(percentile(self.sample, 0.95), 4),
+            'max': round(self.max, 4),
+        }
+
+
+class Span:
+    """Measurement of a single occurrence of a phase."""
+
+    __slots__ = ('bytes', 'items')
+
+    def __init__(self, items: int = 1):
+        self.items = items
+        self.bytes = 0
+
+
+class Tracer(Protocol):
+
+    def __call__(self, phase: str, *, entered: bool): ...
+
+
+class Metrics:
+    """Run-time instrumentation: phase timings, bytes and per-request latencies.
+
+    Phases (e.g. 'listing', 'segments', 'mux') are measured with .span(),
+    possibly from many threads at once, so that summed durations of a phase
+    may exceed the run duration.
+
+    """
+    def __init__(self):
+        self.tracer: Tracer | None = None
+        """Called on entering and leaving phase spans (in the thread of a span), e.g. by a profiler."""
+
+        self.started = perf_counter()
+        self._phases: dict[str, dict] = defaultdict(lambda: {'count': 0, 'seconds': 0.0, 'bytes': 0})
+        self._latencies: dict[str, Latencies] = defaultdict(Latencies)
+        self._lock = Lock()
+
+    @contextmanager
+    def span(self, phase: str, *, items: int = 1):
+        """Measures a phase occurrence. Yields a Span to put the number of bytes processed into.
+
+        :param phase:
+        :param items: number of items processed (e.g. posts)
+
+        """
+        span = Span(items)
+        started = perf_counter()
+        tracer = self.tracer
+        tracer and tracer(phase, entered=True)
+
+        try:
+            yield span
+
+        finally:
+            took = perf_counter() - started
+            tracer and tracer(phase, entered=False)
+
+            with self._lock:
+                stats = self._phases[phase]
+                stats['count'] += span.items
+                stats['seconds'] += took
+                stats['bytes'] += span.bytes
+
+    def observe(self, host: str, latency: float):
+        """Registers a request latency (seconds till response headers)."""
+        with self._lock:
+            self._latencies[host].add(latency)
+
+    def phase(self, phase: str) -> dict:
+        """Returns count, seconds and bytes of a phase so far (cheaper than .stats())."""
+        with self._lock:
+            return dict(self._phases.get(phase) or {'count': 0, 'seconds': 0.0, 'bytes': 0})
+
+    def stats(self) -> dict:
+        with self._lock:
+            phases = {phase: dict(stats) for phase, stats in self._phases.items()}
+            requests = {host: latencies.stats() for host, latencies in self._latencies.items()}
+
+        elapsed = perf_counter() - self.started
+        received = sum(stats['bytes'] for stats in phases.values())
+
+        for stats in phases.values():
+            stats['seconds'] = round(stats['seconds'], 3)
+
+        return {
+            'elapsed': round(elapsed, 3),
+            'bytes': received,
+            'mbps': round(received / elapsed / 1024 / 1024, 2) if elapsed else 0,
+            'phases': phases,
+            'requests': requests,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.stats(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """Returns metrics in Prometheus text exposition format (e.g. for node_exporter textfile collector)."""
+        stats = self.stats()
+        lines = []
+
+        def metric(name: str, kind: str, doc: str, samples: list[tuple[str, float]]):
+            lines.extend((f'# HELP sponsrdump_{name} {doc}', f'# TYPE sponsrdump_{name} {kind}'))
+            lines.extend(f'sponsrdump_{name}{labels} {value}' for labels, value in samples)
+
+        metric('run_seconds', 'gauge', 'Run duration.', [('', stats['elapsed'])])
+        metric('run_bytes', 'gauge', 'Bytes received during the run.', [('', stats['bytes'])])
+
+        phases = stats['phases']
+
+        for name, key, doc in (
+            ('phase_seconds_total', 'seconds', 'Time spent in a phase.'),
+            ('phase_items_total', 'count', 'Items processed in a phase.'),
+            ('phase_bytes_total', 'bytes', 'Bytes received in a phase.'),
+        ):
+            metric(name, 'counter', doc, [(f'{{phase="{phase}"}}', values[key]) for phase, values in phases.items()])
+
+        samples = []
+        for host, values in stats['requests'].items():
+            samples.extend((
+                (f'{{host="{host}",quantile="0.5"}}', values['p50']),
+                (f'{{host="{host}",quantile="0.95"}}', values['p95']),
+                (f'_sum{{host="{host}"}}', values['seconds']),
+                (f'_count{{host="{host}"}}', values['count']),
+            ))
+
+        metric('request_latency_seconds', 'summary', 'Request latency till response headers.', samples)
+
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path: str | Path):
+        """Writes metrics into a file: Prometheus textfile for .prom, JSON otherwise."""
+        path = Path(path)
+        path.write_text(self.to_prometheus() if path.suffix == '.prom' else self.to_json())
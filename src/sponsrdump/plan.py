@@ -0,0 +1,94 @@
+from typing import NamedTuple
+
+AUDIO_BITRATE = 128_000
+"""Bits per second assumed for audio files the size of which is not reported."""
+
+
+def range_size(range: str) -> int | None:
+    """Returns the number of bytes in an inclusive 'start-end' range, None for an open one."""
+    start, _, end = range.partition('-')
+
+    if not end:
+        return None
+
+    return int(end) - int(start) + 1
+
+
+class PostPlan(NamedTuple):
+    """Estimate for the files of a post yet to be dumped."""
+
+    post_id: str
+    title: str
+
+    files: int = 0
+    requests: int = 0
+    """HTTP requests to download the files (e.g. one per media segment)."""
+
+    bytes: int = 0
+    guessed: int = 0
+    """Part of the bytes estimated rather than known (e.g. from bitrate and duration)."""
+
+    def add(self, *, files: int = 0, requests: int = 0, bytes: int = 0, guessed: int = 0) -> 'PostPlan':
+        return self._replace(
+            files=self.files + files,
+            requests=self.requests + requests,
+            bytes=self.bytes + bytes,
+            guessed=self.guessed + guessed,
+        )
+
+
+class Plan(NamedTuple):
+    """Dump plan. See SponsrDumper.plan()."""
+
+    posts: list[PostPlan]
+
+    rate: float = 0
+    """Bytes per second measured on a sample download. 0 - not measured."""
+
+    latency: float = 0
+    """Mean seconds till response headers observed while planning."""
+
+    workers: int = 1
+
+    @property
+    def files(self) -> int:
+        return sum(post.files for post in self.posts)
+
+    @property
+    def requests(self) -> int:
+        return sum(post.requests for post in self.posts)
+
+    @property
+    def bytes(self) -> int:
+        return sum(post.bytes for post in self.posts)
+
+    @property
+    def guessed(self) -> int:
+        return sum(post.guessed for post in self.posts)
+
+    @property
+    def seconds(self) -> float:
+        """Projected dump duration: transfer at the measured rate
+        plus waiting for responses spread over workers.
+
+        """
+        transfer = self.bytes / self.rate if self.rate else 0
+        return transfer + self.requests * self.latency / self.workers
+
+    def report(self) -> str:
+        lines = [f"{'post':<12} {'files':>6} {'requests':>9} {'MB':>10}  title"]
+
+        lines.extend(
+            f'{post.post_id:<12} {post.files:>6} {post.requests:>9} {post.bytes / 1024 / 1024:>10.1f}  {post.title}'
+            for post in self.posts
+        )
+
+        lines.extend((
+            '',
+            f'Posts: {len(self.posts)}; files: {self.files}; requests: {self.requests}',
+            f'Size: {self.bytes / 1024 / 1024:.1f} MB ({self.guessed / 1024 / 1024:.1f} MB of it estimated)',
+            f'Rate: {self.rate / 1024 / 1024:.2f} MB/s; latency: {self.latency:.3f}s; workers: {self.workers}',
+            f"Projected time: {f'{self.seconds / 60:.1f} min' if self.rate else 'unknown (rate is not measured)'}",
+        ))
+
+        return '\n'.join(lines)
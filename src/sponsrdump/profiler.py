@@ -0,0 +1,266 @@
+import cProfile
+import pstats
+import sys
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from types import FrameType
+
+from .metrics import Metrics
+from .utils import LOGGER
+
+PHASE_OUTSIDE = 'run'
+"""Phase of the code outside of any metrics span."""
+
+PROFILE_PER_THREAD = sys.version_info < (3, 12)
+"""Whether cProfile hooks a thread at a time. Since 3.12 a profile hooks all the threads
+(via sys.monitoring) and there may be only one enabled at a time.
+
+"""
+
+
+class Profiler:
+    """Profiles a run breaking the results down by metrics phases.
+
+    Deterministic (cProfile) mode profiles every thread started during the run.
+    Before Python 3.12 threads switch profiles as they enter and leave phase spans.
+    Since 3.12 there is a single profile for the run, and phases are attributed
+    by sampling stacks alongside.
+
+    Sampling mode only takes stacks of all the threads periodically,
+    which costs much less on runs with many requests.
+
+    """
+    def __init__(self, *, sampling: bool = False, interval: float = 0.005, top: int = 20):
+        """
+        :param sampling: use sampling instead of cProfile
+        :param interval: seconds between samples
+        :param top: number of the hottest functions to report for a phase
+
+        """
+        self.sampling = sampling
+        self.interval = interval
+        self.top = top
+
+        self._phases: dict[int, list[str]] = {}
+        self._local = threading.local()
+        self._profiles: dict[str, list[cProfile.Profile]] = defaultdict(list)
+        self._profile: cProfile.Profile | None = None
+        self._samples: Counter[tuple[str, tuple[str, ...]]] = Counter()
+        self._stopped = threading.Event()
+
+    def _phase_stack(self) -> list[str]:
+        return self._phases.setdefault(threading.get_ident(), [PHASE_OUTSIDE])
+
+    def trace(self, phase: str, *, entered: bool):
+        stack = self._phase_stack()
+
+        if entered:
+            stack.append(phase)
+
+        elif len(stack) > 1:
+            stack.pop()
+
+        if not self.sampling and PROFILE_PER_THREAD:
+            self._switch(stack[-1])
+
+    def _switch(self, phase: str):
+        # every thread has a profile of its own for every phase
+        local = self._local
+        profiles = getattr(local, 'profiles', None)
+
+        if profiles is None or local.phase == phase:
+            return
+
+        local.profiles[local.phase].disable()
+
+        if (profile := profiles.get(phase)) is None:
+            profile = profiles[phase] = cProfile.Profile()
+            self._profiles[phase].append(profile)
+
+        local.phase = phase
+        profile.enable()
+
+    def _thread_start(self, *args):
+        # the first event of a new thread: swap this hook for a profile
+        sys.setprofile(None)
+        self._thread_profile()
+
+    def _thread_profile(self):
+        local = self._local
+        profile = cProfile.Profile()
+        local.profiles = {PHASE_OUTSIDE: profile}
+        local.phase = PHASE_OUTSIDE
+        self._profiles[PHASE_OUTSIDE].append(profile)
+        profile.enable()
+
+    @staticmethod
+    def _frame_name(frame: FrameType) -> str:
+        code = frame.f_code
+        return f'{Path(code.co_filename).stem}:{code.co_name}:{frame.f_lineno}'
+
+    def _sample(self):
+        me = threading.get_ident()
+
+        while not self._stopped.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+
+                phase = self._phases.get(ident, [PHASE_OUTSIDE])[-1]
+                stack = []
+
+                while frame is not None:
+                    stack.append(self._frame_name(frame))
+                    frame = frame.f_back
+
+                self._samples[(phase, tuple(reversed(stack)))] += 1
+
+    @contextmanager
+    def profiling(self, metrics: Metrics):
+        """Profiles the code run within, attributing it to phases of the metrics."""
+        metrics.tracer = self.trace
+        self._stopped.clear()
+
+        sampler = None
+
+        if self.sampling or not PROFILE_PER_THREAD:
+            sampler = threading.Thread(target=self._sample, name='sponsrdump-sampler', daemon=True)
+            sampler.start()
+
+        if not self.sampling and PROFILE_PER_THREAD:
+            threading.setprofile(self._thread_start)
+            self._thread_profile()
+
+        elif not self.sampling:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+        try:
+            yield
+
+        finally:
+            metrics.tracer = None
+
+            if sampler:
+                self._stopped.set()
+                sampler.join()
+
+            if self._profile:
+                self._profile.disable()
+
+            elif not self.sampling:
+                threading.setprofile(None)
+                self._local.profiles[self._local.phase].disable()
+
+    def _stats(self, phase: str = '') -> pstats.Stats | None:
+        if self._profile:
+            profiles = [] if phase else [self._profile]
+
+        else:
+            profiles = self._profiles[phase] if phase else [
+                item for items in self._profiles.values() for item in items]
+        stats = None
+
+        for profile in profiles:
+            profile.create_stats()
+
+            if not profile.stats:
+                continue
+
+            if stats is None:
+                stats = pstats.Stats(profile)
+
+            else:
+                stats.add(profile)
+
+        return stats
+
+    def save(self, path: str | Path) -> Path:
+        """Saves the results: .pstats for cProfile (e.g. for snakeviz),
+        collapsed stacks for sampling (e.g. for flamegraph.pl or speedscope).
+
+        Returns the path of the per-phase report saved alongside.
+
+        """
+        path = Path(path)
+
+        if self.sampling:
+            path.write_text(''.join(
+                f"{';'.join((phase, *stack))} {count}\n" for (phase, stack), count in sorted(self._samples.items())
+            ))
+
+        elif stats := self._stats():
+            stats.dump_stats(path)
+
+        path_report = path.with_name(f'{path.name}.txt')
+        path_report.write_text(self.report())
+
+        LOGGER.info(f'Profile is saved into {path}. Per-phase report: {path_report}')
+
+        return path_report
+
+    def report(self) -> str:
+        """Returns the hottest functions (by own time) for every phase."""
+        if self.sampling:
+            lines = self._report_sampling()
+
+        elif self._profile:
+            # phases are sampled, the single profile goes as a whole
+            lines = self._report_sampling()
+
+            if stats := self._stats():
+                lines.extend(self._report_stats('all phases', stats))
+
+        else:
+            lines = self._report_cprofile()
+
+        return '\n'.join(lines)
+
+    def _report_stats(self, title: str, stats: pstats.Stats) -> list[str]:
+        lines = [f'[{title}] {stats.total_calls} calls, {stats.total_tt:.3f}s']
+        hottest = sorted(
+            # the sampler thread is not a part of the run
+            (item for item in stats.stats.items() if item[0][0] != __file__),
+            key=lambda item: -item[1][2],
+        )[:self.top]
+
+        for (filename, lineno, func), (_, calls, own, cumulative, _) in hottest:
+            lines.append(f'  {own:9.4f}s {cumulative:9.4f}s {calls:>9}  {func} ({Path(filename).name}:{lineno})')
+
+        lines.append('')
+
+        return lines
+
+    def _report_cprofile(self) -> list[str]:
+        lines = []
+        phases = {}
+
+        for phase in self._profiles:
+            if stats := self._stats(phase):
+                phases[phase] = stats
+
+        for phase, stats in sorted(phases.items(), key=lambda item: -item[1].total_tt):
+            lines.extend(self._report_stats(phase, stats))
+
+        return lines
+
+    def _report_sampling(self) -> list[str]:
+        lines = []
+        phases: dict[str, Counter] = defaultdict(Counter)
+
+        for (phase, stack), count in self._samples.items():
+            phases[phase][stack[-1] if stack else '?'] += count
+
+        total = sum(self._samples.values()) or 1
+
+        for phase, counter in sorted(phases.items(), key=lambda item: -item[1].total()):
+            lines.append(f'[{phase}] {counter.total()} samples, {100 * counter.total() / total:.1f}%')
+            lines.extend(
+                f'  {count:>9} {100 * count / total:5.1f}%  {func}'
+                for func, count in counter.most_common(self.top)
+            )
+            lines.append('')
+
+        return lines
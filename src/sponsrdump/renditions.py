@@ -0,0 +1,131 @@
+import re
+from pathlib import Path
+from threading import Lock
+from time import perf_counter
+
+from .metrics import Metrics
+from .utils import LOGGER, MAX_FILENAME_LENGTH, truncate_filename
+
+AUTO = 'auto'
+"""Resolution preference picking renditions to fit a run budget and a deadline."""
+
+CAP_PREFIX = 'max:'
+"""Resolution preference prefix capping frame height, e.g. 'max:720'."""
+
+FRAMES_SEPARATOR = ','
+"""Separates resolution preferences to dump a video in each of, e.g. '640x360,1280x720'."""
+
+AUDIO_ONLY_SUFFIX = '.m4a'
+"""Extension of files with the audio of videos (see VideoPreference.audio_only)."""
+
+RE_FRAME = re.compile(rf'best|{AUTO}|{CAP_PREFIX}\d+|\d+x\d+')
+
+
+def parse_frames(value: str) -> str:
+    """Returns resolution preferences like '640x360,max:720' once each of them is checked to be valid."""
+    for frame in value.split(FRAMES_SEPARATOR):
+        if (frame := frame.strip()) and not RE_FRAME.fullmatch(frame):
+            raise ValueError(f'Invalid video resolution: {frame}')
+
+    return value
+
+
+def frame_height(ident: str) -> int:
+    """Returns the height of a 'WxH' frame ident."""
+    _, _, height = ident.partition('x')
+    return int(height or 0)
+
+
+def frame_filename(filename: str, frame: str) -> str:
+    """Returns the name of a file for one of several resolution preferences, e.g. 'a [1280x720].mp4'."""
+    label = f" [{frame.replace(':', '')}]"
+    path = Path(truncate_filename(filename, max_len=MAX_FILENAME_LENGTH - len(label.encode())))
+    return f'{path.stem}{label}{path.suffix}'
+
+
+def pick_capped(idents: list[str], cap: int) -> str:
+    """Returns the largest of the idents (sorted ascending) not higher than the cap,
+    the smallest one if all of them are higher.
+
+    """
+    fitting = [ident for ident in idents if frame_height(ident) <= cap]
+    return fitting[-1] if fitting else next(iter(idents), '')
+
+
+class AutoResolution:
+    """Picks video renditions so that the videos of a run fit a byte budget and/or a deadline.
+
+    Both are spread evenly over the videos yet to be downloaded. For the deadline
+    the throughput is measured on segments downloaded so far; until there are any,
+    the smallest rendition is taken.
+
+    Picks may be made by concurrent file workers.
+
+    """
+    def __init__(self, *, metrics: Metrics, videos: int, workers: int = 1, budget: int = 0, deadline: float = 0):
+        """
+        :param metrics: run metrics to take received bytes and throughput from
+        :param videos: number of videos to be downloaded in the run
+        :param workers: number of concurrent segment downloads
+        :param budget: bytes for all the videos. 0 - unlimited
+        :param deadline: seconds for all the videos. 0 - unlimited
+
+        """
+        self.metrics = metrics
+        self.videos = max(videos, 1)
+        self.workers = max(workers, 1)
+        self.budget = budget
+        self.deadline = deadline
+
+        self.started = perf_counter()
+        self._received_before = self._segments()['bytes']
+        self._lock = Lock()
+
+    def _segments(self) -> dict:
+        return self.metrics.phase('segments')
+
+    @property
+    def rate(self) -> float:
+        """Measured bytes per second of segment downloads."""
+        segments = self._segments()
+        # segment timings are summed over concurrent workers
+        took = segments['seconds'] / self.workers
+        return segments['bytes'] / took if took else 0
+
+    def allowance(self) -> float | None:
+        """Bytes allowed for the next video. None - unlimited."""
+        allowed = []
+
+        if self.budget:
+            spent = self._segments()['bytes'] - self._received_before
+            allowed.append(max(self.budget - spent, 0) / self.videos)
+
+        if self.deadline:
+            left = self.deadline - (perf_counter() - self.started)
+            allowed.append(max(left, 0) * self.rate / self.videos)
+
+        return min(allowed) if allowed else None
+
+    def pick(self, sizes: dict[str, int]) -> str:
+        """Returns a rendition ident for the next video.
+
+        :param sizes: estimated sizes in bytes by rendition idents, sorted ascending
+
+        """
+        idents = list(sizes)
+
+        with self._lock:
+            # the allowance is taken along with the count of videos left it is spread over
+            allowance = self.allowance()
+            videos = self.videos
+            self.videos = max(videos - 1, 1)
+
+        if allowance is None:
+            picked = idents[-1] if idents else ''
+
+        else:
+            fitting = [ident for ident in idents if sizes[ident] <= allowance]
+            picked = fitting[-1] if fitting else next(iter(idents), '')
+            LOGGER.info(f'  Picked {picked} to fit {allowance / 1024 / 1024:.1f} MB ({videos} video(s) left)')
+
+        return picked
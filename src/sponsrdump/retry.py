@@ -0,0 +1,146 @@
+import random
+from asyncio import sleep as asleep
+from collections.abc import Awaitable, Callable
+from threading import Lock
+from time import sleep
+from typing import TypeVar
+
+from requests import HTTPError, exceptions
+
+from .throttle import parse_retry_after
+from .utils import LOGGER
+
+T = TypeVar('T')
+
+STATUS_RETRY = {408, 425, 429, 500, 502, 503, 504}
+"""Statuses considered transient."""
+
+EXCEPTIONS_RETRY = (exceptions.ConnectionError, exceptions.Timeout, exceptions.ChunkedEncodingError)
+"""Exceptions considered transient."""
+
+
+class RetryScheduler:
+    """Retries transient HTTP failures with exponential backoff and full jitter.
+
+    All the retries of a run are drawn from a shared budget, so that
+    a host being down for good does not make the run last forever.
+
+    """
+    def __init__(self, *, attempts: int = 5, backoff: float = 1, backoff_max: float = 60, budget: int = 100):
+        """
+        :param attempts: maximum attempts for a single operation
+        :param backoff: base delay (seconds) doubled with every attempt
+        :param backoff_max: delay cap (seconds)
+        :param budget: maximum number of retries for the run
+
+        """
+        self.attempts = attempts
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.budget = budget
+
+        self.retries = 0
+        self.recovered = 0
+        self.exhausted = 0
+
+        self._lock = Lock()
+
+    def __str__(self):
+        return ', '.join(f'{key} {val}' for key, val in self.stats().items())
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'retries': self.retries,
+            'recovered': self.recovered,
+            'exhausted': self.exhausted,
+            'budget_left': self.budget - self.retries,
+        }
+
+    @staticmethod
+    def is_transient(exc: Exception) -> bool:
+        if isinstance(exc, HTTPError):
+            return exc.response is not None and exc.response.status_code in STATUS_RETRY
+        return isinstance(exc, EXCEPTIONS_RETRY)
+
+    def delay(self, attempt: int, *, retry_after: float = 0) -> float:
+        """Returns seconds to wait before the given (2nd, 3rd, ...) attempt."""
+        backoff = min(self.backoff_max, self.backoff * 2 ** (attempt - 2))
+        return max(retry_after, random.uniform(0, backoff))
+
+    def _backoff(self, exc: Exception, *, attempt: int, what: str) -> float | None:
+        # Accounts a failed attempt. Returns seconds to wait before the next one
+        # or None if the failure is not to be retried.
+        if not self.is_transient(exc):
+            return None
+
+        with self._lock:
+            if attempt >= self.attempts or self.retries >= self.budget:
+                self.exhausted += 1
+                return None
+
+            self.retries += 1
+
+        retry_after = 0
+
+        if isinstance(exc, HTTPError):
+            retry_after = parse_retry_after(exc.response.headers.get('Retry-After'), default=0)
+
+        delay = self.delay(attempt + 1, retry_after=retry_after)
+        LOGGER.warning(f'{what}: {exc}. Retrying in {delay:.1f}s (attempt {attempt + 1}/{self.attempts}) ...')
+
+        return delay
+
+    def _recovered(self, attempt: int):
+        if attempt > 1:
+            with self._lock:
+                self.recovered += 1
+
+    def run(self, func: Callable[[], T], *, what: str) -> T:
+        """Calls the function until it succeeds, retrying transient failures.
+
+        :param func: idempotent operation to perform
+        :param what: operation description for logs
+
+        """
+        attempt = 1
+
+        while True:
+            try:
+                result = func()
+
+            except Exception as e:
+                delay = self._backoff(e, attempt=attempt, what=what)
+                if delay is None:
+                    raise
+
+                attempt += 1
+                sleep(delay)
+                continue
+
+            self._recovered(attempt)
+            return result
+
+    async def arun(self, func: Callable[[], Awaitable[T]], *, what: str) -> T:
+        """Asynchronous counterpart of .run().
+
+        :param func: idempotent operation to perform, returning an awaitable
+        :param what: operation description for logs
+
+        """
+        attempt = 1
+
+        while True:
+            try:
+                result = await func()
+
+            except Exception as e:
+                delay = self._backoff(e, attempt=attempt, what=what)
+                if delay is None:
+                    raise
+
+                attempt += 1
+                await asleep(delay)
+                continue
+
+            self._recovered(attempt)
+            return result
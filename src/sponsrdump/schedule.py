@@ -0,0 +1,56 @@
+from typing import NamedTuple
+
+ORDER_LISTING = 'listing'
+ORDER_SMALLEST = 'smallest'
+ORDER_LARGEST = 'largest'
+ORDER_NEWEST = 'newest'
+
+ORDERS = (ORDER_LISTING, ORDER_SMALLEST, ORDER_LARGEST, ORDER_NEWEST)
+"""Orders to dump files in:
+
+* listing - as posts are listed (see 'reverse' of SponsrDumper.dump());
+* smallest - smallest files first, for partial results to come early;
+* largest - largest files first, so that concurrent workers are busy till the end;
+* newest - files of the latest posts first.
+
+"""
+
+SIZED_ORDERS = {ORDER_SMALLEST, ORDER_LARGEST}
+"""Orders requiring file sizes to be estimated."""
+
+
+class Job(NamedTuple):
+    """A file to be dumped."""
+
+    post: dict
+    file: dict
+    realm: str
+    """e.g. video, audio"""
+
+    size: int = 0
+    """Estimated bytes, for sized orders only."""
+
+    frames: tuple[str, ...] = ()
+    """Frame preferences yet to dump a video in, for several ones only."""
+
+
+def order_jobs(jobs: list[Job], order: str) -> list[Job]:
+    """Returns the jobs in the order given. Jobs alike keep their relative order.
+
+    :param jobs: in listing order
+    :param order: see ORDERS
+
+    """
+    if order == ORDER_SMALLEST:
+        return sorted(jobs, key=lambda job: job.size)
+
+    if order == ORDER_LARGEST:
+        return sorted(jobs, key=lambda job: job.size, reverse=True)
+
+    if order == ORDER_NEWEST:
+        return sorted(jobs, key=lambda job: job.post.get('post_date') or '', reverse=True)
+
+    if order != ORDER_LISTING:
+        raise ValueError(f"Unsupported order '{order}'. Use one of: {', '.join(ORDERS)}")
+
+    return list(jobs)
@@ -0,0 +1,234 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager, contextmanager, suppress
+from datetime import UTC, datetime
+from email.utils import parsedate_to_datetime
+from threading import Condition, Lock
+
+from .utils import LOGGER
+
+STATUS_THROTTLED = {429, 503}
+"""Statuses by which a host asks us to slow down."""
+
+
+def parse_retry_after(value: str | None, *, default: float = 1) -> float:
+    """Returns seconds to wait from a Retry-After header value (either seconds or an HTTP date)."""
+    if not value:
+        return default
+
+    value = value.strip()
+
+    if value.isdigit():
+        return float(value)
+
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(UTC)).total_seconds(), 0)
+
+    except (TypeError, ValueError):
+        return default
+
+
+class HostLimit:
+    """Concurrency limit for a single host adapting in AIMD fashion.
+
+    Every successful request additively increases the limit (by one per
+    a limit worth of requests), while throttling responses, server errors and
+    growing latency decrease it multiplicatively.
+
+    """
+    decrease_throttled: float = 0.5
+    decrease_error: float = 0.75
+    decrease_latency: float = 0.9
+
+    latency_tolerance: float = 3
+    """Latency above the best seen multiplied by this is considered a congestion."""
+
+    latency_floor: float = 0.05
+    """Latencies below this are not distinguished."""
+
+    def __init__(self, host: str, *, maximum: int, minimum: int = 1):
+        self.host = host
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit: float = max(minimum, maximum / 2)
+        self.in_flight = 0
+        self.cooldown_until: float = 0
+        self.latency: float = 0
+        self.latency_best: float = 0
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self._cond = Condition()
+
+    def __str__(self):
+        return f'{self.host}: limit {self.limit:.1f}/{self.maximum}'
+
+    def acquire(self):
+        with self._cond:
+            while True:
+                wait = self.cooldown_until - time.monotonic()
+
+                if wait <= 0 and self.in_flight < int(self.limit):
+                    break
+
+                self._cond.wait(timeout=wait if wait > 0 else None)
+
+            self.in_flight += 1
+
+    def try_acquire(self) -> bool:
+        """Non-blocking counterpart of .acquire(). Returns whether a slot is occupied."""
+        with self._cond:
+            if self.cooldown_until > time.monotonic() or self.in_flight >= int(self.limit):
+                return False
+
+            self.in_flight += 1
+            return True
+
+    def release(self, *, latency: float, status: int = 0, retry_after: float = 0):
+        """Releases a slot adapting the limit to the outcome of a request.
+
+        :param latency: seconds the request took
+        :param status: response status code. 0 - no response (e.g. connection error)
+        :param retry_after: seconds the host asked to wait for
+
+        """
+        with self._cond:
+            self.in_flight -= 1
+            self.requests += 1
+
+            if status in STATUS_THROTTLED:
+                self.throttled += 1
+                self._decrease(self.decrease_throttled)
+                self.cooldown_until = max(self.cooldown_until, time.monotonic() + retry_after)
+                LOGGER.debug(f'Throttled by {self} for {retry_after:.1f}s')
+
+            elif not status or status >= 500:
+                self.errors += 1
+                self._decrease(self.decrease_error)
+
+            else:
+                self.latency = latency if not self.latency else 0.8 * self.latency + 0.2 * latency
+                self.latency_best = min(self.latency_best or latency, latency)
+
+                if self.latency > max(self.latency_best, self.latency_floor) * self.latency_tolerance:
+                    self._decrease(self.decrease_latency)
+
+                else:
+                    self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+            self._cond.notify_all()
+
+    def _decrease(self, factor: float):
+        self.limit = max(self.minimum, self.limit * factor)
+
+
+class Throttle:
+    """Per-host concurrency controller.
+
+    Limits are looked up by a host suffix, e.g. 'kinescopecdn.net'
+    covers 'edge-msk-1.kinescopecdn.net'.
+
+    """
+    poll: float = 0.1
+    """Seconds between checks for a free slot made by coroutines."""
+
+    def __init__(self, limits: dict[str, int], *, default: int = 4):
+        self._limits = limits
+        self._default = default
+        self._hosts: dict[str, HostLimit] = {}
+        self._waiters: dict[str, asyncio.Condition] = {}
+        self._lock = Lock()
+
+    def get(self, host: str) -> HostLimit:
+        with self._lock:
+            limit = self._hosts.get(host)
+
+            if limit is None:
+                maximum = next(
+                    (value for suffix, value in self._limits.items() if host == suffix or host.endswith(f'.{suffix}')),
+                    self._default
+                )
+                limit = self._hosts[host] = HostLimit(host, maximum=maximum)
+
+        return limit
+
+    @contextmanager
+    def slot(self, host: str):
+        """Occupies a slot for the host. Yields a dict to put 'status', 'retry_after'
+        and 'latency' (if not the whole time spent in the slot) of a response into.
+
+        """
+        limit = self.get(host)
+        limit.acquire()
+
+        outcome = {'status': 0, 'retry_after': 0}
+        started = time.monotonic()
+
+        try:
+            yield outcome
+
+        finally:
+            outcome.setdefault('latency', time.monotonic() - started)
+            limit.release(**outcome)
+
+    @contextmanager
+    def try_slot(self, host: str):
+        """Non-blocking counterpart of .slot(). Yields None if no slot of the host is free at once."""
+        limit = self.get(host)
+
+        if not limit.try_acquire():
+            yield None
+            return
+
+        outcome = {'status': 0, 'retry_after': 0}
+        started = time.monotonic()
+
+        try:
+            yield outcome
+
+        finally:
+            outcome.setdefault('latency', time.monotonic() - started)
+            limit.release(**outcome)
+
+    @asynccontextmanager
+    async def aslot(self, host: str):
+        """Asynchronous counterpart of .slot() for coroutines of a single event loop.
+
+        Coroutines waiting for a host are woken up by those releasing its slots,
+        and also poll it, since slots may be released by threads as well.
+
+        """
+        limit = self.get(host)
+        waiters = self._waiters.setdefault(host, asyncio.Condition())
+
+        async with waiters:
+            while not limit.try_acquire():
+                wait = limit.cooldown_until - time.monotonic()
+
+                with suppress(TimeoutError):
+                    await asyncio.wait_for(waiters.wait(), timeout=wait if wait > 0 else self.poll)
+
+        outcome = {'status': 0, 'retry_after': 0}
+        started = time.monotonic()
+
+        try:
+            yield outcome
+
+        finally:
+            outcome.setdefault('latency', time.monotonic() - started)
+            limit.release(**outcome)
+
+            async with waiters:
+                waiters.notify_all()
+
+    def stats(self) -> dict[str, dict]:
+        return {
+            host: {
+                'limit': round(limit.limit, 1),
+                'requests': limit.requests,
+                'throttled': limit.throttled,
+                'errors': limit.errors,
+                'latency': round(limit.latency, 3),
+            }
+            for host, limit in self._hosts.items()
+        }
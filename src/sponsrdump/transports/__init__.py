@@ -0,0 +1,36 @@
+from typing import TYPE_CHECKING
+
+from ..utils import lazy_attributes
+
+if TYPE_CHECKING:
+    from .aiohttp import AiohttpTransport
+    from .base import Reply, Transport
+    from .replay import Cassette, RecordingTransport, ReplayTransport
+    from .requests import RequestsTransport
+
+TRANSPORTS = {
+    'requests': '.requests',
+    'aiohttp': '.aiohttp',
+}
+"""Modules of transports by aliases. Transports are imported on first use (see Transport.spawn())."""
+
+__getattr__ = lazy_attributes(__name__, {
+    'AiohttpTransport': '.aiohttp',
+    'Cassette': '.replay',
+    'RecordingTransport': '.replay',
+    'ReplayTransport': '.replay',
+    'Reply': '.base',
+    'RequestsTransport': '.requests',
+    'Transport': '.base',
+})
+
+__all__ = [
+    'TRANSPORTS',
+    'AiohttpTransport',
+    'Cassette',
+    'RecordingTransport',
+    'ReplayTransport',
+    'Reply',
+    'RequestsTransport',
+    'Transport',
+]
@@ -0,0 +1,168 @@
+import asyncio
+from collections.abc import Coroutine, Iterator
+from contextlib import contextmanager
+from email.message import Message
+from threading import Thread
+from time import monotonic
+from typing import Any, TypeVar
+
+import requests
+from requests import exceptions
+from requests.cookies import MockRequest, MockResponse, get_cookie_header
+
+from ..exceptions import SponsrDumperError
+from .base import Reply, Transport
+
+T = TypeVar('T')
+
+
+class AiohttpTransport(Transport):
+    """asyncio-based transport over aiohttp.
+
+    Requests are performed by an event loop running in a background thread,
+    so the transport may be used both from synchronous code and, through
+    the 'a'-prefixed coroutines, from coroutines running in that loop.
+
+    """
+    alias = 'aiohttp'
+
+    def __init__(self, *, headers: dict, pool_size: int = 16, pool_hosts: int = 16):
+        try:
+            import aiohttp  # noqa: PLC0415
+
+        except ImportError:
+            raise SponsrDumperError(
+                "Transport 'aiohttp' requires aiohttp package. Install it with: pip install sponsrdump[async]"
+            ) from None
+
+        super().__init__(headers=headers, pool_size=pool_size, pool_hosts=pool_hosts)
+
+        self._aiohttp = aiohttp
+        self.loop = asyncio.new_event_loop()
+        self._thread = Thread(target=self.loop.run_forever, name='aiohttp-transport', daemon=True)
+        self._thread.start()
+        self._session = self.run(self._session_make())
+
+    async def _session_make(self):
+        aiohttp = self._aiohttp
+        return aiohttp.ClientSession(
+            headers=self.headers,
+            connector=aiohttp.TCPConnector(limit=self.pool_size * self.pool_hosts, limit_per_host=self.pool_size),
+            cookie_jar=aiohttp.DummyCookieJar(),
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=60),
+        )
+
+    def run(self, coro: Coroutine[Any, Any, T]) -> T:
+        """Runs the coroutine in the transport loop and waits for its result."""
+        future = asyncio.run_coroutine_threadsafe(self.guarded(coro), self.loop)
+
+        try:
+            return future.result()
+
+        except BaseException:
+            # e.g. KeyboardInterrupt: do not leave the coroutine running
+            future.cancel()
+            raise
+
+    async def guarded(self, coro: Coroutine[Any, Any, T]) -> T:
+        """Awaits the coroutine translating aiohttp exceptions into those of requests,
+        so that error handling is shared by transports.
+
+        """
+        aiohttp = self._aiohttp
+        try:
+            return await coro
+
+        except aiohttp.ClientPayloadError as e:
+            raise exceptions.ChunkedEncodingError(e) from e
+
+        except (aiohttp.ServerTimeoutError, TimeoutError) as e:
+            raise exceptions.Timeout(e) from e
+
+        except aiohttp.ClientError as e:
+            raise exceptions.ConnectionError(e) from e
+
+    def _headers(self, url: str, headers: dict | None) -> dict:
+        headers = dict(headers or {})
+
+        if cookie := get_cookie_header(self.cookies, requests.Request('GET', url)):
+            headers['Cookie'] = cookie
+
+        return headers
+
+    def _cookies_update(self, response):
+        # cookies set by responses (redirects included) go to the shared jar as with requests,
+        # so that those refreshed are saved on dump
+        for item in (*response.history, response):
+            if not (values := item.headers.getall('Set-Cookie', [])):
+                continue
+
+            message = Message()
+            for value in values:
+                message['Set-Cookie'] = value
+
+            self.cookies.extract_cookies(MockResponse(message), MockRequest(requests.Request('GET', f'{item.url}')))
+
+    async def aopen(self, url: str, *, headers: dict | None = None, method: str = 'GET'):
+        """Performs a request returning aiohttp response with the body yet to be read."""
+        response = await self._session.request(method, url, headers=self._headers(url, headers))
+        self._cookies_update(response)
+        return response
+
+    async def aget(self, url: str, *, headers: dict | None = None, method: str = 'GET') -> Reply:
+        """Performs a request reading the whole response body."""
+        started = monotonic()
+
+        async with await self.aopen(url, headers=headers, method=method) as response:
+            elapsed = monotonic() - started
+            return Reply(
+                url=f'{response.url}',
+                status_code=response.status,
+                headers=dict(response.headers),
+                content=await response.read(),
+                elapsed=elapsed,
+            )
+
+    def get(self, url: str, *, headers: dict | None = None) -> Reply:
+        return self.run(self.aget(url, headers=headers))
+
+    def head(self, url: str, *, headers: dict | None = None) -> Reply:
+        return self.run(self.aget(url, headers=headers, method='HEAD'))
+
+    @contextmanager
+    def stream(self, url: str, *, headers: dict | None = None) -> Iterator[Reply]:
+        started = monotonic()
+        response = self.run(self.aopen(url, headers=headers))
+
+        def chunks(size: int) -> Iterator[bytes]:
+            while chunk := self.run(response.content.read(size)):
+                yield chunk
+
+        try:
+            yield Reply(
+                url=f'{response.url}',
+                status_code=response.status,
+                headers=dict(response.headers),
+                chunks=chunks,
+                elapsed=monotonic() - started,
+            )
+
+        finally:
+            self.loop.call_soon_threadsafe(response.release)
+
+    def stats(self) -> dict[str, dict]:
+        stats = {}
+
+        for key, conns in getattr(self._session.connector, '_conns', {}).items():
+            stats[key.host] = {'idle': len(conns)}
+
+        return stats
+
+    def close(self):
+        if self.loop.is_closed():
+            return
+
+        self.run(self._session.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
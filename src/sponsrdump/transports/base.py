@@ -0,0 +1,164 @@
+import json
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import AbstractContextManager
+from datetime import timedelta
+from importlib import import_module
+from typing import Any, ClassVar, TypeVar
+
+from requests import HTTPError
+from requests.cookies import RequestsCookieJar
+from requests.structures import CaseInsensitiveDict
+
+from . import TRANSPORTS
+
+TypeTransport = TypeVar('TypeTransport', bound='Transport')
+
+
+class Reply:
+    """Transport response. Mimics the subset of requests.Response used by the dumper."""
+
+    def __init__(
+            self,
+            *,
+            url: str,
+            status_code: int,
+            headers: dict,
+            content: bytes = b'',
+            chunks: Callable[[int], Iterator[bytes]] | None = None,
+            elapsed: float = 0,
+    ):
+        """
+        :param url:
+        :param status_code:
+        :param headers:
+        :param content: body (for non-streamed responses)
+        :param chunks: body chunks generator (for streamed responses). Accepts chunk size.
+        :param elapsed: seconds till headers were received
+
+        """
+        self.url = url
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.elapsed = timedelta(seconds=elapsed)
+        self._content = content
+        self._chunks = chunks
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def content(self) -> bytes:
+        if self._chunks:
+            self._content = b''.join(self.iter_content(chunk_size=64 * 1024))
+        return self._content
+
+    @property
+    def text(self) -> str:
+        _, _, charset = self.headers.get('Content-Type', '').partition('charset=')
+        return self.content.decode(charset.strip() or 'utf-8', errors='replace')
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size: int = 1024) -> Iterator[bytes]:
+        if self._chunks:
+            chunks, self._chunks = self._chunks, None
+            yield from chunks(chunk_size)
+            return
+
+        for pos in range(0, len(self._content), chunk_size):
+            yield self._content[pos:pos + chunk_size]
+
+    def raise_for_status(self):
+        if 400 <= self.status_code < 600:
+            raise HTTPError(f'{self.status_code} Error for url: {self.url}', response=self)
+
+    def close(self):
+        self._chunks = None
+
+
+class Transport:
+    """Base for HTTP transports.
+
+    Implementations are registered by their aliases
+    and can be spawned with .spawn(). Those with no alias
+    (e.g. wrapping other transports) are not registered.
+
+    """
+    alias: str = ''
+
+    register: ClassVar[dict[str, type[TypeTransport]]] = {}
+
+    def __init_subclass__(cls):
+        super().__init_subclass__()
+        if cls.alias:
+            cls.register[cls.alias] = cls
+
+    def __init__(self, *, headers: dict, pool_size: int = 16, pool_hosts: int = 16):
+        """
+        :param headers: default headers for every request
+        :param pool_size: maximum connections kept for a host
+        :param pool_hosts: maximum hosts to keep pools for
+
+        """
+        self.headers = headers
+        self.pool_size = pool_size
+        self.pool_hosts = pool_hosts
+        self.cookies = RequestsCookieJar()
+
+    def get(self, url: str, *, headers: dict | None = None) -> Reply:
+        """Performs a request reading the whole response body."""
+        raise NotImplementedError
+
+    def stream(self, url: str, *, headers: dict | None = None) -> AbstractContextManager[Reply]:
+        """Performs a request, body of which is read with .iter_content()."""
+        raise NotImplementedError
+
+    def head(self, url: str, *, headers: dict | None = None) -> Reply:
+        """Performs a HEAD request: status and headers only (redirects are followed)."""
+        raise NotImplementedError
+
+    def range(self, url: str, range: str, *, headers: dict | None = None) -> AbstractContextManager[Reply]:
+        """Streams a byte range of a resource.
+
+        :param url:
+        :param range: 'start-end' or 'start-'
+        :param headers:
+
+        """
+        return self.stream(url, headers={**(headers or {}), 'Range': f'bytes={range}'})
+
+    def warm(
+            self,
+            urls: Iterable[str],
+            *,
+            connections: int = 1,
+            headers: dict | None = None,
+            slot: Callable[[str], AbstractContextManager[dict | None]] | None = None,
+    ):
+        """Opens connections to hosts of the urls in advance.
+
+        :param urls:
+        :param connections: connections to open for a host
+        :param headers: headers for requests opening connections (those of requests to follow)
+        :param slot: occupies a concurrency slot of a host for a request (see Throttle.try_slot),
+            yielding a dict to put the response status and latency into, or None if there is no slot free
+
+        """
+
+    def stats(self) -> dict[str, dict]:
+        """Returns connection pools statistics by host."""
+        return {}
+
+    def close(self):
+        """Releases transport resources."""
+
+    @classmethod
+    def spawn(cls, alias: str, **kwargs) -> 'TypeTransport':
+        if alias not in cls.register and (module := TRANSPORTS.get(alias)):
+            import_module(module, __package__)
+
+        return cls.register[alias](**kwargs)
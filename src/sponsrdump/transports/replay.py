@@ -0,0 +1,304 @@
+import hashlib
+import json
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from threading import Lock
+from time import perf_counter, sleep
+
+from requests.cookies import RequestsCookieJar
+
+from ..exceptions import SponsrDumperError
+from ..utils import LOGGER
+from .base import Reply, Transport
+
+HEADERS_PRIVATE = {'set-cookie', 'cookie'}
+"""Headers (lowercase) never recorded, so that cassettes carry no session cookies."""
+
+
+class Cassette:
+    """Directory of recorded responses.
+
+    Every response is kept in a pair of files named after a hash
+    of its method, url and byte range: <key>.json (url, status, headers, timings)
+    and <key>.body. A response is only seen once its .json is written.
+    Responses whose bodies were left unread have no .body.
+
+    Open-ended ranges (bytes=N-) of resumed downloads are keyed by their offset as is,
+    so a download is only replayed resumed from the very offset it was recorded with.
+
+    """
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._lock = Lock()
+
+    @staticmethod
+    def key(url: str, headers: dict | None = None, *, method: str = 'GET') -> str:
+        rng = (headers or {}).get('Range', '')
+        # GET keys carry no method, as in cassettes recorded before other methods were
+        return hashlib.sha1(f"{'' if method == 'GET' else f'{method} '}{url} {rng}".encode()).hexdigest()
+
+    def _prepare(self):
+        with self._lock:
+            self.path.mkdir(parents=True, exist_ok=True)
+
+    def _put_meta(self, reply: Reply, *, key: str, took: float, body: bool = True):
+        meta = {
+            'url': reply.url,
+            'status': reply.status_code,
+            'headers': {
+                name: value for name, value in reply.headers.items() if name.lower() not in HEADERS_PRIVATE
+            },
+            'elapsed': reply.elapsed.total_seconds(),
+            'took': took,
+            'body': body,
+        }
+        (self.path / f'{key}.json').write_text(json.dumps(meta, ensure_ascii=False, indent=2))
+
+    def put(self, reply: Reply, *, key: str, body: bytes, took: float):
+        """Records a response.
+
+        :param reply:
+        :param key: see .key()
+        :param body:
+        :param took: seconds till the whole body was received
+
+        """
+        self._prepare()
+        # body goes first, so that a response is never seen half-written
+        (self.path / f'{key}.body').write_bytes(body)
+        self._put_meta(reply, key=key, took=took)
+
+    def put_chunks(self, reply: Reply, *, key: str, chunks: Iterable[bytes], started: float) -> Iterator[bytes]:
+        """Records a response passing its body chunks through, so that the body is not held in memory.
+        The response is not recorded unless all the chunks are passed.
+
+        :param reply:
+        :param key: see .key()
+        :param chunks:
+        :param started: perf_counter() value the request was made at
+
+        """
+        self._prepare()
+
+        with (self.path / f'{key}.body').open('wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                yield chunk
+
+        self._put_meta(reply, key=key, took=perf_counter() - started)
+
+    def put_unread(self, reply: Reply, *, key: str, took: float):
+        """Records a response whose body was left unread (e.g. that of an error or a size probe):
+        status and headers only, so that the body is not downloaded just to be recorded.
+
+        :param reply:
+        :param key: see .key()
+        :param took: seconds till the response was closed
+
+        """
+        self._prepare()
+        (self.path / f'{key}.body').unlink(missing_ok=True)
+        self._put_meta(reply, key=key, took=took, body=False)
+
+    def meta(self, key: str) -> dict | None:
+        """Returns response meta recorded for the key, if any."""
+        path_meta = self.path / f'{key}.json'
+
+        if not path_meta.exists():
+            return None
+
+        return json.loads(path_meta.read_text())
+
+    def get(self, key: str) -> tuple[dict, bytes] | None:
+        """Returns response meta and body recorded for the key, if any."""
+        if (meta := self.meta(key)) is None:
+            return None
+
+        return meta, self.body(key)
+
+    def body(self, key: str) -> bytes:
+        return (self.path / f'{key}.body').read_bytes()
+
+    def iter_body(self, key: str, chunk_size: int) -> Iterator[bytes]:
+        """Yields chunks of a response body recorded for the key."""
+        with (self.path / f'{key}.body').open('rb') as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+
+    def __len__(self) -> int:
+        return len(list(self.path.glob('*.json'))) if self.path.exists() else 0
+
+
+class RecordingTransport(Transport):
+    """Performs requests with another transport, recording responses into a cassette
+    to be replayed later by ReplayTransport.
+
+    Streamed bodies are written into the cassette as they are read.
+
+    """
+    def __init__(self, transport: Transport, *, cassette: Cassette):
+        """
+        :param transport: transport performing requests
+        :param cassette: where to record responses to
+
+        """
+        super().__init__(headers=transport.headers, pool_size=transport.pool_size, pool_hosts=transport.pool_hosts)
+        self.transport = transport
+        self.cassette = cassette
+
+    @property
+    def cookies(self) -> RequestsCookieJar:
+        return self.transport.cookies
+
+    @cookies.setter
+    def cookies(self, value: RequestsCookieJar):
+        # the base class sets its own jar before the wrapped transport is known
+        if 'transport' in self.__dict__:
+            self.transport.cookies = value
+
+    def _record(self, url: str, response, *, headers: dict | None, started: float, method: str = 'GET') -> Reply:
+        body = response.content
+        reply = Reply(
+            url=response.url,
+            status_code=response.status_code,
+            headers=dict(response.headers),
+            content=body,
+            elapsed=response.elapsed.total_seconds(),
+        )
+        # keyed by the url requested, which may differ from that of a response (redirects)
+        key = self.cassette.key(url, headers, method=method)
+        self.cassette.put(reply, key=key, body=body, took=perf_counter() - started)
+        return reply
+
+    def get(self, url: str, *, headers: dict | None = None) -> Reply:
+        started = perf_counter()
+        return self._record(url, self.transport.get(url, headers=headers), headers=headers, started=started)
+
+    def head(self, url: str, *, headers: dict | None = None) -> Reply:
+        started = perf_counter()
+        response = self.transport.head(url, headers=headers)
+        return self._record(url, response, headers=headers, started=started, method='HEAD')
+
+    @contextmanager
+    def stream(self, url: str, *, headers: dict | None = None) -> Iterator[Reply]:
+        started = perf_counter()
+
+        with self.transport.stream(url, headers=headers) as response:
+            key = self.cassette.key(url, headers)
+
+            read = []
+
+            def chunks(size: int) -> Iterator[bytes]:
+                read.append(size)
+                yield from self.cassette.put_chunks(
+                    reply, key=key, chunks=response.iter_content(chunk_size=size), started=started
+                )
+
+            reply = Reply(
+                url=response.url,
+                status_code=response.status_code,
+                headers=dict(response.headers),
+                chunks=chunks,
+                elapsed=response.elapsed.total_seconds(),
+            )
+
+            try:
+                yield reply
+
+            finally:
+                if not read:
+                    # bodies left unread (e.g. of errors) are not downloaded to be recorded
+                    self.cassette.put_unread(reply, key=key, took=perf_counter() - started)
+
+                reply.close()
+
+    def warm(self, urls: Iterable[str], **kwargs):
+        self.transport.warm(urls, **kwargs)
+
+    def stats(self) -> dict[str, dict]:
+        return self.transport.stats()
+
+    def close(self):
+        self.transport.close()
+
+
+class ReplayTransport(Transport):
+    """Serves responses recorded by RecordingTransport, without network access.
+
+    Requests which were not recorded fail with SponsrDumperError,
+    as well as reading bodies which were left unread on recording.
+
+    """
+    def __init__(
+            self,
+            *,
+            cassette: Cassette,
+            latency: bool = False,
+            headers: dict,
+            pool_size: int = 16,
+            pool_hosts: int = 16,
+    ):
+        """
+        :param cassette: where to take responses from
+        :param latency: wait for the time it took to receive a response originally
+        :param headers:
+        :param pool_size:
+        :param pool_hosts:
+
+        """
+        super().__init__(headers=headers, pool_size=pool_size, pool_hosts=pool_hosts)
+        self.cassette = cassette
+        self.latency = latency
+        self._replayed = 0
+
+    def _replay(self, url: str, *, headers: dict | None, stream: bool = False, method: str = 'GET') -> Reply:
+        key = self.cassette.key(url, headers, method=method)
+        meta = self.cassette.meta(key)
+
+        if meta is None:
+            raise SponsrDumperError(f'Response for {method} {url} is not recorded in {self.cassette.path}')
+
+        LOGGER.debug(f"Replaying {meta['status']} for {url}")
+
+        if self.latency:
+            sleep(meta['took'])
+
+        self._replayed += 1
+
+        if not meta.get('body', True):
+            content = b''
+
+            def chunks(size: int) -> Iterator[bytes]:
+                raise SponsrDumperError(
+                    f'Body of the response for {url} was not read on recording into {self.cassette.path}')
+
+        elif stream:
+            # streamed bodies are read from the cassette chunk by chunk
+            content, chunks = b'', lambda size: self.cassette.iter_body(key, size)
+
+        else:
+            content, chunks = self.cassette.body(key), None
+
+        return Reply(
+            url=meta['url'],
+            status_code=meta['status'],
+            headers=meta['headers'],
+            content=content,
+            chunks=chunks,
+            elapsed=meta['elapsed'],
+        )
+
+    def get(self, url: str, *, headers: dict | None = None) -> Reply:
+        return self._replay(url, headers=headers)
+
+    def head(self, url: str, *, headers: dict | None = None) -> Reply:
+        return self._replay(url, headers=headers, method='HEAD')
+
+    @contextmanager
+    def stream(self, url: str, *, headers: dict | None = None) -> Iterator[Reply]:
+        with self._replay(url, headers=headers, stream=True) as reply:
+            yield reply
+
+    def stats(self) -> dict[str, dict]:
+        return {'replay': {'requests': self._replayed, 'recorded': len(self.cassette)}}
@@ -0,0 +1,125 @@
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AbstractContextManager, ExitStack, contextmanager
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.cookies import RequestsCookieJar
+
+from ..utils import LOGGER
+from .base import Transport
+
+
+class RequestsTransport(Transport):
+    """Transport over a requests session with explicitly sized per-host connection pools.
+
+    Connections are kept alive and reused across requests (e.g. media segments).
+    Pools block instead of discarding connections when all of them are busy.
+
+    """
+    alias = 'requests'
+
+    timeout: tuple[float, float] = (30, 60)
+    """Seconds to wait for a connection and between bytes of a response (as aiohttp transport does)."""
+
+    timeout_warm: float = 10
+    """Seconds to wait for a response when warming connections."""
+
+    def __init__(self, *, headers: dict, pool_size: int = 16, pool_hosts: int = 16):
+        session = requests.Session()
+        session.headers = headers
+
+        adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_size, pool_block=True)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+        self.session = session
+        self._adapter = adapter
+
+        super().__init__(headers=headers, pool_size=pool_size, pool_hosts=pool_hosts)
+
+    @property
+    def cookies(self) -> RequestsCookieJar:
+        return self.session.cookies
+
+    @cookies.setter
+    def cookies(self, value: RequestsCookieJar):
+        self.session.cookies = value
+
+    def get(self, url: str, *, headers: dict | None = None) -> requests.Response:
+        return self.session.get(url, headers=headers, timeout=self.timeout)
+
+    @contextmanager
+    def stream(self, url: str, *, headers: dict | None = None) -> Iterator[requests.Response]:
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            yield response
+
+    def head(self, url: str, *, headers: dict | None = None) -> requests.Response:
+        return self.session.head(url, headers=headers, timeout=self.timeout, allow_redirects=True)
+
+    def close(self):
+        self.session.close()
+
+    def warm(
+            self,
+            urls: Iterable[str],
+            *,
+            connections: int = 1,
+            headers: dict | None = None,
+            slot: Callable[[str], AbstractContextManager[dict | None]] | None = None,
+    ):
+        """Opens (up to) the given number of connections to hosts of the urls
+        in advance, so that TLS handshakes are not paid by the first requests.
+
+        Connections are opened by HEAD requests held at once, so that each
+        of them takes a connection of its own (idle ones are reused).
+        With slots given, no more requests are held than there are slots free.
+
+        """
+        hosts = {}
+        for url in urls:
+            hosts.setdefault(urlparse(url).netloc, url)
+
+        count = min(connections, self.pool_size)
+
+        def hold(host: str, url: str):
+            held = []
+
+            with ExitStack() as slots:
+                try:
+                    while len(held) < count:
+                        if (outcome := slots.enter_context(slot(host)) if slot else {}) is None:
+                            break
+
+                        # not released till the body (none) is read
+                        response = self.session.head(url, headers=headers, stream=True, timeout=self.timeout_warm)
+                        outcome.update(status=response.status_code, latency=response.elapsed.total_seconds())
+                        held.append(response)
+
+                except requests.RequestException as e:
+                    LOGGER.debug(f'Unable to warm a connection to {url}: {e}')
+
+                for response in held:
+                    # read to the end, the connection is returned to the pool alive
+                    response.content  # noqa: B018
+                    response.close()
+
+        with ThreadPoolExecutor(max_workers=max(len(hosts), 1)) as executor:
+            list(executor.map(hold, hosts, hosts.values()))
+
+        LOGGER.debug(f'Warmed connections to {", ".join(hosts)}')
+
+    def stats(self) -> dict[str, dict]:
+        """Returns connection pools statistics by host."""
+        stats = {}
+        pools = self._adapter.poolmanager.pools
+
+        for key in list(pools.keys()):
+            pool = pools[key]
+            stats[pool.host] = {
+                'connections': pool.num_connections,
+                'requests': pool.num_requests,
+            }
+
+        return stats
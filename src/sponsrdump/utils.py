@@ -1,7 +1,9 @@
 import logging
 import re
 import sys
+from collections.abc import Callable
 from contextlib import chdir
+from importlib import import_module
 from pathlib import Path
 from shutil import copyfileobj
 from subprocess import PIPE, Popen
@@ -15,6 +17,24 @@ LOGGER = logging.getLogger('sponsrdump')
 
 MAX_FILENAME_LENGTH = 255
 
+
+def lazy_attributes(package: str, exports: dict[str, str]) -> Callable[[str], object]:
+    """Returns module-level __getattr__ for a package, importing exported names
+    from its submodules on first access, so that importing the package itself is cheap.
+
+    :param package: package name, e.g. __name__
+    :param exports: submodules (e.g. '.html') by names exported from them
+
+    """
+    def getattr_(name: str) -> object:
+        if (module := exports.get(name)) is None:
+            raise AttributeError(f'module {package!r} has no attribute {name!r}')
+
+        return getattr(import_module(module, package), name)
+
+    return getattr_
+
+
 def progress(label: str, current: int, total: int, *, stream=sys.stderr):
     """Render a single self-overwriting progress line, e.g. '  video: 123/914 (13.5%)'."""
     if not total:
@@ -106,6 +126,31 @@ def match_value(val: str, *, rule: str) -> bool:
     return bool(re.search(rule, val))
 
 
+def parse_size(value: str) -> int:
+    """Returns bytes for a size like '500M', '2.5G' or '1024' (K, M, G, T are powers of 1024)."""
+    value = value.strip().upper().removesuffix('B')
+    power = 'KMGT'.find(value[-1:]) + 1 if value[-1:].isalpha() else 0
+
+    try:
+        return int(float(value[:-1] if power else value) * 1024 ** power)
+
+    except ValueError:
+        raise ValueError(f'Invalid size: {value}') from None
+
+
+def parse_duration(value: str) -> float:
+    """Returns seconds for a duration like '90', '45m', '1.5h' (s, m, h, d)."""
+    value = value.strip().lower()
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    unit = units.get(value[-1:], 0)
+
+    try:
+        return float(value[:-1]) * unit if unit else float(value)
+
+    except ValueError:
+        raise ValueError(f'Invalid duration: {value}') from None
+
+
 def concat_files(*, src: Path, suffix: str, target_name: str) -> Path:
 
     with chdir(src):
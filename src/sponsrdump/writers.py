@@ -0,0 +1,227 @@
+import asyncio
+import os
+from collections.abc import Mapping
+from pathlib import Path
+from queue import SimpleQueue
+from threading import Condition, Lock, Thread
+
+from .buffers import BufferBudget
+
+
+def content_length(headers: Mapping) -> int:
+    """Returns Content-Length from response headers, 0 if absent."""
+    length = headers.get('Content-Length') or ''
+    return int(length) if length.isdigit() else 0
+
+
+class FileWriter:
+    """Writes chunks of a file being downloaded, inline or in a writer thread (see Writers).
+
+    Bytes of a chunk are taken from the buffer budget before it is handed over
+    and given back once it is written.
+
+    """
+    def __init__(
+            self,
+            path: Path,
+            *,
+            append: bool,
+            buffers: BufferBudget,
+            queue: SimpleQueue | None = None,
+            size: int = 0,
+    ):
+        """
+        :param path:
+        :param append: continue the file rather than rewrite it
+        :param buffers: budget to take bytes of chunks from
+        :param queue: queue of a writer thread. None - write inline
+        :param size: bytes expected to preallocate space for. 0 - do not preallocate
+
+        """
+        self.path = path
+        self._buffers = buffers
+        self._queue = queue
+        self._file = path.open('ab' if append else 'wb')
+        self._pending = 0
+        self._error: OSError | None = None
+        self._cond = Condition()
+        self._preallocated = bool(size) and self._preallocate(size)
+
+    def _preallocate(self, size: int) -> bool:
+        # reserve the space at once, so that the file is not fragmented
+        # and the lack of space shows up before downloading
+        if not hasattr(os, 'posix_fallocate'):
+            return False
+
+        try:
+            os.posix_fallocate(self._file.fileno(), self._file.tell(), size)
+
+        except OSError:
+            # not supported by the file system (e.g. some NFS versions)
+            return False
+
+        return True
+
+    def _pend(self, chunk: bytes):
+        if error := self._error:
+            self._buffers.release(len(chunk))
+            raise error
+
+        with self._cond:
+            self._pending += 1
+
+    def _raise(self):
+        if error := self._error:
+            raise error
+
+    def write_now(self, chunk: bytes):
+        """Writes a chunk handed over. Called from a writer thread."""
+        try:
+            if not self._error:
+                self._file.write(chunk)
+
+        except OSError as e:
+            self._error = e
+
+        finally:
+            self._buffers.release(len(chunk))
+
+            with self._cond:
+                self._pending -= 1
+                self._cond.notify_all()
+
+    def write(self, chunk: bytes):
+        """Hands a chunk over to be written, waiting for the buffer budget."""
+        self._buffers.acquire(len(chunk))
+        self._pend(chunk)
+
+        if self._queue is None:
+            self.write_now(chunk)
+            self._raise()
+            return
+
+        self._queue.put((self, chunk))
+
+    async def awrite(self, chunk: bytes):
+        """Hands a chunk over to be written, waiting for the buffer budget without blocking the event loop.
+        With no writer thread the chunk is written in a thread of the loop executor.
+
+        """
+        await self._buffers.aacquire(len(chunk))
+        self._pend(chunk)
+
+        if self._queue is None:
+            await asyncio.to_thread(self.write_now, chunk)
+            self._raise()
+            return
+
+        self._queue.put((self, chunk))
+
+    def close(self, *, check: bool = True) -> int:
+        """Waits for the chunks handed over to be written, closes the file and returns its size.
+
+        :param check: raise an error of writing, if any. Not to be checked when the download
+            has failed already, so that its error is not masked.
+
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: not self._pending)
+
+        size = self._file.tell()
+
+        try:
+            if self._preallocated:
+                # the space reserved is not used up on a short read
+                self._file.truncate(size)
+
+            self._file.close()
+
+        except OSError as e:
+            self._error = self._error or e
+
+        check and self._raise()
+
+        return size
+
+    async def aclose(self, *, check: bool = True) -> int:
+        """See .close(). Waits and closes in a thread of the loop executor."""
+        return await asyncio.to_thread(self.close, check=check)
+
+
+class Writers:
+    """Writes files being downloaded in dedicated threads, so that network readers
+    hand chunks over and go on reading while a slow disk (e.g. NFS) flushes.
+
+    Chunks of a file are written by a single thread in the order received.
+    With no threads chunks are written inline by readers.
+
+    """
+    def __init__(self, threads: int = 0, *, buffers: BufferBudget, preallocate: bool = False):
+        """
+        :param threads: number of writer threads. 0 - write inline
+        :param buffers: bounds bytes handed over and not yet written
+        :param preallocate: reserve space for files of known sizes (where supported, see posix_fallocate)
+
+        """
+        self.threads = threads
+        self.buffers = buffers
+        self.preallocate = preallocate
+
+        self._queues: list[SimpleQueue] = []
+        self._threads: list[Thread] = []
+        self._opened = 0
+        self._lock = Lock()
+
+    def _queue(self) -> SimpleQueue | None:
+        # files are spread over the threads, started on first use
+        if not self.threads:
+            return None
+
+        with self._lock:
+            if not self._queues:
+                for idx in range(self.threads):
+                    queue = SimpleQueue()
+                    thread = Thread(target=self._run, args=(queue,), name=f'writer-{idx}', daemon=True)
+                    thread.start()
+                    self._queues.append(queue)
+                    self._threads.append(thread)
+
+            self._opened += 1
+            return self._queues[self._opened % self.threads]
+
+    @staticmethod
+    def _run(queue: SimpleQueue):
+        while (item := queue.get()) is not None:
+            writer, chunk = item
+            writer.write_now(chunk)
+
+    def open(self, path: Path, *, append: bool = False, size: int = 0) -> FileWriter:
+        """Opens a file to write chunks of a download into.
+
+        :param path:
+        :param append: continue the file rather than rewrite it
+        :param size: bytes expected, if known
+
+        """
+        return FileWriter(
+            path,
+            append=append,
+            buffers=self.buffers,
+            queue=self._queue(),
+            size=size if self.preallocate else 0,
+        )
+
+    def close(self):
+        """Stops the writer threads once the chunks handed over are written.
+        Threads are started anew on the next .open().
+
+        """
+        with self._lock:
+            for queue in self._queues:
+                queue.put(None)
+
+            for thread in self._threads:
+                thread.join()
+
+            self._queues.clear()
+            self._threads.clear()
@@ -1,6 +1,10 @@
 import json
+from collections import Counter
 from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
 from typing import Any
+from urllib.parse import parse_qs
 
 import pytest
 
@@ -31,6 +35,15 @@ def mock_popen(monkeypatch):
     return fixture
 
 
+@pytest.fixture(autouse=True)
+def no_retry_delay(monkeypatch):
+    async def asleep(seconds):
+        pass
+
+    monkeypatch.setattr('sponsrdump.retry.sleep', lambda seconds: None)
+    monkeypatch.setattr('sponsrdump.retry.asleep', asleep)
+
+
 @pytest.fixture
 def auth_file(tmp_path, monkeypatch):
     auth_path = tmp_path / 'sponsrdump_auth.txt'
@@ -137,3 +150,81 @@ def data_unknown() -> dict:
         'file_title': 'file',
         'file_path': 'https://example.com/file',
     }
+
+
+@pytest.fixture
+def http_server():
+    """Local keep-alive HTTP server. Serves 'size' bytes for /<size> paths,
+    honors Range header and counts connections made to it.
+
+    Query parameters: 'status' - respond with the status instead;
+    'fail' - respond 503 to the given number of the first requests for the url;
+    'cookie' - set the cookie (e.g. 'a=b').
+
+    """
+    stats = {'connections': 0, 'requests': 0}
+    failed = Counter()
+
+    class Handler(BaseHTTPRequestHandler):
+
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            super().setup()
+            stats['connections'] += 1
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            stats['requests'] += 1
+            path, _, query = self.path.strip('/').partition('?')
+            query = parse_qs(query)
+            size = int(path or 1)
+            data = (bytes(range(256)) * (size // 256 + 1))[:size]
+            if (status := int(query.get('status', [0])[0])) or failed[self.path] < int(query.get('fail', [0])[0]):
+                failed[self.path] += 1
+                self.send_response(status or 503)
+                self.send_header('Content-Length', '0')
+                self.send_header('Retry-After', '0')
+                self.end_headers()
+                return
+
+            status = 200
+
+            if rng := self.headers.get('Range'):
+                start, _, end = rng.removeprefix('bytes=').partition('-')
+                data = data[int(start):int(end) + 1 if end else None]
+                status = 206
+
+            self.send_response(status)
+            self.send_header('Content-Length', f'{len(data)}')
+            self.send_header('Accept-Ranges', 'bytes')
+
+            for cookie in query.get('cookie', []):
+                self.send_header('Set-Cookie', cookie)
+
+            self.end_headers()
+
+            if self.command != 'HEAD':
+                self.wfile.write(data)
+
+        def do_HEAD(self):
+            # not counted as a request
+            stats['requests'] -= 1
+            self.do_GET()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = Thread(target=server.serve_forever, kwargs={'poll_interval': 0.01}, daemon=True)
+    thread.start()
+
+    class Server:
+        url = f'http://127.0.0.1:{server.server_address[1]}'
+
+    Server.stats = stats
+
+    yield Server
+
+    server.shutdown()
+    server.server_close()
@@ -157,7 +157,7 @@ def test_auth_read_invalid_format(auth_file):
 
 def test_auth_write(auth_file):
     dumper = SponsrDumper('https://sponsr.ru/test')
-    dumper._session.cookies.set('test_key', 'test_value')
+    dumper._transport.cookies.set('test_key', 'test_value')
     result = dumper._auth_write()
     assert result > 0
     content = auth_file.read_text()
@@ -454,3 +454,63 @@ def test_collect_posts_multiple_pages(auth_file, response_mock, project_html):
         dumper = SponsrDumper(url)
         collected = dumper._collect_posts(project_id=project_id)
         assert len(collected) == 2
+
+
+def test_mpd_parse(datafix_read):
+    video, audio = SponsrDumper._mpd_parse(datafix_read('some_mpd.xml').encode())
+
+    assert list(video) == ['640x360', '852x480', '1280x720', '1920x1080']
+    assert list(audio) == ['44100']
+    assert [rng for _, rng in video['1920x1080']] == ['36-799', '800-2127871', '2127872-4300309', '4300310-6602431']
+    # range-only segments take the base url
+    assert {url for url, _ in audio['44100'][1:]} == {(
+        'https://edge-msk-8.kinescopecdn.net/3e324c4c-4135-42a7-a393-6399d9062f6c/videos/'
+        'ac8b012d-a851-4c00-a718-69fd4666932e/assets/01931d05-7824-71d5-8698-7d4f989c43d6/'
+        'audio_0.mp4?kinescope_project_id=86eba8a9-f684-493b-a8e7-b80963caf355'
+    )}
+
+
+@pytest.mark.parametrize(('prefer_video', 'expected_video', 'expected_audio'), [
+    (VideoPreference(frame='852x480', sound='44100'), ['852x480'], ['44100']),
+    # unknown preferences fall back to the largest representation
+    (VideoPreference(), ['1920x1080'], ['44100']),
+    (VideoPreference(frame='100x100'), ['1920x1080'], ['44100']),
+    # renditions are picked later among all of them
+    (VideoPreference(frame='max:480'), ['640x360', '852x480', '1280x720', '1920x1080'], ['44100']),
+    (VideoPreference(frame='auto'), ['640x360', '852x480', '1280x720', '1920x1080'], ['44100']),
+    # several resolutions
+    (VideoPreference(frame='640x360,1280x720'), ['640x360', '1280x720'], ['44100']),
+    (VideoPreference(frame='640x360,best'), ['640x360', '1920x1080'], ['44100']),
+])
+def test_mpd_parse_keeps_preferred(datafix_read, prefer_video, expected_video, expected_audio):
+    video, audio = SponsrDumper._mpd_parse(datafix_read('some_mpd.xml').encode(), prefer_video=prefer_video)
+    assert list(video) == expected_video
+    assert list(audio) == expected_audio
+    assert len(video[expected_video[0]]) == 4
+
+
+def test_mpd_parse_audio_only(datafix_read):
+    prefer_video = VideoPreference(audio_only=True)
+    video, audio = SponsrDumper._mpd_parse(datafix_read('some_mpd.xml').encode(), prefer_video=prefer_video)
+    # video segments are not kept
+    assert not any(video.values())
+    assert len(audio['44100']) == 4
+
+
+def test_mpd_parse_dedup():
+    mpd = (
+        '<MPD xmlns="urn:mpeg:dash:schema:mpd:2011"><Period>'
+        '<AdaptationSet mimeType="video/mp4"><Representation width="640" height="360">'
+        '<BaseURL>https://cdn/</BaseURL><SegmentList>'
+        '<Initialization sourceURL="v.mp4" range="0-9"/>'
+        '<SegmentURL media="v.mp4" mediaRange="10-19"/>'
+        '<SegmentURL media="v.mp4" mediaRange="10-19"/>'
+        '<SegmentURL media="v.mp4" mediaRange="20-29"/>'
+        '</SegmentList></Representation></AdaptationSet>'
+        '<AdaptationSet mimeType="text/vtt"><Representation id="subs"/></AdaptationSet>'
+        '</Period></MPD>'
+    )
+    video, audio = SponsrDumper._mpd_parse(mpd.encode())
+    # exact duplicates are dropped
+    assert [rng for _, rng in video['640x360']] == ['0-9', '10-19', '20-29']
+    assert audio == {}
@@ -0,0 +1,153 @@
+from sponsrdump.base import FileType, SponsrDumper
+from sponsrdump.budget import RunBudget
+
+
+def test_run_budget_files():
+    budget = RunBudget(files=2)
+    assert budget.take('audio', key='a1')
+    assert budget.take('audio', key='a2')
+    assert not budget.take('text', key='t1')
+    assert budget.exhausted == 'files: 2'
+
+    # not unlimited
+    assert RunBudget().take('video', key='v1')
+    assert not RunBudget()
+
+
+def test_run_budget_bytes():
+    budget = RunBudget(bytes=250)
+    assert budget.take('video', key='v1')
+    budget.completed('video', key='v1', seconds=1, received=100)
+
+    # the next video is expected to take as much
+    assert budget.take('video', key='v2')
+    budget.completed('video', key='v2', seconds=1, received=100)
+    assert not budget.take('video', key='v3')
+    assert budget.exhausted == 'bytes: 250'
+
+
+def test_run_budget_bytes_reserved():
+    budget = RunBudget(bytes=250)
+    assert budget.take('audio', key='a1')
+    budget.completed('audio', key='a1', seconds=1, received=100)
+
+    # files started and not completed (e.g. queued) count against the limit
+    assert budget.take('audio', key='a2')
+    assert budget.reserved == 100
+    assert not budget.take('audio', key='a3')
+
+    # settled with the bytes actually received
+    budget.completed('audio', key='a2', seconds=1, received=10)
+    assert budget.reserved == 0
+    assert budget.received == 110
+
+
+def test_run_budget_bytes_first():
+    budget = RunBudget(bytes=1000)
+    assert budget.needs_size('video')
+    # the first file of a kind is judged by its estimate
+    assert not budget.take('video', key='v1', size=2000)
+
+    budget = RunBudget(bytes=1000)
+    assert budget.take('video', key='v1', size=600)
+    assert not budget.needs_size('video')
+    # then by the files of the kind started
+    assert not budget.take('video', key='v2')
+
+    budget = RunBudget(bytes=1000)
+    assert budget.take('video', key='v1', size=600)
+    budget.completed('video', key='v1', seconds=1, received=600)
+    # with no estimate, by the files of any kind
+    assert not budget.take('image', key='i1')
+    assert budget.exhausted == 'bytes: 1000'
+
+
+def test_run_budget_seconds(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('sponsrdump.budget.perf_counter', lambda: now[0])
+
+    budget = RunBudget(seconds=60)
+    assert budget.take('video', key='v1')
+    now[0] += 25
+    budget.completed('video', key='v1', seconds=25, received=0)
+
+    assert budget.take('video', key='v2')
+    now[0] += 25
+    budget.completed('video', key='v2', seconds=25, received=0)
+
+    # 50 seconds spent, another video would take 25
+    assert not budget.take('video', key='v3')
+    assert budget.exhausted == 'seconds: 60'
+
+
+def test_dump_max_files(remote_data, data_audio, data_attach, tmp_path, response_mock):
+    remote_data.files = [data_audio, data_attach]
+    dest = tmp_path / 'dump'
+
+    def dump():
+        dumper = SponsrDumper(remote_data.url)
+        dumper.search()
+        dumper.dump(dest, text=False, max_files=1)
+        return dumper
+
+    with response_mock(remote_data.rules, assert_all_requests_are_fired=False):
+        dumper = dump()
+        assert dumper.summary()['budget_exhausted'] == 'files: 1'
+        assert [path.name for path in dest.iterdir()] == ['001. 001. Test Post.mp3']
+
+        # the next run continues
+        dumper = dump()
+        assert sorted(path.name for path in dest.iterdir()) == ['001. 001. Test Post.mp3', '001. 002. Test Post.pdf']
+
+        dumper = dump()
+        assert dumper.summary()['budget_exhausted'] == ''
+
+
+def test_dump_max_bytes_first(remote_data, data_attach, tmp_path, response_mock):
+    remote_data.files = [data_attach]
+    remote_data.request_file = False
+    dest = tmp_path / 'dump'
+
+    with response_mock(remote_data.rules, assert_all_requests_are_fired=False) as mock:
+        mock.add('GET', data_attach['file_path'], body='x' * 500, headers={'Content-Length': '500'})
+
+        dumper = SponsrDumper(remote_data.url)
+        dumper.search()
+        dumper.dump(dest, text=False, max_bytes=100)
+
+    # the first file is not taken for empty: its estimate exceeds the limit
+    assert dumper.summary()['budget_exhausted'] == 'bytes: 100'
+    assert not list(dest.iterdir())
+
+
+def test_run_budget_bytes_smaller():
+    budget = RunBudget(bytes=1000)
+    assert not budget.take('attaches', key='a1', size=2000)
+    # a file not fitting does not stop smaller ones
+    assert budget.take('images', key='i1', size=100)
+    assert budget.exhausted == 'bytes: 1000'
+
+
+def test_dump_budget_keys(auth_file, http_server, tmp_path):
+    dumper = SponsrDumper('https://sponsr.ru/test')
+
+    def post(post_id: int, realm: str, size: int) -> dict:
+        files = {realm: [] for realm in ('audio', 'video', 'text', 'images', 'attaches')}
+        # file names (e.g. of images) repeat across posts
+        files[realm] = [{
+            'file_id': 'file.png', 'file_title': 'file.png', 'file_path': f'{http_server.url}/{size}',
+            'file_type': FileType.IMAGE if realm == 'images' else FileType.ATTACH,
+        }]
+        return {'post_id': post_id, 'post_title': f'Post {post_id}', '__files': files}
+
+    # posts are listed newest first, dumped oldest first
+    dumper._collected = [post(3, 'images', 10), post(2, 'images', 10), post(1, 'attaches', 5000)]
+    dumper.dump(tmp_path / 'dump', text=False, max_bytes=100)
+
+    # the large attachment is postponed, smaller images after it are dumped
+    dumped = sorted(path.name for path in (tmp_path / 'dump').iterdir())
+    assert dumped == ['002. 001. Post 2.png', '003. 001. Post 3.png']
+    assert dumper._budget.exhausted == 'bytes: 100'
+    # reservations of files with the same id are settled each
+    assert dumper._budget.reserved == 0
+    assert dumper._budget.received == 20
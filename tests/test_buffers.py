@@ -0,0 +1,68 @@
+import asyncio
+from threading import Thread
+
+from sponsrdump.base import SponsrDumper
+from sponsrdump.buffers import BufferBudget
+
+
+def test_buffer_budget():
+    buffers = BufferBudget(100)
+    assert buffers.try_acquire(60)
+    assert not buffers.try_acquire(50)
+
+    taken = []
+    reader = Thread(target=lambda: (buffers.acquire(50), taken.append(50)))
+    reader.start()
+    reader.join(0.05)
+    # the reader waits for a write
+    assert not taken
+
+    buffers.release(60)
+    reader.join()
+    assert taken == [50]
+
+    buffers.release(50)
+    # a chunk larger than the limit is let through alone
+    buffers.acquire(500)
+    assert buffers.held == 500
+    buffers.release(500)
+
+    assert buffers.held == 0
+    stats = buffers.stats()
+    assert (stats['limit'], stats['peak'], stats['waits']) == (100, 500, 1)
+    assert stats['waited'] > 0
+
+    # unlimited
+    assert BufferBudget(0).try_acquire(10 ** 12)
+
+
+def test_buffer_budget_async():
+    buffers = BufferBudget(100)
+    buffers.poll_interval = 0.001
+    buffers.acquire(100)
+
+    async def read():
+        waiting = asyncio.create_task(buffers.aacquire(10))
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+
+        buffers.release(100)
+        await waiting
+
+    asyncio.run(read())
+    assert buffers.held == 10
+    assert buffers.stats()['waits'] == 1
+
+
+def test_summary_memory(remote_data, data_audio, response_mock, tmp_path):
+    remote_data.files = [data_audio]
+
+    with response_mock(remote_data.rules):
+        dumper = SponsrDumper(remote_data.url, buffer_limit=1024)
+        dumper.search()
+        dumper.dump(tmp_path / 'dump', text=False)
+
+    memory = dumper.summary()['memory']
+    assert memory['buffers']['limit'] == 1024
+    assert memory['buffers']['peak'] == len('fake_binary_data')
+    assert memory['rss_peak'] > 0
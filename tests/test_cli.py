@@ -1,3 +1,8 @@
+import subprocess
+import sys
+
+import pytest
+
 from sponsrdump.cli import main
 
 
@@ -8,3 +13,37 @@ def test_main_smoke(remote_data, response_mock):
 def test_main_smoke_filter(remote_data, response_mock):
     with response_mock(remote_data.rules):
         main('https://sponsr.ru/test_project', '--filter', 'Test', '--prefer-video', '640x480')
+
+
+def test_main_prefer_video_invalid(capsys):
+    # rejected before anything is requested
+    with pytest.raises(SystemExit):
+        main('https://sponsr.ru/test_project', '--prefer-video', 'max:720p')
+
+    assert "'max:720p'" in capsys.readouterr().err
+
+
+def test_main_buffer_limit_no_writers(capsys):
+    # the limit only applies to chunks queued for writer threads
+    with pytest.raises(SystemExit):
+        main('https://sponsr.ru/test_project', '--buffer-limit', '16M')
+
+    assert '--writers' in capsys.readouterr().err
+
+
+def test_main_lazy_imports():
+    # argument parsing must not pay for heavy modules (run in a fresh interpreter)
+    code = (
+        'import sys\n'
+        'from sponsrdump.cli import main\n'
+        'from sponsrdump.converters import TextConverter\n'
+        'try:\n'
+        '    main("--help")\n'
+        'except SystemExit:\n'
+        '    pass\n'
+        'TextConverter.spawn("html")\n'
+        'heavy = {"requests", "aiohttp", "bs4", "lxml", "html2text", "urllib3"}\n'
+        'print(sorted(heavy.intersection(sys.modules)))\n'
+    )
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert result.stdout.splitlines()[-1] == '[]'
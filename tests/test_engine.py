@@ -0,0 +1,161 @@
+import threading
+
+import pytest
+from requests import HTTPError
+
+from sponsrdump.base import FileType, SponsrDumper, VideoPreference
+from sponsrdump.engine import AsyncEngine, Download
+from sponsrdump.manifests import Manifest
+from sponsrdump.retry import RetryScheduler
+from sponsrdump.throttle import Throttle
+from sponsrdump.transports import AiohttpTransport
+from sponsrdump.writers import FileWriter
+
+
+def expected(size: int, start: int = 0, end: int | None = None) -> bytes:
+    return (bytes(range(256)) * (size // 256 + 1))[:size][start:end]
+
+
+@pytest.fixture
+def engine():
+    transport = AiohttpTransport(headers={}, pool_size=8)
+    yield AsyncEngine(transport, throttle=Throttle({}, default=8), retry=RetryScheduler(), in_flight=16)
+    transport.close()
+
+
+def test_engine_download(http_server, engine, tmp_path):
+    downloads = [Download(f'{http_server.url}/{1000 + idx}', tmp_path / f'{idx}.bin') for idx in range(100)]
+    downloads.append(Download(f'{http_server.url}/5000', tmp_path / 'ranged.bin', range='100-199'))
+
+    done = []
+    assert engine.download(downloads, on_done=done.append) == [None] * 101
+    assert len(done) == 101
+
+    for idx in range(100):
+        assert (tmp_path / f'{idx}.bin').read_bytes() == expected(1000 + idx)
+
+    assert (tmp_path / 'ranged.bin').read_bytes() == expected(5000, 100, 200)
+
+    # connections are reused
+    assert http_server.stats['connections'] <= 8
+
+
+def test_engine_writes_off_loop(http_server, engine, tmp_path, monkeypatch):
+    threads = set()
+    write_now = FileWriter.write_now
+
+    def record(self, chunk):
+        threads.add(threading.current_thread())
+        write_now(self, chunk)
+
+    monkeypatch.setattr(FileWriter, 'write_now', record)
+    engine.chunk_size = 1000
+
+    assert engine.download([Download(f'{http_server.url}/5000', tmp_path / 'file.bin')]) == [None]
+    assert (tmp_path / 'file.bin').read_bytes() == expected(5000)
+
+    # with no writer threads a slow disk does not stall the event loop either
+    assert threads
+    assert engine.transport._thread not in threads
+
+
+def test_engine_errors(http_server, engine, tmp_path):
+    errors = engine.download([
+        Download(f'{http_server.url}/10?fail=2', tmp_path / 'flaky.bin'),
+        Download(f'{http_server.url}/10?status=404', tmp_path / 'missing.bin'),
+    ])
+
+    # transient failures are retried
+    assert errors[0] is None
+    assert (tmp_path / 'flaky.bin').read_bytes() == expected(10)
+
+    assert isinstance(errors[1], HTTPError)
+    assert errors[1].response.status_code == 404
+
+    assert engine._retry.stats() == {'retries': 2, 'recovered': 1, 'exhausted': 0, 'budget_left': 98}
+    assert engine._throttle.stats()[http_server.url.removeprefix('http://')]['throttled'] == 2
+
+
+def test_media_process_asynchronous(auth_file, http_server, monkeypatch, tmp_path):
+    signed = {'sig': 'old'}
+
+    def make_manifest():
+        # segments of the old signature are 'revoked'
+        status = '?status=403' if signed['sig'] == 'old' else ''
+        return Manifest(
+            kind='hls',
+            src=f'{http_server.url}/master.m3u8',
+            video={'640x360': [(f'{http_server.url}/{100 + idx}{status}', '') for idx in range(30)]},
+            audio={'0': [(f'{http_server.url}/1000', f'{idx * 10}-{idx * 10 + 9}') for idx in range(5)]},
+        )
+
+    def refresh():
+        signed['sig'] = 'new'
+        return make_manifest()
+
+    dumper = SponsrDumper('https://sponsr.ru/test')
+    captured = {}
+
+    def concat_chunks(*, src, suffix):
+        captured[suffix] = [fpath.read_bytes() for fpath in sorted(src.iterdir()) if f'_{suffix}.' in fpath.name]
+        return src / suffix
+
+    monkeypatch.setattr(dumper, '_concat_chunks', concat_chunks)
+
+    with dumper._asynchronous(enabled=True):
+        dumper._media_process(
+            make_manifest(), dest=tmp_path / 'out.mp4', prefer_video=VideoPreference(), refresh=refresh
+        )
+
+    assert dumper._engine is None
+    assert captured['vid'] == [expected(100 + idx) for idx in range(30)]
+    assert captured['aud'] == [expected(1000, idx * 10, idx * 10 + 10) for idx in range(5)]
+
+
+def test_dump_asynchronous(auth_file, http_server, tmp_path):
+    dumper = SponsrDumper('https://sponsr.ru/test')
+    files = {realm: [] for realm in ('audio', 'video', 'text', 'images', 'attaches')}
+    files['images'] = [
+        {'file_id': f'{idx}.png', 'file_title': f'{idx}.png', 'file_path': f'{http_server.url}/{idx + 1}'}
+        for idx in range(20)
+    ]
+    files['attaches'] = [{'file_id': 'doc', 'file_title': 'doc.pdf', 'file_path': f'{http_server.url}/5000'}]
+
+    for realm in ('images', 'attaches'):
+        for file_info in files[realm]:
+            file_info['file_type'] = FileType.IMAGE if realm == 'images' else FileType.ATTACH
+
+    dumper._collected = [{'post_id': 1, 'post_title': 'Post', '__files': files}]
+    dumper.dump(tmp_path / 'dump', text=False, asynchronous=True)
+
+    assert len(dumper._dumped) == 21
+    assert (tmp_path / 'dump' / '001. 021. Post.pdf').read_bytes() == expected(5000)
+    assert (tmp_path / 'dump' / '001. 005. Post.png').read_bytes() == expected(5)
+
+
+def test_dump_asynchronous_failed(auth_file, http_server, tmp_path):
+    dumper = SponsrDumper('https://sponsr.ru/test')
+
+    def post(post_id: int, realm: str, file_info: dict) -> dict:
+        files = {realm: [] for realm in ('audio', 'video', 'text', 'images', 'attaches')}
+        files[realm] = [file_info]
+        return {'post_id': post_id, 'post_title': f'Post {post_id}', '__files': files}
+
+    dumper._collected = [
+    # posts are listed newest first, dumped oldest first
+        post(1, 'video', {
+            'file_id': 'vid', 'file_title': 'vid.mp4', 'file_path': f'{http_server.url}/10?status=404',
+            'file_type': FileType.VIDEO,
+        }),
+        post(2, 'images', {
+            'file_id': 'img', 'file_title': 'img.png', 'file_path': f'{http_server.url}/10',
+            'file_type': FileType.IMAGE,
+        }),
+    ]
+
+    with pytest.raises(HTTPError):
+        dumper.dump(tmp_path / 'dump', text=False, asynchronous=True)
+
+    # the image queued before the failure is downloaded still
+    assert list(dumper._dumped) == ['f_img']
+    assert (tmp_path / 'dump' / '001. 001. Post 2.png').read_bytes() == expected(10)
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+from requests import HTTPError
+
+from sponsrdump.base import SponsrDumper
+from sponsrdump.events import (
+    ByteCounter,
+    BytesProgressed,
+    EventStream,
+    FileCompleted,
+    FileFailed,
+    FileQueued,
+    PostDiscovered,
+)
+
+
+@pytest.fixture
+def remote_files(remote_data, data_audio, data_attach):
+    remote_data.files = [data_audio, data_attach]
+    return remote_data
+
+
+def test_stream(remote_files, tmp_path, response_mock):
+    dest = tmp_path / 'dump'
+
+    with response_mock(remote_files.rules):
+        events = list(SponsrDumper(remote_files.url).stream(dest, video=False, images=False, text_to_video=False))
+
+    assert events[0] == PostDiscovered(post_id='123', title='Test Post', url='/post/123', files=3)
+    assert [type(event) for event in events[1:]] == [FileQueued, FileCompleted] * 3
+
+    queued, completed = events[1:3]
+    assert queued == FileQueued(post_id='123', file_id='audio123', kind='audio', dest=dest / '001. 001. Test Post.mp3')
+    assert completed == FileCompleted(file_id='audio123', dest=queued.dest, received=len('fake_binary_data'))
+
+    # files dumped previously are reported as skipped
+    with response_mock(remote_files.rules[:2]):
+        events = list(SponsrDumper(remote_files.url).stream(dest, video=False, images=False, text_to_video=False))
+
+    assert [event.skipped for event in events[1:]] == [True] * 3
+
+
+def test_stream_async(remote_files, tmp_path, response_mock):
+    dumper = SponsrDumper(remote_files.url)
+
+    async def consume():
+        return [event async for event in dumper.stream(tmp_path, text=False, video=False, images=False)]
+
+    with response_mock(remote_files.rules):
+        events = asyncio.run(consume())
+
+    assert [type(event) for event in events] == [PostDiscovered, FileQueued, FileCompleted, FileQueued, FileCompleted]
+
+
+def test_stream_failed(remote_files, tmp_path, response_mock):
+    remote_files.request_file = False
+    rules = [*remote_files.rules, f"GET {remote_files.files[0]['file_path']} -> 404 :missing"]
+    called = []
+    received = []
+
+    with response_mock(rules), pytest.raises(HTTPError):
+        received.extend(SponsrDumper(remote_files.url, on_event=called.append).stream(tmp_path, text=False))
+
+    # the constructor callback is called as well
+    assert called == received
+    failed = received[-1]
+    assert isinstance(failed, FileFailed)
+    assert failed.file_id == 'audio123'
+    assert isinstance(failed.error, HTTPError)
+
+
+def test_stream_backpressure():
+    emitted = []
+
+    def produce(emit):
+        for idx in range(1000):
+            emit(idx)
+            emitted.append(idx)
+
+    stream = EventStream(produce, maxsize=5)
+
+    for event in stream:
+        if event == 2:
+            # the producer waits for the consumer
+            assert len(emitted) <= 8
+            break
+
+    # and is stopped once the consumer stops
+    assert not stream._thread.is_alive()
+    assert len(emitted) < 1000
+
+
+def test_byte_counter():
+    events = []
+    counter = ByteCounter('file', emit=events.append)
+    counter.step = 100
+
+    for _ in range(25):
+        counter.add(10)
+
+    assert counter.received == 250
+    assert events == [BytesProgressed('file', 100), BytesProgressed('file', 200)]
@@ -11,6 +11,8 @@ https://sponsr.ru/greenpig/ (video post 157553, kinescope embed 5Ff4dcABMcX8zPez
 """
 
 import json
+import shlex
+from types import SimpleNamespace
 from urllib.parse import parse_qs, urlparse
 
 import pytest
@@ -22,6 +24,7 @@ from sponsrdump.base import (
     VideoPreference,
     sort_idents,
 )
+from sponsrdump.manifests import EXPIRY_DEFAULT, Manifest, ManifestCache, ManifestPrefetcher, signed_expiry
 from sponsrdump.utils import progress
 
 EMBED_ID = '5Ff4dcABMcX8zPez93kB9D'
@@ -196,19 +199,28 @@ def test_resolve_kinescope_hls(dumper, hls_rules, response_mock, mock_popen, tmp
 
 
 def test_resolve_kinescope_dash_fallback(dumper, response_mock, datafix_read, monkeypatch):
-    # embed page exposing only a signed DASH manifest must fall back to the MPD download path
+    # embed page exposing only a signed DASH manifest must fall back to the MPD
     embed = datafix_read('kinescope_embed_dash.html')
+    mpd_url = 'https://kinescope.io/25df393d-09bf-43a3-b466-7d222c6ce9b9/master.mpd'
     captured = {}
 
-    def fake_download(self, url, *, dest, prefer_video, **kwargs):
-        captured['url'] = url
+    def fake_media_process(self, manifest, *, dest, prefer_video, refresh):
+        captured['manifest'] = manifest
 
-    monkeypatch.setattr(SponsrDumper, '_download_file', fake_download)
+    monkeypatch.setattr(SponsrDumper, '_media_process', fake_media_process)
 
-    with response_mock([f'GET {EMBED_URL} -> 200 :{embed}']):
+    with response_mock([
+        f'GET {EMBED_URL} -> 200 :{embed}',
+        f"GET {mpd_url} -> 200 :{datafix_read('some_mpd.xml')}",
+    ]):
         dumper._resolve_kinescope(EMBED_URL, dest='/tmp/out.mp4', prefer_video=VideoPreference())
 
-    assert captured['url'].endswith('master.mpd?expires=1780640928&sign=7b17afd553c3c390')
+    manifest = captured['manifest']
+    assert manifest.kind == 'dash'
+    assert manifest.src.endswith('master.mpd?expires=1780640928&sign=7b17afd553c3c390')
+    # the manifest is cached in full for any resolution to be chosen later
+    assert list(manifest.video) == ['640x360', '852x480', '1280x720', '1920x1080']
+    assert list(manifest.audio) == ['44100']
 
 
 def test_resolve_kinescope_no_player_options(dumper, response_mock):
@@ -363,6 +375,76 @@ def test_dump_video_via_hls(auth_file, hls_rules, response_mock, datafix_read, m
     assert ffmpeg_cmds[-1].count('-i ') == 2
 
 
+def test_dump_video_several_resolutions(
+        auth_file, hls_rules, response_mock, datafix_read, mock_popen, tmp_path, before_expiry):
+    post_text = f'<iframe src="{EMBED_URL}" data-url="/post/video/?video_id=25df393d"></iframe>'
+    posts = {'response': {'rows': [{'post_id': '1', 'post_title': 'Post', 'post_text': post_text}], 'rows_count': 1}}
+    rules = [
+        'GET https://sponsr.ru/greenpig/ -> 200 :' + datafix_read('project.html'),
+        'GET https://sponsr.ru/project/187/more-posts/?offset=0 -> 200 :' + json.dumps(posts),
+    ]
+    dest = tmp_path / 'dump'
+    cdn = 'https://edge-msk-1.kinescopecdn.net/videos/869b5dec/assets/019e7bce'
+
+    def dump(frame: str) -> list[str]:
+        mock_popen.commands.clear()
+
+        with response_mock(rules, assert_all_requests_are_fired=False) as mock:
+            hls_rules(mock)
+            dumper = SponsrDumper('https://sponsr.ru/greenpig/')
+            dumper._collected = dumper._collect_posts(project_id='187')
+            dumper.dump(dest, audio=False, images=False, text=False, prefer_video=VideoPreference(frame=frame))
+            urls = [call.request.url.partition('?')[0] for call in mock.calls]
+
+        # audio (init + 2 segments) is downloaded once, video (init + 3 segments) for each resolution
+        assert urls.count(f'{cdn}-aud/audio_0.mp4') == 3
+        return [shlex.split(cmd)[-1] for cmd in mock_popen.commands if cmd.startswith('ffmpeg')]
+
+    assert dump('640x360,1280x720') == [
+        f'{dest}/001. 001. Post [640x360].mp4',
+        f'{dest}/001. 001. Post [1280x720].mp4',
+    ]
+    dumped = json.loads((tmp_path / 'sponsrdump.json').read_text())['dumped']
+    assert dumped == {
+        'f_25df393d@640x360': '001. 001. Post [640x360].mp4',
+        'f_25df393d@1280x720': '001. 001. Post [1280x720].mp4',
+    }
+
+    # only the resolution not dumped yet is downloaded on the next run
+    assert dump('640x360,1280x720,854x480') == [f'{dest}/001. 001. Post [854x480].mp4']
+
+
+def test_dump_video_audio_only(auth_file, hls_rules, response_mock, datafix_read, mock_popen, tmp_path):
+    post_text = f'<iframe src="{EMBED_URL}" data-url="/post/video/?video_id=25df393d"></iframe>'
+    posts = {'response': {'rows': [{'post_id': '1', 'post_title': 'Post', 'post_text': post_text}], 'rows_count': 1}}
+    rules = [
+        'GET https://sponsr.ru/greenpig/ -> 200 :' + datafix_read('project.html'),
+        'GET https://sponsr.ru/project/187/more-posts/?offset=0 -> 200 :' + json.dumps(posts),
+    ]
+    dest = tmp_path / 'dump'
+
+    with response_mock(rules, assert_all_requests_are_fired=False) as mock:
+        hls_rules(mock)
+        dumper = SponsrDumper('https://sponsr.ru/greenpig/')
+        dumper._collected = dumper._collect_posts(project_id='187')
+        dumper.dump(dest, audio=False, images=False, text=False, prefer_video=VideoPreference(audio_only=True))
+        urls = [call.request.url.partition('?')[0] for call in mock.calls]
+
+    # no video segments are fetched
+    assert not [url for url in urls if url.endswith('360p.mp4')]
+    assert urls.count('https://edge-msk-1.kinescopecdn.net/videos/869b5dec/assets/019e7bce-aud/audio_0.mp4') == 3
+
+    # the audio alone is remuxed
+    ffmpeg_cmds = [cmd for cmd in mock_popen.commands if cmd.startswith('ffmpeg')]
+    assert len(ffmpeg_cmds) == 1
+    assert ffmpeg_cmds[0].count('-i ') == 1
+    assert ' -c copy ' in ffmpeg_cmds[0]
+    assert shlex.split(ffmpeg_cmds[0])[-1] == f'{dest}/001. 001. Post.m4a'
+
+    dumped = json.loads((tmp_path / 'sponsrdump.json').read_text())['dumped']
+    assert dumped == {'f_25df393d@audio': '001. 001. Post.m4a'}
+
+
 # --------------------------------------------------------------------------- #
 # progress reporting
 # --------------------------------------------------------------------------- #
@@ -416,3 +498,259 @@ def test_progress_zero_total_noop():
     stream = Stream()
     progress('video', 0, 0, stream=stream)
     assert stream.buf == ''
+
+
+# --------------------------------------------------------------------------- #
+# manifest cache
+# --------------------------------------------------------------------------- #
+
+@pytest.fixture
+def before_expiry(monkeypatch):
+    # fixtures are signed with expires=1780640928; pretend it is an hour earlier
+    monkeypatch.setattr('sponsrdump.manifests.time.time', lambda: 1780637328.0)
+
+
+@pytest.mark.parametrize(('url', 'expected'), [
+    (MASTER_URL, 1780640928),
+    ('https://kinescope.io/x/master.m3u8', 0),
+    ('https://kinescope.io/x/master.m3u8?expires=bogus', 0),
+])
+def test_signed_expiry(url, expected):
+    assert signed_expiry(url) == expected
+
+
+def test_kinescope_manifest_cached(dumper, hls_rules, response_mock, before_expiry):
+    with response_mock([], assert_all_requests_are_fired=False) as mock:
+        hls_rules(mock)
+        manifest = dumper._kinescope_manifest(EMBED_URL)
+        calls_resolved = len(mock.calls)
+        # the second resolution is served from the cache, no requests made
+        assert dumper._kinescope_manifest(EMBED_URL) is manifest
+        assert len(mock.calls) == calls_resolved
+
+    assert manifest.kind == 'hls'
+    assert manifest.expires == 1780640928
+    assert list(manifest.video) == ['640x360', '854x480', '1280x720']
+
+
+def test_kinescope_manifest_expired_not_cached(dumper, hls_rules, response_mock):
+    # fixtures signatures are already expired: nothing is cached
+    with response_mock([], assert_all_requests_are_fired=False) as mock:
+        hls_rules(mock)
+        manifest = dumper._kinescope_manifest(EMBED_URL)
+
+    assert manifest.expires == 0
+    assert not manifest.expired
+    assert EMBED_ID not in dumper._manifests
+
+
+def test_manifest_cache_conf_roundtrip(dumper, before_expiry):
+    manifest = dumper._manifests.put(EMBED_ID, Manifest(
+        kind='hls', src=MASTER_URL, video={'640x360': [('https://cdn/v.mp4', '0-9')]}, audio={},
+    ))
+    dumper._conf_save()
+
+    restored = SponsrDumper('https://sponsr.ru/greenpig/')
+    restored._conf_load()
+    assert restored._manifests.get(EMBED_ID) == manifest
+
+
+def test_manifest_cache_expiry(before_expiry, monkeypatch):
+    cache = ManifestCache()
+    # no expiry in url: kept for the default period
+    manifest = cache.put('a', Manifest(kind='dash', src='https://kinescope.io/a/master.mpd', video={}, audio={}))
+    assert manifest.expires == 1780637328.0 + EXPIRY_DEFAULT
+    assert 'a' in cache
+
+    monkeypatch.setattr('sponsrdump.manifests.time.time', lambda: manifest.expires)
+    assert cache.get('a') is None
+    assert not len(cache)
+
+
+def test_manifest_prefetcher():
+    resolved = []
+
+    def resolve(url: str) -> Manifest:
+        resolved.append(url)
+        if url == 'd':
+            raise HTTPError('gone')
+        return make_manifest(url)
+
+    prefetcher = ManifestPrefetcher(resolve, ['a', 'b', 'c', 'd'], ahead=2)
+    prefetcher.wait('b')
+    assert sorted(resolved) == ['a', 'b']
+
+    prefetcher.started('a')
+    prefetcher.started('b')
+    prefetcher.started('x')  # not an embed url
+    prefetcher.wait('c')
+    prefetcher.wait('d')  # the error is left for the dump to face
+    prefetcher.close()
+
+    assert sorted(resolved) == ['a', 'b', 'c', 'd']
+
+
+def test_kinescope_manifest_prefetched(dumper, hls_rules, response_mock, before_expiry):
+    with response_mock([], assert_all_requests_are_fired=False) as mock:
+        hls_rules(mock)
+        dumper._prefetcher = ManifestPrefetcher(dumper._kinescope_cache, [EMBED_URL])
+        manifest = dumper._kinescope_manifest(EMBED_URL)
+        dumper._prefetcher.close()
+
+        # resolved once, in background
+        assert [call.request.url for call in mock.calls].count(EMBED_URL) == 1
+
+    assert manifest == dumper._manifests.get(EMBED_ID)
+
+
+# --------------------------------------------------------------------------- #
+# re-signing of expired manifests
+# --------------------------------------------------------------------------- #
+
+def make_manifest(sign: str, *, expires: float = 0) -> Manifest:
+    return Manifest(
+        kind='hls',
+        src=f'https://kinescope.io/x/master.m3u8?sign={sign}',
+        video={'640x360': [(f'https://cdn.example/v.mp4?sign={sign}', f'{idx}-{idx}') for idx in range(3)]},
+        audio={},
+        expires=expires,
+    )
+
+
+def test_media_process_resigns_on_forbidden(dumper, response_mock, mock_popen, tmp_path):
+    refreshed = []
+
+    def refresh():
+        refreshed.append(True)
+        return make_manifest('new')
+
+    with response_mock([], assert_all_requests_are_fired=False) as mock:
+
+        def segment_callback(request):
+            params = parse_qs(urlparse(request.url).query)
+            if params['sign'] == ['old'] and request.headers['Range'] != 'bytes=0-0':
+                return 403, {}, 'expired'
+            return 200, {}, b'chunk'
+
+        mock.add_callback('GET', 'https://cdn.example/v.mp4', callback=segment_callback)
+
+        dumper._media_process(
+            make_manifest('old'), dest=tmp_path / 'out.mp4', prefer_video=VideoPreference(), refresh=refresh)
+        signs = [parse_qs(urlparse(call.request.url).query)['sign'][0] for call in mock.calls]
+
+    assert len(refreshed) == 1
+    # the first segment went fine, the second failed and continued with the new signature
+    assert signs == ['old', 'old', 'new', 'new']
+    assert any('ffmpeg' in cmd for cmd in mock_popen.commands)
+
+
+def test_media_process_resigns_expired(dumper, response_mock, mock_popen, tmp_path, monkeypatch):
+    monkeypatch.setattr('sponsrdump.manifests.time.time', lambda: 1000.0)
+
+    with response_mock([], assert_all_requests_are_fired=False) as mock:
+        mock.add('GET', 'https://cdn.example/v.mp4', body=b'chunk')
+        dumper._media_process(
+            make_manifest('old', expires=1030), dest=tmp_path / 'out.mp4', prefer_video=VideoPreference(),
+            refresh=lambda: make_manifest('new', expires=5000),
+        )
+        signs = {parse_qs(urlparse(call.request.url).query)['sign'][0] for call in mock.calls}
+
+    # expiry is within the safety margin: re-signed before the very first segment
+    assert signs == {'new'}
+
+
+def test_media_process_resign_mismatch(dumper, response_mock, tmp_path):
+    shorter = make_manifest('new')
+    shorter.video['640x360'].pop()
+
+    with response_mock(['GET https://cdn.example/v.mp4 -> 403 :expired'], assert_all_requests_are_fired=False):
+        with pytest.raises(SponsrDumperError, match='Unable to map re-signed video'):
+            dumper._media_process(
+                make_manifest('old'), dest=tmp_path / 'out.mp4', prefer_video=VideoPreference(),
+                refresh=lambda: shorter,
+            )
+
+
+def test_media_process_forbidden_without_refresh(dumper, response_mock, tmp_path):
+    with response_mock(['GET https://cdn.example/v.mp4 -> 403 :denied']):
+        with pytest.raises(HTTPError):
+            dumper._media_process(make_manifest('old'), dest=tmp_path / 'out.mp4', prefer_video=VideoPreference())
+
+
+def test_media_process_scratch_dir(auth_file, response_mock, tmp_path, monkeypatch):
+    scratch = tmp_path / 'scratch'
+    dumper = SponsrDumper('https://sponsr.ru/greenpig/', scratch_dir=scratch)
+    used = []
+
+    def concat_chunks(*, src, suffix):
+        used.append(src)
+        return src / suffix
+
+    monkeypatch.setattr(dumper, '_concat_chunks', concat_chunks)
+
+    with response_mock(['GET https://cdn.example/v.mp4 -> 200 :chunk']):
+        dumper._media_process(make_manifest('a'), dest=tmp_path / 'out.mp4', prefer_video=VideoPreference())
+
+    # a directory of its own, removed afterwards
+    assert used[0].parent == scratch
+    assert used[0].name.startswith('sponsrdump-')
+    assert not list(scratch.iterdir())
+
+    # chunks are removed on failure as well
+    with response_mock(['GET https://cdn.example/v.mp4 -> 403 :denied']):
+        with pytest.raises(HTTPError):
+            dumper._media_process(make_manifest('b'), dest=tmp_path / 'out.mp4', prefer_video=VideoPreference())
+
+    assert not list(scratch.iterdir())
+
+
+def test_media_process_disk_space(dumper, response_mock, tmp_path, monkeypatch):
+    monkeypatch.setattr('sponsrdump.base.shutil.disk_usage', lambda path: SimpleNamespace(free=5))
+
+    with response_mock([]):
+        # 3 bytes of chunks with a copy and 3 bytes of the video do not fit; nothing is requested
+        with pytest.raises(SponsrDumperError, match='Not enough disk space'):
+            dumper._media_process(make_manifest('a'), dest=tmp_path / 'out.mp4', prefer_video=VideoPreference())
+
+    assert not list(tmp_path.glob('tmp/*'))
+
+
+def test_media_process_disk_space_unranged(dumper, response_mock, tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr('sponsrdump.base.shutil.disk_usage', lambda path: SimpleNamespace(free=1000))
+    manifest = Manifest(
+        kind='hls',
+        src='',
+        video={'1280x720': [(f'https://cdn.example/v{idx}.ts', '') for idx in range(10)]},
+        audio={'0': [('https://cdn.example/a0.ts', '')]},
+    )
+
+    with response_mock([], assert_all_requests_are_fired=False) as mock:
+        # a segment per rendition is probed for the size; that of the audio is unknown
+        mock.add('HEAD', 'https://cdn.example/v0.ts', headers={'Content-Length': '100'})
+        mock.add('HEAD', 'https://cdn.example/a0.ts', status=404)
+        mock.add('GET', 'https://cdn.example/a0.ts', status=404)
+
+        with caplog.at_level('INFO', logger='sponsrdump'), pytest.raises(SponsrDumperError, match='Not enough disk'):
+            dumper._media_process(manifest, dest=tmp_path / 'out.mp4', prefer_video=VideoPreference())
+
+    assert 'Size of 0 is unknown' in caplog.text
+
+
+def test_resolve_kinescope_refresh_drops_cache(dumper, monkeypatch, before_expiry):
+    manifest = dumper._manifests.put(EMBED_ID, make_manifest('old'))
+    captured = {}
+
+    def fake_media_process(self, manifest_used, *, dest, prefer_video, refresh):
+        captured['used'] = manifest_used
+
+        def fake_manifest(self, embed_url):
+            captured['cached'] = self._kinescope_embed_id(embed_url) in self._manifests
+
+        monkeypatch.setattr(SponsrDumper, '_kinescope_manifest', fake_manifest)
+        refresh()
+
+    monkeypatch.setattr(SponsrDumper, '_media_process', fake_media_process)
+    dumper._resolve_kinescope(EMBED_URL, dest='/tmp/out.mp4', prefer_video=VideoPreference())
+
+    assert captured['used'] == manifest
+    assert captured['cached'] is False
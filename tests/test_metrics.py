@@ -0,0 +1,83 @@
+import json
+
+from sponsrdump.base import SponsrDumper
+from sponsrdump.cli import main
+from sponsrdump.metrics import Latencies, Metrics, percentile
+
+
+def test_percentile():
+    values = [float(value) for value in range(1, 101)]
+    assert percentile(values, 0.5) == 50
+    assert percentile(values, 0.95) == 95
+    assert percentile([3.0], 0.95) == 3
+    assert percentile([], 0.5) == 0
+
+
+def test_metrics():
+    metrics = Metrics()
+
+    with metrics.span('segments') as span:
+        span.bytes = 100
+
+    with metrics.span('listing', items=3):
+        pass
+
+    for latency in (0.1, 0.2, 0.3, 0.4):
+        metrics.observe('cdn', latency)
+
+    stats = metrics.stats()
+    assert stats['bytes'] == 100
+    assert stats['phases']['segments']['bytes'] == 100
+    assert stats['phases']['listing']['count'] == 3
+    assert stats['requests']['cdn'] == {'count': 4, 'seconds': 1.0, 'p50': 0.2, 'p95': 0.4, 'max': 0.4}
+
+    prom = metrics.to_prometheus()
+    assert '# TYPE sponsrdump_request_latency_seconds summary' in prom
+    assert 'sponsrdump_request_latency_seconds{host="cdn",quantile="0.95"} 0.4' in prom
+    assert 'sponsrdump_request_latency_seconds_count{host="cdn"} 4' in prom
+    assert 'sponsrdump_phase_bytes_total{phase="segments"} 100' in prom
+
+
+def test_metrics_latencies_bounded():
+    latencies = Latencies()
+
+    for idx in range(1, 100_001):
+        latencies.add(idx / 100_000)
+
+    # percentiles come from a bounded sample, totals stay exact
+    assert len(latencies.sample) == Latencies.sample_size
+    stats = latencies.stats()
+    assert (stats['count'], stats['max']) == (100_000, 1)
+    assert stats['seconds'] == 50000.5
+    assert abs(stats['p50'] - 0.5) < 0.1
+    assert abs(stats['p95'] - 0.95) < 0.05
+
+    metrics = Metrics()
+    assert metrics.phase('segments') == {'count': 0, 'seconds': 0, 'bytes': 0}
+
+
+def test_dump_phases(remote_data, data_audio, response_mock, tmp_path):
+    remote_data.files = [data_audio]
+
+    with response_mock(remote_data.rules):
+        dumper = SponsrDumper(remote_data.url)
+        dumper.search()
+        dumper.dump(tmp_path / 'dump', video=False, images=False)
+
+    stats = dumper.summary()['metrics']
+    phases = stats['phases']
+    assert phases['listing']['count'] == 1
+    assert phases['normalization']['count'] == 1
+    assert phases['files']['bytes'] == len('fake_binary_data')
+    assert phases['text']['count'] == 1
+    assert phases['text_video']['count'] == 1
+    assert stats['requests']['sponsr.ru']['count'] == 2
+
+
+def test_cli_metrics_export(remote_data, response_mock, tmp_path):
+    with response_mock(remote_data.rules):
+        main(remote_data.url, '--metrics', f'{tmp_path / "metrics.json"}')
+        main(remote_data.url, '--metrics', f'{tmp_path / "metrics.prom"}')
+
+    assert 'listing' in json.loads((tmp_path / 'metrics.json').read_text())['phases']
+    assert 'sponsrdump_run_seconds' in (tmp_path / 'metrics.prom').read_text()
@@ -0,0 +1,116 @@
+import json
+import time
+from pathlib import Path
+
+from responses import matchers
+
+from sponsrdump.base import SponsrDumper
+from sponsrdump.cli import main
+from sponsrdump.manifests import Manifest
+from sponsrdump.plan import AUDIO_BITRATE, Plan, PostPlan, range_size
+
+
+def test_range_size():
+    assert range_size('0-99') == 100
+    assert range_size('100-') is None
+
+
+def test_plan(remote_data, data_audio, data_attach, response_mock):
+    remote_data.files = [data_audio, data_attach]
+    remote_data.request_file = False
+    remote_data.text = (
+        '<p>Text</p><iframe src="https://kinescope.io/embed1" data-url="/post/video/?video_id=vid1"></iframe>'
+    )
+    cdn = 'https://edge.kinescopecdn.net'
+    rules = [
+        *remote_data.rules,
+        # no size reported for audio: guessed from duration
+        f"GET {data_audio['file_path']} -> 500 :error",
+        # sample for the rate
+        f"GET {cdn}/v.mp4 -> 200 :{'z' * 100}",
+    ]
+
+    with response_mock(rules, assert_all_requests_are_fired=False) as mock:
+        # sizes are taken from HEAD; the first unranged segment is taken for all of them
+        mock.add('HEAD', data_attach['file_path'], headers={'Content-Length': '500'})
+        # or from the first byte asked for if HEAD is not allowed
+        mock.add('HEAD', f'{cdn}/a/0.mp4', status=405)
+        mock.add(
+            'GET', f'{cdn}/a/0.mp4', body='y', status=206, headers={'Content-Range': 'bytes 0-0/50'},
+            match=[matchers.header_matcher({'Range': 'bytes=0-0'})],
+        )
+
+        dumper = SponsrDumper(remote_data.url)
+        dumper.search()
+
+        expires = int(time.time()) + 3600
+        manifest = Manifest(
+            kind='hls',
+            src=f'https://kinescope.io/embed1/master.m3u8?expires={expires}',
+            video={
+                '640x360': [(f'{cdn}/small.mp4', '0-9')],
+                '1280x720': [(f'{cdn}/v.mp4', '0-99'), (f'{cdn}/v.mp4', '100-199'), (f'{cdn}/v.mp4', '200-299')],
+            },
+            audio={'0': [(f'{cdn}/a/0.mp4', ''), (f'{cdn}/a/1.mp4', '')]},
+        )
+        dumper._manifests.put('embed1', manifest)
+
+        plan = dumper.plan(images=False)
+
+    audio_guessed = data_audio['file_duration'] * AUDIO_BITRATE // 8
+    post = plan.posts[0]
+    assert post.post_id == '123'
+    # audio, video, text, attach
+    assert post.files == 4
+    # audio size, segments, attachment size, embed page with master and media playlists
+    assert post.requests == 1 + 5 + 1 + 5
+    assert post.bytes == audio_guessed + 300 + 2 * 50 + len(remote_data.text) + 500
+    assert post.guessed == audio_guessed + 2 * 50
+    assert plan.rate > 0
+    assert 'Projected time' in plan.report()
+
+    # resolved manifests are kept for the dump apart from the configuration
+    assert 'embed1' in json.loads(Path(SponsrDumper._fname_manifests).read_text())['kinescope']
+    assert 'manifests' not in json.loads(Path(SponsrDumper._fname_conf).read_text())
+
+
+def test_plan_rate_unavailable(remote_data, response_mock):
+    remote_data.text = '<iframe src="https://kinescope.io/embed1" data-url="/post/video/?video_id=vid1"></iframe>'
+    cdn = 'https://edge.kinescopecdn.net'
+
+    # the sample segment is denied
+    with response_mock([*remote_data.rules, f'GET {cdn}/v.mp4 -> 403 :denied'], assert_all_requests_are_fired=False):
+        dumper = SponsrDumper(remote_data.url)
+        dumper.search()
+
+        expires = int(time.time()) + 3600
+        dumper._manifests.put('embed1', Manifest(
+            kind='hls',
+            src=f'https://kinescope.io/embed1/master.m3u8?expires={expires}',
+            video={'1280x720': [(f'{cdn}/v.mp4', '0-99')]},
+            audio={},
+        ))
+
+        plan = dumper.plan(images=False)
+
+    # the rate is unknown rather than the plan failing
+    assert plan.rate == 0
+    assert plan.posts[0].bytes == 100 + len(remote_data.text)
+    assert plan.report()
+
+
+def test_plan_seconds():
+    plan = Plan(posts=[PostPlan('1', 'a', files=1, requests=10, bytes=1000)], rate=100, latency=0.5, workers=5)
+    assert plan.seconds == 10 + 1
+
+
+def test_plan_cli(remote_data, data_attach, response_mock, tmp_path):
+    remote_data.files = [data_attach]
+    remote_data.request_file = False
+    rules = [*remote_data.rules, f"GET {data_attach['file_path']} -> 200 :{'x' * 10}"]
+
+    with response_mock(rules):
+        main(remote_data.url, '--plan', '--to', f'{tmp_path / "dump"}')
+
+    # nothing is downloaded
+    assert not (tmp_path / 'dump').exists()
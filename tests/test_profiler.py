@@ -0,0 +1,83 @@
+import pstats
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from sponsrdump.cli import main
+from sponsrdump.metrics import Metrics
+from sponsrdump.profiler import PROFILE_PER_THREAD, Profiler
+
+
+def busy(seconds: float):
+    until = time.perf_counter() + seconds
+    while time.perf_counter() < until:
+        pass
+
+
+def test_profiler_threads():
+    metrics = Metrics()
+    profiler = Profiler(top=3, interval=0.001)
+
+    def segment(_):
+        with metrics.span('segments'):
+            busy(0.02)
+
+    with profiler.profiling(metrics):
+        with metrics.span('listing'):
+            busy(0.02)
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            list(executor.map(segment, range(4)))
+
+    assert metrics.tracer is None
+
+    report = profiler.report()
+    assert '[listing]' in report
+    # worker threads are profiled as well
+    assert '[segments]' in report
+    assert 'busy (test_profiler.py' in report
+
+
+@pytest.mark.skipif(PROFILE_PER_THREAD, reason='a profile per thread is allowed before 3.12')
+def test_profiler_single():
+    metrics = Metrics()
+    profiler = Profiler(interval=0.001)
+
+    def segment(_):
+        with metrics.span('segments'):
+            busy(0.02)
+        return sys.monitoring.get_tool(sys.monitoring.PROFILER_ID)
+
+    with profiler.profiling(metrics), ThreadPoolExecutor(max_workers=2) as executor:
+        # workers share the profile of the run instead of failing to start their own
+        assert set(executor.map(segment, range(4))) == {'cProfile'}
+
+    assert not profiler._profiles
+    assert '[segments]' in profiler.report()
+
+
+def test_profiler_sampling(tmp_path):
+    metrics = Metrics()
+    profiler = Profiler(sampling=True, interval=0.001)
+
+    with profiler.profiling(metrics), metrics.span('mux'):
+        busy(0.1)
+
+    assert profiler.report().startswith('[mux]')
+
+    profiler.save(tmp_path / 'profile.folded')
+    assert 'mux;' in (tmp_path / 'profile.folded').read_text()
+
+
+def test_cli_profile(remote_data, response_mock, tmp_path):
+    path = tmp_path / 'run.pstats'
+
+    with response_mock(remote_data.rules):
+        main(remote_data.url, '--profile', f'{path}', '--profile-top', '5')
+
+    assert pstats.Stats(f'{path}').total_calls
+    report = (tmp_path / 'run.pstats.txt').read_text()
+    assert '[listing]' in report
+    assert '[text]' in report
@@ -0,0 +1,154 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from sponsrdump.base import SponsrDumper, VideoPreference
+from sponsrdump.exceptions import SponsrDumperError
+from sponsrdump.manifests import Manifest
+from sponsrdump.metrics import Metrics
+from sponsrdump.renditions import AutoResolution, frame_filename, frame_height, parse_frames, pick_capped
+
+IDENTS = ['640x360', '1280x720', '1920x1080']
+SIZES = {'640x360': 100, '1280x720': 300, '1920x1080': 900}
+
+
+def test_pick_capped():
+    assert frame_height('1280x720') == 720
+    assert pick_capped(IDENTS, 720) == '1280x720'
+    assert pick_capped(IDENTS, 1000) == '1280x720'
+    assert pick_capped(IDENTS, 4000) == '1920x1080'
+    # nothing fits: the smallest
+    assert pick_capped(IDENTS, 240) == '640x360'
+
+
+def test_video_preference():
+    assert VideoPreference().fixed
+    assert VideoPreference(frame='1280x720').fixed
+    assert VideoPreference(frame='max:720').cap == 720
+    assert not VideoPreference(frame='max:720').fixed
+    assert not VideoPreference(frame='auto').fixed
+
+    several = VideoPreference(frame='640x360, max:720')
+    assert several.frames == ['640x360', 'max:720']
+    assert not several.cap
+    assert not several.fixed
+    assert VideoPreference(frame='640x360,1280x720').fixed
+
+
+@pytest.mark.parametrize('frame', ['max:720p', 'max:abc', '720p', '640x360,max:'])
+def test_video_preference_invalid(frame):
+    with pytest.raises(ValueError, match=f'Invalid video resolution: {frame.split(",")[-1]}$'):
+        parse_frames(frame)
+
+    with pytest.raises(SponsrDumperError, match='Invalid video resolution'):
+        VideoPreference(frame=frame).check()
+
+    assert parse_frames('best, 640x360,max:720,auto') == 'best, 640x360,max:720,auto'
+
+
+def test_frame_filename():
+    assert frame_filename('001. 001. Post.mp4', '1280x720') == '001. 001. Post [1280x720].mp4'
+    assert frame_filename('a.mp4', 'max:720') == 'a [max720].mp4'
+
+    # the frame survives truncation
+    truncated = frame_filename(f"{'я' * 200}.mp4", '1280x720')
+    assert truncated.endswith(' [1280x720].mp4')
+    assert len(truncated.encode()) <= 255
+
+
+def test_auto_unlimited():
+    auto = AutoResolution(metrics=Metrics(), videos=3)
+    assert auto.allowance() is None
+    assert auto.pick(SIZES) == '1920x1080'
+
+
+def test_auto_budget():
+    metrics = Metrics()
+    auto = AutoResolution(metrics=metrics, videos=3, budget=1000)
+
+    # the budget is spread over the videos
+    assert auto.pick(SIZES) == '1280x720'
+
+    with metrics.span('segments') as span:
+        span.bytes = 300
+
+    assert auto.allowance() == 350
+    assert auto.pick(SIZES) == '1280x720'
+
+    with metrics.span('segments') as span:
+        span.bytes = 600
+
+    # overspent: the smallest
+    assert auto.allowance() == 100
+    assert auto.pick(SIZES) == '640x360'
+
+
+def test_auto_deadline():
+    metrics = Metrics()
+    auto = AutoResolution(metrics=metrics, videos=2, deadline=3600)
+
+    # no throughput measured yet
+    assert auto.pick(SIZES) == '640x360'
+
+    metrics._phases['segments'].update(bytes=1000, seconds=10)
+    assert 0 < auto.allowance() <= 3600 * 100
+    assert auto.pick(SIZES) == '1920x1080'
+
+
+def test_auto_concurrent():
+    auto = AutoResolution(metrics=Metrics(), videos=100, budget=1000)
+    seen = []
+
+    def allowance():
+        seen.append(auto.videos)
+        return 1000 / auto.videos
+
+    auto.allowance = allowance
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda _: auto.pick(SIZES), range(99)))
+
+    # every pick takes a count of videos left of its own
+    assert sorted(seen) == list(range(2, 101))
+    assert auto.videos == 1
+
+
+def test_media_pick(auth_file):
+    dumper = SponsrDumper('https://sponsr.ru/test')
+    manifest = Manifest(
+        kind='hls',
+        src='',
+        video={ident: [(f'https://cdn/{ident}.mp4', f'0-{size - 1}')] for ident, size in SIZES.items()},
+        audio={'0': [('https://cdn/a.mp4', '0-49')]},
+    )
+
+    assert dumper._media_pick(manifest, prefer_video=VideoPreference(frame='max:720')) == ('1280x720', '0')
+    # no auto state out of a dump: the largest
+    assert dumper._media_pick(manifest, prefer_video=VideoPreference(frame='auto')) == ('1920x1080', '0')
+
+    dumper._auto = AutoResolution(metrics=dumper.metrics, videos=1, budget=400)
+    # sizes include audio
+    assert dumper._media_pick(manifest, prefer_video=VideoPreference(frame='auto')) == ('1280x720', '0')
+
+
+def test_media_pick_unranged(auth_file, response_mock):
+    dumper = SponsrDumper('https://sponsr.ru/test')
+    dumper._auto = AutoResolution(metrics=dumper.metrics, videos=1, budget=700)
+    manifest = Manifest(
+        kind='hls',
+        src='',
+        video={ident: [(f'https://cdn/{ident}/{idx}.ts', '') for idx in range(2)] for ident in SIZES},
+        audio={'0': [('https://cdn/a.mp4', '0-49')]},
+    )
+
+    with response_mock([], assert_all_requests_are_fired=False) as mock:
+        for ident, size in SIZES.items():
+            mock.add('HEAD', f'https://cdn/{ident}/0.ts', headers={'Content-Length': f'{size}'})
+
+        # a segment per rendition is probed, sizes are taken for all of them
+        assert dumper._media_pick(manifest, prefer_video=VideoPreference(frame='auto')) == ('1280x720', '0')
+        assert len(mock.calls) == 3
+
+        # probed once
+        assert dumper._media_pick(manifest, prefer_video=VideoPreference(frame='auto')) == ('1280x720', '0')
+        assert len(mock.calls) == 3
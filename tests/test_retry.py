@@ -0,0 +1,155 @@
+import io
+
+import pytest
+from requests import HTTPError
+from requests.exceptions import ChunkedEncodingError
+from responses import matchers
+from urllib3.exceptions import ProtocolError
+
+from sponsrdump.base import SponsrDumper, VideoPreference
+from sponsrdump.retry import RetryScheduler
+
+
+class BrokenBody(io.RawIOBase):
+    """Response body dropping the connection after the given amount of bytes."""
+
+    def __init__(self, data: bytes, *, fail_at: int):
+        self.data = data
+        self.fail_at = fail_at
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.pos >= self.fail_at:
+            raise ProtocolError('connection dropped')
+        size = min(len(buffer), self.fail_at - self.pos)
+        buffer[:size] = self.data[self.pos:self.pos + size]
+        self.pos += size
+        return size
+
+
+@pytest.fixture
+def dumper(auth_file):
+    # small chunks for a part of a body to be written before a connection drops
+    return SponsrDumper('https://sponsr.ru/test', chunk_size=1024)
+
+
+def test_retry_delay():
+    scheduler = RetryScheduler(backoff=1, backoff_max=4)
+    for _ in range(50):
+        assert 0 <= scheduler.delay(2) <= 1
+        assert 0 <= scheduler.delay(10) <= 4
+        # Retry-After is honored
+        assert scheduler.delay(2, retry_after=30) == 30
+
+
+def test_retry_recovers(dumper, response_mock):
+    url = 'https://sponsr.ru/flaky'
+
+    with response_mock([], assert_all_requests_are_fired=False) as mock:
+        mock.add('GET', url, status=502)
+        mock.add('GET', url, status=504)
+        mock.add('GET', url, body='fine')
+        assert dumper._get_response(url).text == 'fine'
+
+    assert dumper.summary()['retries'] == {'retries': 2, 'recovered': 1, 'exhausted': 0, 'budget_left': 98}
+
+
+def test_retry_not_transient(dumper, response_mock):
+    with response_mock(['GET https://sponsr.ru/missing -> 404 :nope']), pytest.raises(HTTPError):
+        dumper._get_response('/missing')
+
+    assert dumper._retry.retries == 0
+
+
+def test_retry_exhausted(dumper, response_mock):
+    dumper._retry = RetryScheduler(attempts=3)
+
+    with response_mock(['GET https://sponsr.ru/down -> 500 :down']), pytest.raises(HTTPError):
+        dumper._get_response('/down')
+
+    assert dumper._retry.stats() == {'retries': 2, 'recovered': 0, 'exhausted': 1, 'budget_left': 98}
+
+
+def test_retry_budget(dumper, response_mock):
+    dumper._retry = RetryScheduler(budget=1)
+
+    with response_mock(['GET https://sponsr.ru/down -> 500 :down']):
+        with pytest.raises(HTTPError):
+            dumper._get_response('/down')
+        # nothing is left for others
+        with pytest.raises(HTTPError):
+            dumper._get_response('/down')
+
+    assert dumper._retry.stats() == {'retries': 1, 'recovered': 0, 'exhausted': 2, 'budget_left': 0}
+
+
+def test_download_resumed(dumper, response_mock, tmp_path):
+    url = 'https://example.com/audio.mp3'
+    dest = tmp_path / 'audio.mp3'
+    data = bytes(range(256)) * 8
+
+    with response_mock([], assert_all_requests_are_fired=False) as mock:
+        # the first 1K chunk is written before the connection drops
+        mock.add(
+            'GET', url,
+            body=io.BufferedReader(BrokenBody(data, fail_at=1500)),
+            headers={'Accept-Ranges': 'bytes'},
+        )
+        mock.add('GET', url, body=data[1024:], status=206, match=[matchers.header_matcher({'Range': 'bytes=1024-'})])
+
+        dumper._download_file(url, dest=dest, prefer_video=VideoPreference())
+
+    assert dest.read_bytes() == data
+    assert dumper._retry.recovered == 1
+
+
+def test_download_error_not_masked(dumper, response_mock, tmp_path, monkeypatch):
+    url = 'https://example.com/audio.mp3'
+    data = bytes(range(256)) * 8
+    open_writer = dumper._writers.open
+
+    def open_failing(*args, **kwargs):
+        writer = open_writer(*args, **kwargs)
+        close = writer.close
+
+        def close_failing(*, check: bool = True) -> int:
+            # e.g. a failure to flush the file
+            size = close(check=check)
+            if check:
+                raise OSError('No space left on device')
+            return size
+
+        writer.close = close_failing
+        return writer
+
+    monkeypatch.setattr(dumper._writers, 'open', open_failing)
+
+    with response_mock([], assert_all_requests_are_fired=False) as mock:
+        for _ in range(5):
+            # every attempt drops
+            mock.add('GET', url, body=io.BufferedReader(BrokenBody(data, fail_at=1500)))
+
+        # the error of reading is raised rather than that of closing the file
+        with pytest.raises(ChunkedEncodingError):
+            dumper._download_file(url, dest=tmp_path / 'audio.mp3', prefer_video=VideoPreference())
+
+
+def test_download_segment_rewritten(dumper, response_mock, tmp_path):
+    url = 'https://edge.kinescopecdn.net/v.mp4'
+    dest = tmp_path / 'seg.mp4'
+
+    with response_mock([], assert_all_requests_are_fired=False) as mock:
+        mock.add(
+            'GET', url,
+            body=io.BufferedReader(BrokenBody(b'abcdefgh', fail_at=4)),
+            headers={'Accept-Ranges': 'bytes'},
+        )
+        # the very same range is requested again
+        mock.add('GET', url, body=b'abcdefgh', status=206, match=[matchers.header_matcher({'Range': 'bytes=0-7'})])
+
+        dumper._download_file(url, dest=dest, prefer_video=VideoPreference(), range='0-7')
+
+    assert dest.read_bytes() == b'abcdefgh'
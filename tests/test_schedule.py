@@ -0,0 +1,92 @@
+import json
+from pathlib import Path
+
+import pytest
+from requests import ConnectionError
+
+from sponsrdump.base import SponsrDumper, VideoPreference
+from sponsrdump.events import FileQueued
+from sponsrdump.schedule import Job, order_jobs
+
+
+def test_order_jobs():
+    old = {'post_date': '2024-01-01'}
+    new = {'post_date': '2024-02-01'}
+
+    jobs = [
+        Job(post=old, file={'file_id': 'a'}, realm='audio', size=300),
+        Job(post=old, file={'file_id': 'b'}, realm='text', size=10),
+        Job(post=new, file={'file_id': 'c'}, realm='video', size=300),
+        Job(post=new, file={'file_id': 'd'}, realm='text', size=10),
+    ]
+
+    def ids(order: str) -> str:
+        return ''.join(job.file['file_id'] for job in order_jobs(jobs, order))
+
+    assert ids('listing') == 'abcd'
+    # jobs alike keep their listing order
+    assert ids('smallest') == 'bdac'
+    assert ids('largest') == 'acbd'
+    assert ids('newest') == 'cdab'
+
+    with pytest.raises(ValueError, match='Unsupported order'):
+        order_jobs(jobs, 'random')
+
+
+@pytest.mark.parametrize(('order', 'file_workers', 'expected'), [
+    ('smallest', 1, ['attach456', 'audio123']),
+    ('largest', 1, ['audio123', 'attach456']),
+    ('largest', 2, ['audio123', 'attach456']),
+])
+def test_dump_order(remote_data, data_audio, data_attach, response_mock, order, file_workers, expected):
+    remote_data.files = [data_audio, data_attach]
+    dest = Path('dump')
+    events = []
+
+    with response_mock(remote_data.rules, assert_all_requests_are_fired=False) as mock:
+        # audio size is estimated from its duration, that of attachment is reported
+        mock.add('GET', data_attach['file_path'], body='x' * 500, headers={'Content-Length': '500'})
+
+        dumper = SponsrDumper(remote_data.url, on_event=events.append)
+        dumper.search()
+        dumper.dump(dest, text=False, order=order, file_workers=file_workers)
+
+    assert [event.file_id for event in events if isinstance(event, FileQueued)] == expected
+
+    # named in listing order anyway
+    assert sorted(path.name for path in dest.iterdir()) == ['001. 001. Test Post.mp3', '001. 002. Test Post.pdf']
+    assert json.loads(Path('sponsrdump.json').read_text())['dumped'] == {
+        'f_audio123': '001. 001. Test Post.mp3',
+        'f_attach456': '001. 002. Test Post.pdf',
+    }
+
+
+def test_dump_order_estimate_unavailable(remote_data, data_attach, response_mock):
+    remote_data.files = [data_attach]
+    remote_data.request_file = False
+    with response_mock(remote_data.rules, assert_all_requests_are_fired=False) as mock:
+        mock.add('GET', data_attach['file_path'], body=ConnectionError('Connection refused'))
+
+        dumper = SponsrDumper(remote_data.url)
+        dumper.search()
+        file_info = dumper._collected[0]['__files']['attaches'][0]
+
+        # taken for unknown rather than failing the dump
+        assert dumper._job_size(file_info, prefer_video=VideoPreference()) == 0
+
+
+def test_dump_order_reuses_manifest(remote_data, response_mock, monkeypatch):
+    remote_data.text = '<p>Test content</p><iframe data-url="/post/video/?video_id=test123"></iframe>'
+    processed = []
+    monkeypatch.setattr(SponsrDumper, '_media_process', lambda self, manifest, **kwargs: processed.append(manifest))
+
+    with response_mock(remote_data.rules) as mock:
+        dumper = SponsrDumper(remote_data.url)
+        dumper.search()
+        dumper.dump('dump', text=False, order='largest')
+
+        fetched = [call for call in mock.calls if call.request.url.endswith('master.mpd')]
+
+    # the manifest parsed for the estimate is reused on dump
+    assert len(fetched) == 1
+    assert [manifest.src for manifest in processed] == ['https://kinescope.io/test123/master.mpd']
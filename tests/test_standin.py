@@ -0,0 +1,50 @@
+import socket
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'tools'))
+
+from standin import Project, StandinTransport, serve
+
+from sponsrdump.base import SponsrDumper
+
+
+@pytest.fixture
+def standin():
+    server = serve(project=Project(posts=2, images=0, segments=3, segment_size=1024))
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def resolved():
+    hosts = []
+    getaddrinfo = socket.getaddrinfo
+
+    def record(host, *args, **kwargs):
+        hosts.append(host)
+        return getaddrinfo(host, *args, **kwargs)
+
+    with patch('socket.getaddrinfo', record):
+        yield hosts
+
+
+def test_standin_warm_local(standin, resolved):
+    transport = StandinTransport(headers={}, pool_size=2)
+    transport.warm(['https://edge.kinescopecdn.net/a/1.ts', 'https://kinescope.io/embed/1'], connections=2)
+
+    assert set(transport.stats()) == {'127.0.0.1'}
+    assert set(resolved) == {'127.0.0.1'}
+
+
+def test_standin_dump_offline(standin, resolved, auth_file, tmp_path):
+    dumper = SponsrDumper('https://sponsr.ru/bench/', workers=2, transport=StandinTransport.alias)
+    dumper.search()
+    dumper.dump(tmp_path / 'dump', text=False)
+
+    assert resolved
+    # no host but the stand-in server is contacted
+    assert set(resolved) == {'127.0.0.1'}
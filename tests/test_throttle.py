@@ -0,0 +1,134 @@
+from datetime import UTC, datetime, timedelta
+from email.utils import format_datetime
+
+import pytest
+
+from sponsrdump.base import SponsrDumper, VideoPreference
+from sponsrdump.manifests import Manifest
+from sponsrdump.throttle import HostLimit, Throttle, parse_retry_after
+
+
+@pytest.mark.parametrize(('value', 'expected'), [
+    (None, 1),
+    ('', 1),
+    ('7', 7),
+    (' 3 ', 3),
+    ('garbage', 1),
+    # dates in the past mean no wait
+    ('Wed, 21 Oct 2015 07:28:00 GMT', 0),
+])
+def test_parse_retry_after(value, expected):
+    assert parse_retry_after(value) == expected
+
+
+def test_parse_retry_after_date():
+    value = format_datetime(datetime.now(UTC) + timedelta(seconds=60), usegmt=True)
+    assert 55 < parse_retry_after(value) <= 60
+
+
+def test_host_limit_aimd():
+    limit = HostLimit('cdn', maximum=8)
+    assert limit.limit == 4
+
+    # additive increase: one per a limit worth of successes
+    for _ in range(4):
+        limit.acquire()
+        limit.release(latency=0.01, status=200)
+    assert limit.limit == pytest.approx(5, abs=0.2)
+
+    # multiplicative decrease on throttling with a cooldown
+    limit.acquire()
+    limit.release(latency=0.01, status=429, retry_after=0)
+    assert limit.limit == pytest.approx(2.5, abs=0.1)
+    assert limit.throttled == 1
+
+    limit.acquire()
+    limit.release(latency=0.01, status=0)
+    assert limit.errors == 1
+    assert limit.limit < 2.5
+
+    # never drops below the minimum and never exceeds the maximum
+    for _ in range(10):
+        limit.acquire()
+        limit.release(latency=0.01, status=503)
+    assert limit.limit == 1
+
+    for _ in range(200):
+        limit.acquire()
+        limit.release(latency=0.01, status=200)
+    assert limit.limit == 8
+
+
+def test_host_limit_latency_growth():
+    limit = HostLimit('cdn', maximum=8)
+
+    limit.acquire()
+    limit.release(latency=0.1, status=200)
+    raised = limit.limit
+
+    for _ in range(5):
+        limit.acquire()
+        limit.release(latency=2, status=200)
+
+    assert limit.limit < raised
+
+
+def test_throttle_host_suffix():
+    throttle = Throttle({'kinescopecdn.net': 16, 'sponsr.ru': 2}, default=3)
+    assert throttle.get('edge-msk-1.kinescopecdn.net').maximum == 16
+    assert throttle.get('sponsr.ru').maximum == 2
+    assert throttle.get('notsponsr.ru').maximum == 3
+
+    with throttle.slot('sponsr.ru') as outcome:
+        outcome['status'] = 200
+
+    assert throttle.stats()['sponsr.ru']['requests'] == 1
+
+
+def test_request_slows_down_on_throttling(auth_file, response_mock):
+    url = 'https://sponsr.ru/throttled'
+
+    with response_mock([], assert_all_requests_are_fired=False) as mock:
+        mock.add('GET', url, status=429, headers={'Retry-After': '0'})
+        mock.add('GET', url, status=503, headers={'Retry-After': '0'})
+        mock.add('GET', url, body='fine')
+
+        dumper = SponsrDumper('https://sponsr.ru/test')
+        assert dumper._get_response(url).text == 'fine'
+
+    stats = dumper._throttle.stats()['sponsr.ru']
+    assert stats['throttled'] == 2
+    assert stats['requests'] == 3
+
+
+def test_media_process_concurrent(auth_file, response_mock, mock_popen, tmp_path, monkeypatch):
+    manifest = Manifest(
+        kind='hls',
+        src='https://kinescope.io/x/master.m3u8',
+        video={'640x360': [(f'https://edge.kinescopecdn.net/v{idx}.mp4', '') for idx in range(20)]},
+        audio={'0': [(f'https://edge.kinescopecdn.net/a{idx}.mp4', '') for idx in range(5)]},
+    )
+    dumper = SponsrDumper('https://sponsr.ru/test', workers=4)
+
+    with response_mock([], assert_all_requests_are_fired=False) as mock:
+        for realm, count in (('v', 20), ('a', 5)):
+            for idx in range(count):
+                mock.add('GET', f'https://edge.kinescopecdn.net/{realm}{idx}.mp4', body=f'{realm}{idx};')
+
+            # sizes are probed for the disk space check
+            mock.add('HEAD', f'https://edge.kinescopecdn.net/{realm}0.mp4', headers={'Content-Length': '3'})
+
+        captured = {}
+
+        def concat_chunks(*, src, suffix):
+            captured[suffix] = [fpath.read_text() for fpath in sorted(src.iterdir()) if f'_{suffix}.' in fpath.name]
+            return src / suffix
+
+        monkeypatch.setattr(dumper, '_concat_chunks', concat_chunks)
+        dumper._media_process(manifest, dest=tmp_path / 'out.mp4', prefer_video=VideoPreference())
+
+    # chunks are numbered by their position regardless of the completion order
+    assert captured['vid'] == [f'v{idx};' for idx in range(20)]
+    assert captured['aud'] == [f'a{idx};' for idx in range(5)]
+    # segments, size probes and connections warmed for the workers go through the throttle
+    assert dumper._throttle.stats()['edge.kinescopecdn.net']['requests'] == 25 + 2 + 4
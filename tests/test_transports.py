@@ -0,0 +1,316 @@
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from unittest.mock import patch
+
+import pytest
+from requests import ConnectionError, Timeout
+
+from sponsrdump.base import SponsrDumper
+from sponsrdump.exceptions import SponsrDumperError
+from sponsrdump.throttle import Throttle
+from sponsrdump.transports import (
+    AiohttpTransport,
+    Cassette,
+    RecordingTransport,
+    ReplayTransport,
+    Reply,
+    RequestsTransport,
+    Transport,
+)
+
+
+def test_requests_transport_keep_alive(http_server):
+    transport = RequestsTransport(headers={}, pool_size=4)
+
+    for _ in range(10):
+        with transport.stream(f'{http_server.url}/1000') as response:
+            assert len(response.content) == 1000
+
+    # a single connection is reused by all the requests
+    assert http_server.stats == {'connections': 1, 'requests': 10}
+
+    stats = transport.stats()['127.0.0.1']
+    assert stats == {'connections': 1, 'requests': 10}
+
+
+def test_requests_transport_pool_bounded(http_server):
+    transport = RequestsTransport(headers={}, pool_size=3)
+
+    def fetch(_):
+        return len(transport.get(f'{http_server.url}/5000').content)
+
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        assert set(executor.map(fetch, range(50))) == {5000}
+
+    # concurrent requests wait for a free connection instead of opening extra ones
+    assert http_server.stats['connections'] <= 3
+
+
+def test_requests_transport_timeout():
+    transport = RequestsTransport(headers={})
+    transport.timeout = (1, 0.1)
+
+    with socket.socket() as sock:
+        # connections are accepted (by the backlog), but never answered
+        sock.bind(('127.0.0.1', 0))
+        sock.listen()
+        url = f'http://127.0.0.1:{sock.getsockname()[1]}/1'
+
+        with pytest.raises(Timeout):
+            transport.get(url)
+
+        with pytest.raises(Timeout), transport.stream(url):
+            pass
+
+
+def test_requests_transport_warm(http_server):
+    transport = RequestsTransport(headers={}, pool_size=3)
+    transport.warm([f'{http_server.url}/1', f'{http_server.url}/2'], connections=5)
+
+    # capped by the pool size, once per host
+    assert http_server.stats == {'connections': 3, 'requests': 0}
+
+    # warm connections are reused
+    transport.warm([f'{http_server.url}/1'], connections=3)
+    assert http_server.stats['connections'] == 3
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        list(executor.map(lambda _: transport.get(f'{http_server.url}/10').content, range(9)))
+
+    assert http_server.stats == {'connections': 3, 'requests': 9}
+
+
+def test_requests_transport_warm_throttled(http_server):
+    transport = RequestsTransport(headers={}, pool_size=8)
+    throttle = Throttle({}, default=4)
+    host = http_server.url.removeprefix('http://')
+    sent = []
+
+    head = transport.session.head
+
+    def head_recorded(url, **kwargs):
+        sent.append(kwargs['headers'])
+        return head(url, **kwargs)
+
+    transport.session.head = head_recorded
+    headers = {'Referer': 'https://kinescope.io/'}
+    transport.warm([f'{http_server.url}/1'], connections=8, headers=headers, slot=throttle.try_slot)
+
+    # no more connections than there are slots of the host free, with headers of the requests to follow
+    assert http_server.stats['connections'] == int(throttle.get(host).maximum / 2)
+    assert sent == [headers] * http_server.stats['connections']
+    assert throttle.stats()[host]['requests'] == len(sent)
+    assert throttle.get(host).in_flight == 0
+
+
+@pytest.fixture
+def aiohttp_transport():
+    transport = AiohttpTransport(headers={'User-Agent': 'test'}, pool_size=2)
+    yield transport
+    transport.close()
+
+
+def test_transport_spawn(auth_file):
+    assert isinstance(Transport.spawn('requests', headers={}), RequestsTransport)
+
+    dumper = SponsrDumper('https://sponsr.ru/test', transport='aiohttp')
+    try:
+        assert isinstance(dumper._transport, AiohttpTransport)
+        # authentication cookies are shared by transports
+        assert dumper._transport.cookies.get('session_id') == 'test_session'
+
+    finally:
+        dumper._transport.close()
+
+
+def test_aiohttp_transport(http_server, aiohttp_transport):
+    transport = aiohttp_transport
+
+    response = transport.get(f'{http_server.url}/1000')
+    assert response.status_code == 200
+    assert response.headers['accept-ranges'] == 'bytes'
+    assert response.content == (bytes(range(256)) * 4)[:1000]
+
+    with transport.stream(f'{http_server.url}/5000') as response:
+        assert sum(len(chunk) for chunk in response.iter_content(1024)) == 5000
+
+    with transport.range(f'{http_server.url}/5000', '10-19') as response:
+        assert response.status_code == 206
+        assert response.content == bytes(range(10, 20))
+
+    with transport.range(f'{http_server.url}/300', '290-') as response:
+        assert response.content == bytes(range(34, 44))
+
+    # connections are kept alive
+    assert http_server.stats == {'connections': 1, 'requests': 4}
+    assert transport.stats()['127.0.0.1'] == {'idle': 1}
+
+
+def test_aiohttp_transport_cookies(http_server, aiohttp_transport):
+    transport = aiohttp_transport
+    transport.cookies.set('session_id', 'stale', domain='127.0.0.1')
+
+    transport.get(f'{http_server.url}/10?cookie=session_id%3Dfresh')
+    with transport.stream(f'{http_server.url}/10?cookie=other%3Dvalue') as response:
+        assert response.content
+
+    # cookies refreshed by responses are kept in the shared jar (to be saved on dump)
+    assert transport.cookies.get('session_id') == 'fresh'
+    assert transport.cookies.get('other') == 'value'
+
+
+def test_aiohttp_transport_errors(aiohttp_transport):
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+
+    # aiohttp exceptions are translated into requests' ones
+    with pytest.raises(ConnectionError):
+        aiohttp_transport.get(f'http://127.0.0.1:{port}/1')
+
+
+def test_record_replay(remote_data, data_audio, tmp_path, response_mock):
+    remote_data.files = [data_audio]
+    cassette = tmp_path / 'cassette'
+
+    with response_mock(remote_data.rules):
+        dumper = SponsrDumper(remote_data.url, record=cassette)
+        dumper.search()
+        dumper.dump(tmp_path / 'recorded', text=False)
+
+    # responses are replayed with no requests made
+    (tmp_path / SponsrDumper._fname_conf).unlink()
+
+    with response_mock([]):
+        dumper = SponsrDumper(remote_data.url, replay=cassette)
+        assert dumper.search() == 1
+        dumper.dump(tmp_path / 'replayed', text=False)
+
+    replayed = tmp_path / 'replayed' / '001. 001. Test Post.mp3'
+    assert replayed.read_bytes() == b'fake_binary_data'
+    assert dumper._transport.stats()['replay'] == {'requests': 3, 'recorded': 3}
+
+    # not recorded
+    with pytest.raises(SponsrDumperError, match='is not recorded'):
+        dumper._transport.get('https://sponsr.ru/other')
+
+
+def test_replay_asynchronous(remote_data, data_audio, tmp_path, response_mock, caplog):
+    remote_data.files = [data_audio]
+    cassette = tmp_path / 'cassette'
+
+    with response_mock(remote_data.rules):
+        dumper = SponsrDumper(remote_data.url, record=cassette)
+        dumper.search()
+        dumper.dump(tmp_path / 'recorded', text=False, asynchronous=True)
+
+    # the engine would bypass the cassette: threads are used instead, and said so
+    assert 'Asynchronous downloads are not available on record and replay' in caplog.text
+    assert (tmp_path / 'recorded' / '001. 001. Test Post.mp3').read_bytes() == b'fake_binary_data'
+
+
+def test_record_head(http_server, tmp_path):
+    cassette = Cassette(tmp_path)
+    url = f'{http_server.url}/1000'
+
+    transport = RecordingTransport(RequestsTransport(headers={}), cassette=cassette)
+    assert transport.head(url).headers['Content-Length'] == '1000'
+    transport.close()
+
+    # kept apart from GET of the same url
+    transport = ReplayTransport(cassette=cassette, headers={})
+    assert transport.head(url).headers['Content-Length'] == '1000'
+
+    with pytest.raises(SponsrDumperError, match=r'GET .+ is not recorded'):
+        transport.get(url)
+
+
+def test_replay_latency(tmp_path):
+    cassette = Cassette(tmp_path)
+    reply = Reply(url='https://some.ru/', status_code=404, headers={'X-Some': '1'}, elapsed=0.1)
+    cassette.put(reply, key=cassette.key(reply.url), body=b'missing', took=0.2)
+
+    transport = ReplayTransport(cassette=cassette, latency=True, headers={})
+    slept = []
+
+    with patch('sponsrdump.transports.replay.sleep', slept.append), transport.stream(reply.url) as response:
+        assert response.status_code == 404
+        assert response.headers['x-some'] == '1'
+        assert response.content == b'missing'
+        assert response.elapsed.total_seconds() == 0.1
+
+    assert slept == [0.2]
+
+
+class ChunkedTransport(Transport):
+    """Streams a body chunk by chunk, counting the chunks read."""
+
+    def __init__(self, body: bytes, **kwargs):
+        super().__init__(headers={}, **kwargs)
+        self.body = body
+        self.read = 0
+
+    def _reply(self, url: str) -> Reply:
+        def chunks(size: int):
+            for pos in range(0, len(self.body), size):
+                self.read += 1
+                yield self.body[pos:pos + size]
+
+        headers = {'Content-Type': 'video/mp4', 'Set-Cookie': 'session_id=secret'}
+        return Reply(url=url, status_code=200, headers=headers, chunks=chunks)
+
+    def get(self, url: str, *, headers: dict | None = None) -> Reply:
+        return self._reply(url)
+
+    @contextmanager
+    def stream(self, url: str, *, headers: dict | None = None):
+        yield self._reply(url)
+
+
+def test_record_streamed(tmp_path):
+    url = 'https://edge.kinescopecdn.net/v.mp4'
+    body = bytes(range(256)) * 40
+    cassette = Cassette(tmp_path)
+    key = cassette.key(url)
+    inner = ChunkedTransport(body)
+    transport = RecordingTransport(inner, cassette=cassette)
+
+    with transport.stream(url) as response:
+        chunks = response.iter_content(chunk_size=1024)
+        next(chunks)
+        # the body is passed through as it is read, not buffered first
+        assert inner.read == 1
+        # and is not seen recorded till complete
+        assert cassette.meta(key) is None
+        list(chunks)
+
+    assert inner.read == 10
+    meta, recorded = cassette.get(key)
+    assert recorded == body
+    # session cookies are not persisted
+    assert meta['headers'] == {'Content-Type': 'video/mp4'}
+
+    with ReplayTransport(cassette=cassette, headers={}).stream(url) as response:
+        assert list(response.iter_content(chunk_size=4096)) == [body[:4096], body[4096:8192], body[8192:]]
+
+
+def test_record_streamed_unread(tmp_path):
+    url = 'https://sponsr.ru/missing'
+    cassette = Cassette(tmp_path)
+
+    inner = ChunkedTransport(b'not found')
+
+    with RecordingTransport(inner, cassette=cassette).stream(url):
+        pass
+
+    # bodies left unread are not downloaded to be recorded
+    assert inner.read == 0
+    assert not cassette.meta(cassette.key(url))['body']
+
+    with ReplayTransport(cassette=cassette, headers={}).stream(url) as response:
+        assert response.status_code == 200
+        assert response.headers['Content-Type'] == 'video/mp4'
+
+        with pytest.raises(SponsrDumperError, match='was not read on recording'):
+            _ = response.content
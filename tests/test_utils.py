@@ -3,7 +3,14 @@ from pathlib import Path
 import pytest
 
 from sponsrdump.exceptions import SponsrDumperError
-from sponsrdump.utils import call, convert_text_to_video, match_value, truncate_filename
+from sponsrdump.utils import (
+    call,
+    convert_text_to_video,
+    match_value,
+    parse_duration,
+    parse_size,
+    truncate_filename,
+)
 
 
 def test_match_value():
@@ -77,3 +84,30 @@ def test_truncate_filename_long_extension():
 def test_truncate_filename_custom_max_len():
     expected = 'A' * 45 + '.html'
     assert truncate_filename('A' * 100 + '.html', max_len=50) == expected
+
+
+@pytest.mark.parametrize(('value', 'expected'), [
+    ('1024', 1024),
+    ('10kb', 10 * 1024),
+    ('500M', 500 * 1024 ** 2),
+    ('2.5G', int(2.5 * 1024 ** 3)),
+])
+def test_parse_size(value, expected):
+    assert parse_size(value) == expected
+
+
+@pytest.mark.parametrize(('value', 'expected'), [
+    ('90', 90),
+    ('45m', 45 * 60),
+    ('1.5h', 90 * 60),
+])
+def test_parse_duration(value, expected):
+    assert parse_duration(value) == expected
+
+
+def test_parse_invalid():
+    with pytest.raises(ValueError, match='Invalid size'):
+        parse_size('5X')
+
+    with pytest.raises(ValueError, match='Invalid duration'):
+        parse_duration('soon')
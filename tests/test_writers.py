@@ -0,0 +1,131 @@
+import asyncio
+import os
+import threading
+
+import pytest
+
+from sponsrdump.base import SponsrDumper
+from sponsrdump.buffers import BufferBudget
+from sponsrdump.writers import Writers, content_length
+
+
+@pytest.fixture
+def writers_make():
+    made = []
+
+    def make(*args, **kwargs) -> Writers:
+        made.append(writers := Writers(*args, **kwargs))
+        return writers
+
+    yield make
+
+    for writers in made:
+        writers.close()
+
+
+def test_content_length():
+    assert content_length({'Content-Length': '100'}) == 100
+    assert content_length({'Content-Length': ''}) == 0
+    assert content_length({}) == 0
+
+
+def test_writers_threaded(tmp_path):
+    buffers = BufferBudget(64)
+    writers = Writers(2, buffers=buffers)
+
+    chunks = [bytes([idx]) * 16 for idx in range(50)]
+    files = [writers.open(tmp_path / f'{idx}.bin') for idx in range(3)]
+
+    for chunk in chunks:
+        for writer in files:
+            writer.write(chunk)
+
+    assert [writer.close() for writer in files] == [800] * 3
+    threads = list(writers._threads)
+    assert len(threads) == 2
+
+    writers.close()
+    assert not any(thread.is_alive() for thread in threads)
+
+    # chunks of a file are written in the order handed over
+    for idx in range(3):
+        assert (tmp_path / f'{idx}.bin').read_bytes() == b''.join(chunks)
+
+    assert buffers.held == 0
+    assert buffers.peak <= 64
+
+
+def test_writers_append(writers_make, tmp_path):
+    path = tmp_path / 'file.bin'
+    path.write_bytes(b'abc')
+
+    writer = writers_make(1, buffers=BufferBudget(0)).open(path, append=True)
+    writer.write(b'def')
+    assert writer.close() == 6
+    assert path.read_bytes() == b'abcdef'
+
+
+@pytest.mark.skipif(not hasattr(os, 'posix_fallocate'), reason='posix_fallocate is not available')
+def test_writers_preallocate(tmp_path):
+    path = tmp_path / 'file.bin'
+    writer = Writers(buffers=BufferBudget(0), preallocate=True).open(path, size=1000)
+    assert path.stat().st_size == 1000
+
+    # a short read leaves no reserved tail
+    writer.write(b'data')
+    assert writer.close() == 4
+    assert path.read_bytes() == b'data'
+
+
+def test_writers_error(writers_make, tmp_path, monkeypatch):
+    buffers = BufferBudget(0)
+    writer = writers_make(1, buffers=buffers).open(tmp_path / 'file.bin')
+
+    def fail(chunk):
+        raise OSError('No space left on device')
+
+    monkeypatch.setattr(writer._file, 'write', fail)
+    writer.write(b'data')
+
+    with pytest.raises(OSError, match='No space left'):
+        writer.close()
+
+    assert buffers.held == 0
+
+
+def test_writers_error_unchecked(writers_make, tmp_path, monkeypatch):
+    writer = writers_make(1, buffers=BufferBudget(0)).open(tmp_path / 'file.bin')
+    monkeypatch.setattr(writer._file, 'write', lambda chunk: (_ for _ in ()).throw(OSError('No space left')))
+    writer.write(b'data')
+
+    # a download failed already is not to be masked by the error of writing
+    assert writer.close(check=False) == 0
+
+
+def test_writers_async(writers_make, tmp_path):
+    writer = writers_make(1, buffers=BufferBudget(8)).open(tmp_path / 'file.bin')
+
+    async def write():
+        for _ in range(10):
+            await writer.awrite(b'abcd')
+
+        return await writer.aclose()
+
+    assert asyncio.run(write()) == 40
+    assert (tmp_path / 'file.bin').read_bytes() == b'abcd' * 10
+
+
+def test_dump_writers(remote_data, data_audio, response_mock, tmp_path):
+    remote_data.files = [data_audio]
+
+    with response_mock(remote_data.rules):
+        dumper = SponsrDumper(remote_data.url, writers=2, preallocate=True)
+        dumper.search()
+        dumper.dump(tmp_path / 'dump', text=False)
+
+    # writer threads are stopped at the end of a dump
+    assert not [thread for thread in threading.enumerate() if thread.name.startswith('writer-')]
+
+    dumped = list((tmp_path / 'dump').rglob('*.mp3'))
+    assert len(dumped) == 1
+    assert dumped[0].read_bytes() == b'fake_binary_data'
@@ -0,0 +1,133 @@
+"""Benchmarks search() and dump() against the local stand-in server (see standin.py).
+
+    python tools/bench_dump.py --posts 100 --segments 50 --latency 0.005 --workers 8 --json bench.json
+
+Reports posts/sec for search, segments/sec and MB/s for dump.
+To catch regressions compare with results saved before:
+
+    python tools/bench_dump.py --baseline bench.json --tolerance 0.2
+
+The process exits with code 1 if any figure is below the baseline more than allowed.
+
+"""
+import argparse
+import json
+import logging
+import shutil
+import sys
+import tempfile
+from contextlib import chdir
+from pathlib import Path
+from time import perf_counter
+
+from standin import StandinAiohttpTransport, StandinTransport, add_project_arguments, project_from_args, serve
+
+from sponsrdump import base
+from sponsrdump.base import SponsrDumper
+from sponsrdump.retry import RetryScheduler
+from sponsrdump.utils import LOGGER
+
+FIGURES = ('posts_per_sec', 'segments_per_sec', 'mbps')
+"""Figures compared with a baseline. The more the better."""
+
+
+def bench(args: argparse.Namespace) -> dict:
+    aiohttp = args.asynchronous or args.transport == 'aiohttp'
+    transport = (StandinAiohttpTransport if aiohttp else StandinTransport).alias
+
+    with tempfile.TemporaryDirectory() as tmp, chdir(tmp):
+        Path(SponsrDumper._fname_auth).write_text('session_id=bench')
+
+        dumper = SponsrDumper('https://sponsr.ru/bench/', workers=args.workers, transport=transport)
+        # fail fast and keep retry waits short: errors are a part of the load
+        dumper._retry = RetryScheduler(backoff=0.01, backoff_max=0.1, budget=10 ** 6)
+
+        started = perf_counter()
+        posts = dumper.search()
+        took_search = perf_counter() - started
+
+        started = perf_counter()
+        dumper.dump(
+            Path(tmp) / 'dump',
+            text='html',
+            text_to_video=False,
+            images=not args.no_images,
+            asynchronous=args.asynchronous,
+        )
+        took_dump = perf_counter() - started
+
+    metrics = dumper.metrics.stats()
+    segments = metrics['phases'].get('segments', {}).get('count', 0)
+
+    return {
+        'posts': posts,
+        'search_seconds': round(took_search, 3),
+        'posts_per_sec': round(posts / took_search, 1),
+        'dump_seconds': round(took_dump, 3),
+        'segments': segments,
+        'segments_per_sec': round(segments / took_dump, 1),
+        'bytes': metrics['bytes'],
+        'mbps': round(metrics['bytes'] / took_dump / 1024 / 1024, 2),
+        'retries': dumper._retry.retries,
+        'phases': metrics['phases'],
+    }
+
+
+def compare(results: dict, baseline: dict, *, tolerance: float) -> list[str]:
+    regressions = []
+
+    for figure in FIGURES:
+        expected = baseline.get(figure)
+
+        if expected and results[figure] < expected * (1 - tolerance):
+            regressions.append(f'{figure}: {results[figure]} < {expected} (baseline) - {tolerance:.0%}')
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    add_project_arguments(parser)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--transport', default='requests', choices=['requests', 'aiohttp'])
+    parser.add_argument('--async', dest='asynchronous', action='store_true')
+    parser.add_argument('--no-images', action='store_true')
+    parser.add_argument('--json', default='', help='File to write results into')
+    parser.add_argument('--baseline', default='', help='Results file to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown share')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)-8s: %(message)s')
+
+    if not shutil.which('ffmpeg'):
+        # joining streams is not what is measured here
+        LOGGER.warning('ffmpeg is not found: muxing is skipped')
+        base.call = lambda cmd, *, cwd, capture_out=True: None
+
+    server = serve(project=project_from_args(args))
+
+    try:
+        results = bench(args)
+
+    finally:
+        server.shutdown()
+
+    for key, value in results.items():
+        if key != 'phases':
+            print(f'{key:<18} {value}')
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text()), tolerance=args.tolerance)
+
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
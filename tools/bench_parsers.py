@@ -0,0 +1,201 @@
+"""Microbenchmarks for parsing hot paths on synthetic worst-case inputs:
+10k-segment MPD and HLS manifests, a 1 MB post, long file names.
+
+    python tools/bench_parsers.py --json parsers.json
+
+Reports the best and the median seconds per call of every case.
+To catch regressions compare with results saved before:
+
+    python tools/bench_parsers.py --baseline parsers.json --tolerance 0.2
+
+The process exits with code 1 if any case is slower than the baseline more than allowed.
+
+"""
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import timeit
+from collections.abc import Callable
+from contextlib import chdir
+from copy import deepcopy
+from pathlib import Path
+from types import SimpleNamespace
+
+from sponsrdump.base import SponsrDumper, VideoPreference
+from sponsrdump.converters import TextConverter
+from sponsrdump.utils import truncate_filename
+
+CDN = 'https://edge.kinescopecdn.net/embed'
+
+
+def make_mpd(segments: int) -> bytes:
+    """Returns a DASH manifest with three video and one audio representations."""
+    sets = []
+
+    frames = ((640, 360), (1280, 720), (1920, 1080))
+
+    for mime, representations in (
+        ('video/mp4', [f'width="{width}" height="{height}"' for width, height in frames]),
+        ('audio/mp4', ['audioSamplingRate="44100"']),
+    ):
+        urls = ''.join(f'<SegmentURL media="{idx}.mp4"/>' for idx in range(segments))
+        items = ''.join(
+            f'<Representation {attrs}><BaseURL>{CDN}/{num}/</BaseURL>'
+            f'<SegmentList><Initialization sourceURL="init.mp4"/>{urls}</SegmentList></Representation>'
+            for num, attrs in enumerate(representations)
+        )
+        sets.append(f'<AdaptationSet mimeType="{mime}">{items}</AdaptationSet>')
+
+    return (
+        '<?xml version="1.0"?><MPD xmlns="urn:mpeg:dash:schema:mpd:2011">'
+        f'<Period>{"".join(sets)}</Period></MPD>'
+    ).encode()
+
+
+def make_m3u8(segments: int) -> tuple[str, dict[str, str]]:
+    """Returns an HLS master playlist with two video and one audio renditions,
+    and media playlists by their urls. Segments are byte ranges of a single file.
+
+    """
+    master = (
+        '#EXTM3U\n'
+        '#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="audio",NAME="main",URI="audio.m3u8"\n'
+        '#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=640x360,AUDIO="audio"\n'
+        'v360.m3u8\n'
+        '#EXT-X-STREAM-INF:BANDWIDTH=2400000,RESOLUTION=1280x720,AUDIO="audio"\n'
+        'v720.m3u8\n'
+    )
+    lines = ['#EXTM3U', '#EXT-X-TARGETDURATION:4', '#EXT-X-MAP:URI="media.mp4",BYTERANGE="1000@0"']
+
+    for _ in range(segments):
+        lines.extend(('#EXTINF:4.0,', '#EXT-X-BYTERANGE:65536', 'media.mp4?expires=1&sign=bench'))
+
+    lines.append('#EXT-X-ENDLIST')
+    media = '\n'.join(lines)
+
+    return master, {f'{CDN}/{name}': media for name in ('v360.m3u8', 'v720.m3u8', 'audio.m3u8')}
+
+
+def make_post(size: int) -> dict:
+    """Returns a post of about 'size' bytes of HTML with images and videos."""
+    chunk = (
+        '<p>Текст поста, <b>выделение</b>, <a href="https://sponsr.ru/">ссылка</a>, список:</p>'
+        '<ul><li>первый пункт</li><li>второй пункт</li></ul>'
+        '<img src="https://sponsr.ru/img/{idx}.png">'
+        '<iframe src="https://kinescope.io/e{idx}" data-url="/post/video/?video_id=v{idx}"></iframe>'
+    )
+    html = []
+    received = 0
+    idx = 0
+
+    while received < size:
+        html.append(chunk.format(idx=idx))
+        received += len(html[-1].encode())
+        idx += 1
+
+    return {
+        'post_id': '1',
+        'post_title': 'Пост',
+        'post_text': ''.join(html),
+        'files': [
+            {'file_id': f'a{num}', 'file_category': 'podcast', 'file_duration': 100, 'file_link': f'/a{num}.mp3'}
+            for num in range(10)
+        ],
+    }
+
+
+def make_cases(dumper: SponsrDumper, *, segments: int, post_size: int) -> dict[str, Callable[[], object]]:
+    mpd = make_mpd(segments)
+    master, playlists = make_m3u8(segments)
+    post = make_post(post_size)
+    post_html = post['post_text']
+    name = f"{'Очень длинное название поста ' * 20}.mp4"
+
+    # manifests are served from memory instead of kinescope
+    dumper._kinescope_get = lambda url, *, referer: SimpleNamespace(text=playlists[url])
+    markdown = TextConverter.spawn('md')
+
+    return {
+        'mpd_parse': lambda: dumper._mpd_parse(mpd),
+        'mpd_parse_preferred': lambda: dumper._mpd_parse(mpd, prefer_video=VideoPreference(frame='640x360')),
+        'm3u8_segments': lambda: dumper._m3u8_segments(f'{CDN}/v360.m3u8'),
+        'm3u8_parse': lambda: dumper._m3u8_parse(master, f'{CDN}/master.m3u8'),
+        'normalize_files': lambda: dumper._normalize_files(deepcopy(post)),
+        'truncate_filename': lambda: truncate_filename(name),
+        'markdown': lambda: markdown._convert(post_html),
+    }
+
+
+def measure(func: Callable[[], object], *, repeat: int) -> dict:
+    timer = timeit.Timer(func)
+    # enough calls per measurement for it to take 0.2s at least
+    number, _ = timer.autorange()
+    timings = [took / number for took in timer.repeat(repeat=repeat, number=number)]
+
+    return {
+        'calls': number,
+        'best': round(min(timings), 6),
+        'median': round(statistics.median(timings), 6),
+    }
+
+
+def bench(args: argparse.Namespace) -> dict:
+    with tempfile.TemporaryDirectory() as tmp, chdir(tmp):
+        Path(SponsrDumper._fname_auth).write_text('session_id=bench')
+        dumper = SponsrDumper('https://sponsr.ru/bench/')
+
+    cases = make_cases(dumper, segments=args.segments, post_size=args.post_size)
+    results = {}
+
+    for case, func in cases.items():
+        if args.cases and case not in args.cases:
+            continue
+
+        results[case] = measure(func, repeat=args.repeat)
+        print(f"{case:<22} best {results[case]['best']:.6f}s  median {results[case]['median']:.6f}s")
+
+    return results
+
+
+def compare(results: dict, baseline: dict, *, tolerance: float) -> list[str]:
+    regressions = []
+
+    for case, values in results.items():
+        expected = baseline.get(case, {}).get('best')
+
+        if expected and values['best'] > expected * (1 + tolerance):
+            regressions.append(f"{case}: {values['best']}s > {expected}s (baseline) + {tolerance:.0%}")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('cases', nargs='*', help='Cases to run. Defaults to all.')
+    parser.add_argument('--segments', type=int, default=10_000, help='Segments per manifest representation')
+    parser.add_argument('--post-size', type=int, default=1024 * 1024, help='Post HTML size in bytes')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', default='', help='File to write results into')
+    parser.add_argument('--baseline', default='', help='Results file to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown share')
+    args = parser.parse_args()
+
+    results = bench(args)
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text()), tolerance=args.tolerance)
+
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
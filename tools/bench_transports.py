@@ -0,0 +1,104 @@
+"""Compares HTTP transports against a local stand-in server.
+
+    python tools/bench_transports.py --requests 200 --size 1048576 --workers 8 --latency 0.01
+
+Use --url to run against a real server (e.g. a CDN segment) instead.
+
+"""
+import argparse
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from time import perf_counter
+
+from standin import serve
+
+from sponsrdump.transports import Transport
+
+
+def bench(alias: str, *, url: str, url_ranged: str, requests: int, workers: int, segment: int) -> dict:
+    transport = Transport.spawn(alias, headers={}, pool_size=workers)
+
+    def get(idx: int) -> int:
+        return len(transport.get(url).content)
+
+    def ranged(idx: int) -> int:
+        start = idx * segment
+        with transport.range(url_ranged, f'{start}-{start + segment - 1}') as response:
+            return sum(len(chunk) for chunk in response.iter_content(64 * 1024))
+
+    results = {}
+
+    try:
+        for mode, func, concurrency in (
+            ('sequential', get, 1),
+            ('threaded', get, workers),
+            ('ranged', ranged, workers),
+        ):
+            started = perf_counter()
+
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                received = sum(executor.map(func, range(requests)))
+
+            took = perf_counter() - started
+            results[mode] = {
+                'seconds': round(took, 3),
+                'rps': round(requests / took, 1),
+                'mbps': round(received / took / 1024 / 1024, 1),
+            }
+
+    finally:
+        transport.close()
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--transports', nargs='*', default=sorted(Transport.register))
+    parser.add_argument('--url', default='', help='Resource to fetch. Defaults to the local stand-in server.')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--size', type=int, default=256 * 1024, help='Resource size for the stand-in server')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0, help='Stand-in server latency, seconds')
+    parser.add_argument('--json', default='', help='File to write results into')
+    args = parser.parse_args()
+
+    server = None
+    url = url_ranged = args.url
+
+    if not url:
+        server = serve(latency=args.latency)
+        url = f'http://127.0.0.1:{server.server_address[1]}/{args.size}'
+        # every ranged request fetches its own segment of a large resource
+        url_ranged = f'http://127.0.0.1:{server.server_address[1]}/{args.size * args.requests}'
+
+    results = {}
+
+    try:
+        for alias in args.transports:
+            results[alias] = bench(
+                alias,
+                url=url,
+                url_ranged=url_ranged,
+                requests=args.requests,
+                workers=args.workers,
+                segment=args.size,
+            )
+
+    finally:
+        if server:
+            server.shutdown()
+
+    print(f'{"transport":<12} {"mode":<12} {"seconds":>9} {"req/s":>9} {"MB/s":>9}')
+
+    for alias, modes in results.items():
+        for mode, result in modes.items():
+            print(f'{alias:<12} {mode:<12} {result["seconds"]:>9} {result["rps"]:>9} {result["mbps"]:>9}')
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
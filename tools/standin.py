@@ -0,0 +1,354 @@
+"""Local stand-in for sponsr.ru and Kinescope used by benchmarks.
+
+Emulates a project page, 'more-posts' pagination, Kinescope embed pages,
+HLS/DASH manifests and CDN segments, with configurable segment counts,
+sizes, latency and error rates. Also serves 'size' bytes for /<size> paths.
+
+Requests of the dumper are routed to the server by 'standin' transports,
+which rewrite sponsr.ru, kinescope.io and CDN urls:
+
+    StandinTransport.base = 'http://127.0.0.1:8000'
+    dumper = SponsrDumper('https://sponsr.ru/bench/', transport=StandinTransport.alias)
+
+Run standalone:
+
+    python tools/standin.py --port 8000 --posts 100 --segments 50 --latency 0.02
+
+"""
+import argparse
+import json
+import random
+import time
+from collections.abc import Iterable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from typing import NamedTuple
+from urllib.parse import parse_qs, urlparse
+
+from sponsrdump.transports import AiohttpTransport, RequestsTransport
+
+PATTERN = bytes(range(256))
+
+HOSTS = {
+    'sponsr.ru': 'sponsr',
+    'kinescope.io': 'kinescope',
+    'edge.kinescopecdn.net': 'cdn',
+}
+"""Hosts emulated, by url path prefixes they are served at."""
+
+PROJECT_ID = 1
+
+
+class Project(NamedTuple):
+    """Stand-in project configuration."""
+
+    posts: int = 50
+    page: int = 20
+    """Posts returned by a single 'more-posts' request."""
+
+    videos: int = 1
+    """Videos per post."""
+
+    images: int = 1
+    """Images per post."""
+
+    podcasts: int = 0
+    """Audio files per post."""
+
+    kind: str = 'hls'
+    """Video manifest kind: hls | dash"""
+
+    segments: int = 20
+    """Segments per video (the same number for audio)."""
+
+    segment_size: int = 64 * 1024
+    file_size: int = 256 * 1024
+    """Size of images and audio files."""
+
+    latency: float = 0
+    """Seconds to wait before every response."""
+
+    error_rate: float = 0
+    """Share of CDN requests answered with 503."""
+
+
+def make_bytes(size: int) -> bytes:
+    return (PATTERN * (size // len(PATTERN) + 1))[:size]
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    project: Project = Project()
+
+    def log_message(self, *args):
+        pass
+
+    def respond(
+            self,
+            data: bytes | str,
+            *,
+            status: int = 200,
+            content_type: str = 'application/octet-stream',
+            headers: dict | None = None,
+    ) -> bool:
+        if isinstance(data, str):
+            data = data.encode()
+
+        self.send_response(status)
+
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', f'{len(data)}')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+
+        if self.command != 'HEAD':
+            self.wfile.write(data)
+
+        return True
+
+    def respond_bytes(self, size: int) -> bool:
+        data = make_bytes(size)
+
+        if rng := self.headers.get('Range'):
+            start, _, end = rng.removeprefix('bytes=').partition('-')
+            return self.respond(data[int(start):int(end) + 1 if end else None], status=206)
+
+        return self.respond(data)
+
+    def do_GET(self):
+        project = self.project
+
+        if project.latency:
+            time.sleep(project.latency)
+
+        parsed = urlparse(self.path)
+        realm, _, path = parsed.path.strip('/').partition('/')
+        query = parse_qs(parsed.query)
+
+        if realm.isdigit():
+            self.respond_bytes(int(realm))
+            return
+
+        # handlers return whether they have responded
+        handler = getattr(self, f'get_{realm}', None)
+
+        if handler is None or not handler(path, query):
+            self.respond('Not found', status=404, content_type='text/plain')
+
+    def do_HEAD(self):
+        # e.g. to warm connections
+        self.do_GET()
+
+    def get_sponsr(self, path: str, query: dict) -> bool:
+        project = self.project
+
+        if path.startswith('project/'):
+            offset = int(query.get('offset', ['0'])[0])
+            rows = [self.post(idx) for idx in range(offset, min(offset + project.page, project.posts))]
+            data = {'response': {'rows': rows, 'rows_count': project.posts}}
+            return self.respond(json.dumps(data), content_type='application/json')
+
+        if path.startswith(('img/', 'audio/')):
+            return self.respond_bytes(project.file_size)
+
+        return self.respond(
+            f'<script>var data = {{"project_id": {PROJECT_ID}, "x": 1}};</script>', content_type='text/html'
+        )
+
+    def post(self, idx: int) -> dict:
+        project = self.project
+        html = [f'<p>Post {idx} text.</p>']
+
+        for num in range(project.videos):
+            embed = f'e{idx}x{num}'
+            html.append(
+                f'<iframe src="https://kinescope.io/{embed}" data-url="/post/video/?video_id=v{idx}x{num}"></iframe>'
+            )
+
+        html.extend(f'<img src="https://sponsr.ru/img/{idx}x{num}.png">' for num in range(project.images))
+
+        return {
+            'post_id': f'{idx}',
+            'level_id': '1',
+            'post_date': '2025-01-01',
+            'post_title': f'Post {idx}',
+            'post_text': ''.join(html),
+            'post_url': f'/post/{idx}',
+            'tags': [],
+            'files': [
+                {
+                    'file_id': f'a{idx}x{num}',
+                    'file_category': 'podcast',
+                    'file_duration': 100,
+                    'file_title': f'{idx}x{num}.mp3',
+                    'file_link': f'https://sponsr.ru/audio/{idx}x{num}.mp3',
+                    'file_path': f'https://sponsr.ru/audio/{idx}x{num}.mp3',
+                }
+                for num in range(project.podcasts)
+            ],
+        }
+
+    def get_kinescope(self, path: str, query: dict) -> bool:
+        project = self.project
+        embed, _, name = path.partition('/')
+        expires = int(time.time()) + 3600
+        signature = f'expires={expires}&sign=standin'
+
+        if not name:
+            source = f'https://kinescope.io/{embed}/master.{"m3u8" if project.kind == "hls" else "mpd"}?{signature}'
+            options = {'playlist': [{'sources': {project.kind: {'src': source}}}]}
+            html = f'<script>var playerOptions = {json.dumps(options)};</script>'
+            return self.respond(html, content_type='text/html')
+
+        if name == 'master.m3u8':
+            return self.respond(
+                '#EXTM3U\n'
+                '#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="audio",NAME="main",URI="audio.m3u8"\n'
+                '#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=640x360,AUDIO="audio"\n'
+                'video.m3u8\n',
+                content_type='application/vnd.apple.mpegurl',
+            )
+
+        if name in {'video.m3u8', 'audio.m3u8'}:
+            realm = name[0]
+            lines = ['#EXTM3U', '#EXT-X-TARGETDURATION:4']
+
+            for idx in range(project.segments):
+                lines.extend(('#EXTINF:4.0,', f'https://edge.kinescopecdn.net/{embed}/{realm}/{idx}.mp4?{signature}'))
+
+            lines.append('#EXT-X-ENDLIST')
+            return self.respond('\n'.join(lines), content_type='application/vnd.apple.mpegurl')
+
+        if name == 'master.mpd':
+            sets = []
+
+            for realm, mime, attrs in (
+                ('v', 'video/mp4', 'width="640" height="360"'),
+                ('a', 'audio/mp4', 'audioSamplingRate="44100"'),
+            ):
+                segments = ''.join(f'<SegmentURL media="{idx}.mp4"/>' for idx in range(project.segments))
+                sets.append(
+                    f'<AdaptationSet mimeType="{mime}"><Representation id="{realm}" {attrs}>'
+                    f'<BaseURL>https://edge.kinescopecdn.net/{embed}/{realm}/</BaseURL>'
+                    f'<SegmentList><Initialization sourceURL="init.mp4"/>{segments}</SegmentList>'
+                    '</Representation></AdaptationSet>'
+                )
+
+            mpd = f'<MPD xmlns="urn:mpeg:dash:schema:mpd:2011"><Period>{"".join(sets)}</Period></MPD>'
+            return self.respond(f'<?xml version="1.0"?>{mpd}', content_type='application/dash+xml')
+
+        return False
+
+    def get_cdn(self, path: str, query: dict) -> bool:
+        project = self.project
+
+        if project.error_rate and random.random() < project.error_rate:
+            return self.respond('', status=503, headers={'Retry-After': '0'})
+
+        return self.respond_bytes(project.segment_size)
+
+
+class Rewriting:
+    """Routes requests for emulated hosts to the stand-in server."""
+
+    base: str = ''
+    """Stand-in server url, e.g. http://127.0.0.1:8000"""
+
+    def _local(self, url: str) -> str:
+        parsed = urlparse(url)
+
+        if (prefix := HOSTS.get(parsed.netloc)) is None:
+            return url
+
+        return f"{self.base}/{prefix}{parsed.path}{f'?{parsed.query}' if parsed.query else ''}"
+
+    def warm(self, urls: Iterable[str], **kwargs):
+        # connections are to be opened to the stand-in server, not to the hosts emulated
+        return super().warm([self._local(url) for url in urls], **kwargs)
+
+
+class StandinTransport(Rewriting, RequestsTransport):
+
+    alias = 'standin'
+
+    def get(self, url: str, *, headers: dict | None = None):
+        return super().get(self._local(url), headers=headers)
+
+    def stream(self, url: str, *, headers: dict | None = None):
+        return super().stream(self._local(url), headers=headers)
+
+    def head(self, url: str, *, headers: dict | None = None):
+        return super().head(self._local(url), headers=headers)
+
+
+class StandinAiohttpTransport(Rewriting, AiohttpTransport):
+
+    alias = 'standin-aiohttp'
+
+    async def aopen(self, url: str, *, headers: dict | None = None, method: str = 'GET'):
+        return await super().aopen(self._local(url), headers=headers, method=method)
+
+
+def serve(
+        *,
+        host: str = '127.0.0.1',
+        port: int = 0,
+        latency: float = 0,
+        project: Project | None = None,
+) -> ThreadingHTTPServer:
+    """Starts the server in a background thread and points 'standin' transports to it.
+    Call .shutdown() to stop it.
+
+    :param host:
+    :param port: 0 to pick a free one
+    :param latency: seconds to wait before every response (overrides that of the project)
+    :param project: stand-in project configuration
+
+    """
+    project = project or Project()
+
+    if latency:
+        project = project._replace(latency=latency)
+
+    handler = type('Handler', (StandinHandler,), {'project': project})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+
+    Rewriting.base = f'http://{host}:{server.server_address[1]}'
+
+    return server
+
+
+def add_project_arguments(parser: argparse.ArgumentParser):
+    """Adds arguments for every field of Project."""
+    for field, kind in Project.__annotations__.items():
+        parser.add_argument(f"--{field.replace('_', '-')}", type=kind, default=Project._field_defaults[field])
+
+
+def project_from_args(args: argparse.Namespace) -> Project:
+    return Project(**{field: getattr(args, field) for field in Project._fields})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    add_project_arguments(parser)
+    args = parser.parse_args()
+
+    server = serve(host=args.host, port=args.port, project=project_from_args(args))
+    print(f'Serving on http://{args.host}:{server.server_address[1]}/ ...')
+
+    try:
+        while True:
+            time.sleep(3600)
+
+    except KeyboardInterrupt:
+        server.shutdown()